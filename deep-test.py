@@ -22,125 +22,194 @@
 #   Jason Gerard DeRose <jderose@novacut.com>
 
 
+"""
+Deep-test and benchmark decoding, prerolling, and seeking of video files.
+
+Every file is played through once, and then every frame is visited in random
+order, first by prerolling after an accurate seek, then by playing one-frame
+slices.  The frames must match the play-through exactly.
+
+Timing is recorded along the way: preroll time, decode fps, and seek latency
+distributions (accurate and key-unit).  Use --json to save the results so they
+can be diffed between GStreamer upgrades or configuration changes.
+"""
+
 import argparse
 from os import path
 import logging
+import multiprocessing
 import sys
 
-from gi.repository import GLib
-
 import novacut
+from novacut.benchmark import summarize, save_results
 from novacut.validate import (
     PlayThrough,
     PrerollTester,
     SeekTester,
     shuffle_indexes,
+    run_pipeline,
 )
 
 
-parser = argparse.ArgumentParser()
-parser.add_argument('--version', action='version', version=novacut.__version__)
-parser.add_argument('files', nargs='+',
-    help='Path of video file(s) to deep test',
-)
-parser.add_argument('--debug', action='store_true', default=False,
-    help='Turn on debug-level logging'
-)
-args = parser.parse_args()
-count = len(args.files)
-
-
-logging.basicConfig(
-    level=(logging.DEBUG if args.debug else logging.INFO),
-    format='\t'.join([
-        '%(levelname)s',
-        '%(threadName)s',
-        '%(message)s',
-    ]),
-)
 log = logging.getLogger()
 
 
-mainloop = GLib.MainLoop()
+def configure_logging(debug):
+    logging.basicConfig(
+        level=(logging.DEBUG if debug else logging.INFO),
+        format='\t'.join([
+            '%(levelname)s',
+            '%(processName)s',
+            '%(threadName)s',
+            '%(message)s',
+        ]),
+    )
 
 
-def on_complete(inst, success):
-    mainloop.quit()
+def check_video(expected, got, indexes):
+    count = len(expected)
+    if len(got) != count:
+        raise ValueError('{} != {}'.format(len(got), count))
+    for i in range(count):
+        info1 = expected[indexes[i]]
+        info2 = got[i]
+        if info1 != info2:
+            raise ValueError('{}: {} != {}'.format( i, info1, info2))
 
 
 def deep_test_one(filename):
-    inst = PlayThrough(on_complete, filename)
-    GLib.idle_add(inst.run)
-    mainloop.run()
+    inst = run_pipeline(PlayThrough, filename)
     if inst.success is not True:
         raise SystemError('critical error in PlayThrough')
     expected = tuple(inst.video)
     count = len(expected)
     indexes = shuffle_indexes(count)
+    result = {
+        'filename': filename,
+        'codec': inst.codec,
+        'decoder': inst.decoder,
+        'frames': count,
+        'preroll_time': inst.preroll_time,
+        'decode_time': inst.decode_time,
+        'decode_fps': (count / inst.decode_time if inst.decode_time else None),
+    }
 
     seek_times = [expected[i].pts for i in indexes]
-    inst = PrerollTester(on_complete, filename, seek_times)
-    GLib.idle_add(inst.run)
-    mainloop.run()
+    inst = run_pipeline(PrerollTester, filename, list(seek_times))
     if inst.success is not True:
         raise SystemError('critical error in PrerollTester')
-    got = tuple(inst.video)
+    check_video(expected, tuple(inst.video), indexes)
+    result['seek_accurate'] = summarize(inst.latencies)
 
-    if len(got) != count:
-        raise ValueError('{} != {}'.format(len(got), count))
-    for i in range(count):
-        info1 = expected[indexes[i]]
-        info2 = got[i]
-        if info1 != info2:
-            raise ValueError('{}: {} != {}'.format( i, info1, info2))
+    # Key-unit seeks land on keyframes, so only their timing is interesting:
+    inst = run_pipeline(PrerollTester, filename, list(seek_times), True)
+    if inst.success is not True:
+        raise SystemError('critical error in PrerollTester (key-unit)')
+    result['seek_key_unit'] = summarize(inst.latencies)
 
     slices = [
         (expected[i].pts, expected[i].pts + expected[i].duration)
         for i in indexes
     ]
-    inst = SeekTester(on_complete, filename, slices)
-    GLib.idle_add(inst.run)
-    mainloop.run()
+    inst = run_pipeline(SeekTester, filename, slices)
     if inst.success is not True:
         raise SystemError('critical error in SliceTester')
-    got = tuple(inst.video)
+    check_video(expected, tuple(inst.video), indexes)
+    result['seek_slice'] = summarize(inst.latencies)
+    return result
 
-    if len(got) != count:
-        raise ValueError('{} != {}'.format(len(got), count))
-    for i in range(count):
-        info1 = expected[indexes[i]]
-        info2 = got[i]
-        if info1 != info2:
-            raise ValueError('{}: {} != {}'.format( i, info1, info2))
 
-
-passed = []
-failed = []
-for f in args.files:
-    filename = path.abspath(f)
-    if not path.isfile(filename):
-        log.error('Not a file: %r', filename)
-        sys.exit(3)
+def run_one(filename):
     log.info('\n%s\n%s', filename, '=' * min(len(filename), 72))
     try:
-        deep_test_one(filename)
+        result = deep_test_one(filename)
         log.info('PASS: %r', filename)
-        passed.append(filename)
+        result['passed'] = True
     except:
         log.exception('FAIL: %r', filename)
-        failed.append(filename)
-assert len(passed) + len(failed) == count
-
-print('PASSED {}/{}:'.format(len(passed), count))
-for filename in passed:
-    print('  {!r}'.format(filename))
-
-if failed:
-    print('FAILED {}/{}:'.format(len(failed), count))
-    for filename in failed:
-        print('  {!r}'.format(filename))
-    print('** FAIL!')
-    sys.exit(4)
-else:
-    print('** PASS!')
-
+        result = {'filename': filename, 'passed': False}
+    return result
+
+
+def format_ms(summary, key):
+    if summary['count'] == 0:
+        return '-'
+    return '{:.1f}ms'.format(summary[key] * 1000)
+
+
+def print_timing(result):
+    print('  {!r}'.format(result['filename']))
+    print('    {} ({}), {} frames, preroll {:.1f}ms, {:.1f} fps'.format(
+        result['codec'], result['decoder'], result['frames'],
+        result['preroll_time'] * 1000, result['decode_fps'] or 0,
+    ))
+    for key in ('seek_accurate', 'seek_key_unit', 'seek_slice'):
+        summary = result[key]
+        print('    {:<14} p50={} p95={} p99={}'.format(key,
+            format_ms(summary, 'p50'),
+            format_ms(summary, 'p95'),
+            format_ms(summary, 'p99'),
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--version', action='version',
+        version=novacut.__version__
+    )
+    parser.add_argument('files', nargs='+',
+        help='Path of video file(s) to deep test',
+    )
+    parser.add_argument('--debug', action='store_true', default=False,
+        help='Turn on debug-level logging'
+    )
+    parser.add_argument('--jobs', type=int, default=1, metavar='N',
+        help='Test files in parallel using N worker processes'
+    )
+    parser.add_argument('--json', metavar='FILE',
+        help='Save timing results to FILE as JSON'
+    )
+    args = parser.parse_args()
+    count = len(args.files)
+    configure_logging(args.debug)
+
+    filenames = []
+    for f in args.files:
+        filename = path.abspath(f)
+        if not path.isfile(filename):
+            log.error('Not a file: %r', filename)
+            sys.exit(3)
+        filenames.append(filename)
+
+    if args.jobs > 1:
+        # Use "spawn" so workers don't inherit GStreamer state via fork():
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(args.jobs, configure_logging, (args.debug,)) as pool:
+            results = pool.map(run_one, filenames, chunksize=1)
+    else:
+        results = [run_one(filename) for filename in filenames]
+
+    passed = [r for r in results if r['passed'] is True]
+    failed = [r for r in results if r['passed'] is not True]
+    assert len(passed) + len(failed) == count
+
+    if args.json:
+        save_results(args.json, 'deep-test', results)
+        log.info('Saved results to %r', args.json)
+
+    print('PASSED {}/{}:'.format(len(passed), count))
+    for result in passed:
+        print_timing(result)
+
+    if failed:
+        print('FAILED {}/{}:'.format(len(failed), count))
+        for result in failed:
+            print('  {!r}'.format(result['filename']))
+        print('** FAIL!')
+        sys.exit(4)
+    else:
+        print('** PASS!')
+
+
+if __name__ == '__main__':
+    main()
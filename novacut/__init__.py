@@ -27,7 +27,7 @@ __version__ = '19.12.0'
 BUS = 'com.novacut.Renderer'
 
 
-def get_log_filename(script):
+def get_log_filename(script, rotate=True):
     import os
     from os import path
 
@@ -39,12 +39,12 @@ def get_log_filename(script):
     if not path.exists(cache):
         os.makedirs(cache)
     filename = path.join(cache, namespace + '.log')
-    if path.exists(filename):
+    if rotate and path.exists(filename):
         os.rename(filename, filename + '.previous')
     return filename
 
 
-def configure_logging(use_stderr=False):
+def configure_logging(use_stderr=False, append=False):
     import sys
     from os import path
     import logging
@@ -56,14 +56,17 @@ def configure_logging(use_stderr=False):
         '%(threadName)s',
         '%(message)s',
     ]
+    if append:
+        # Several processes share the log file, so say which one this is:
+        format.insert(1, '%(process)d')
     script = path.abspath(sys.argv[0])
     kw = {
         'level': logging.DEBUG,
         'format': '\t'.join(format),
     }
     if not use_stderr:
-        kw['filename'] = get_log_filename(script)
-        kw['filemode'] = 'w'
+        kw['filename'] = get_log_filename(script, not append)
+        kw['filemode'] = ('a' if append else 'w')
     logging.basicConfig(**kw)
     log = logging.getLogger()
     log.info('======== Process Start ========')
@@ -0,0 +1,172 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Helpers for collecting and saving benchmark results.
+
+Results are saved as JSON so runs can be diffed between GStreamer upgrades,
+configuration changes, or Novacut revisions.
+"""
+
+import json
+import time
+import platform
+import threading
+import resource
+
+import novacut
+
+
+# Stages that `novacut.render.Renderer` reports time for:
+RENDER_STAGES = (
+    'construct',   # Building Input and Output pipelines
+    'seek',        # From Input.run() till the first frame reaches videoconvert
+    'decode',      # Remaining Input streaming time (residual)
+    'convert',     # videoconvert, videoscale, and videocrop
+    'queue_wait',  # Input blocked on a full Renderer.buffer_queue
+    'encode',      # From encoder sink pad till its next packet
+)
+
+
+def percentile(values, p):
+    """
+    Return the *p* percentile of *values* (nearest-rank method).
+
+    For example:
+
+    >>> percentile([15, 20, 35, 40, 50], 50)
+    35
+    >>> percentile([15, 20, 35, 40, 50], 95)
+    50
+
+    """
+    if not values:
+        raise ValueError('need at least one value')
+    if not (0 < p <= 100):
+        raise ValueError('need 0 < p <= 100; got {!r}'.format(p))
+    ordered = sorted(values)
+    rank = -(-len(ordered) * p // 100)  # ceil() without floats
+    return ordered[max(rank, 1) - 1]
+
+
+def summarize(values):
+    """
+    Summarize a list of timings (in seconds) as a JSON-serializable ``dict``.
+
+    For example:
+
+    >>> summary = summarize([0.5, 1.5, 1.0])
+    >>> sorted(summary)
+    ['count', 'max', 'mean', 'min', 'p50', 'p95', 'p99']
+    >>> summary['p50']
+    1.0
+
+    """
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'min': min(values),
+        'max': max(values),
+        'mean': sum(values) / len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+    }
+
+
+def get_peak_rss():
+    """
+    Return the peak resident set size of this process in bytes.
+    """
+    # On Linux, ru_maxrss is in KiB:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class StageTimer:
+    """
+    Accumulate wall time spent in each stage of a job.
+
+    For example:
+
+    >>> timer = StageTimer(('decode', 'encode'))
+    >>> timer.add('decode', 0.25)
+    >>> timer.add('decode', 0.5)
+    >>> timer.to_dict()['decode'] == {'total': 0.75, 'count': 2}
+    True
+
+    `StageTimer.add()` is thread-safe, as pad probes are called from GStreamer
+    streaming threads.
+    """
+
+    def __init__(self, stages=RENDER_STAGES):
+        self.stages = stages
+        self.totals = dict((name, 0.0) for name in stages)
+        self.counts = dict((name, 0) for name in stages)
+        self.lock = threading.Lock()
+
+    def add(self, stage, elapsed):
+        with self.lock:
+            self.totals[stage] += elapsed
+            self.counts[stage] += 1
+
+    def to_dict(self):
+        with self.lock:
+            return dict(
+                (name, {
+                    'total': self.totals[name],
+                    'count': self.counts[name],
+                })
+                for name in self.stages
+            )
+
+
+def get_environment():
+    """
+    Describe the environment a benchmark ran in.
+    """
+    env = {
+        'novacut': novacut.__version__,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'time': time.time(),
+    }
+    try:
+        from gi.repository import Gst
+        env['gstreamer'] = Gst.version_string()
+    except ImportError:
+        env['gstreamer'] = None
+    return env
+
+
+def save_results(filename, name, results):
+    """
+    Save *results* from the benchmark *name* to *filename* as JSON.
+    """
+    obj = {
+        'benchmark': name,
+        'environment': get_environment(),
+        'results': results,
+    }
+    with open(filename, 'w') as fp:
+        json.dump(obj, fp, sort_keys=True, indent=4)
+    return obj
@@ -0,0 +1,193 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Write-behind batching of doc saves into ``_bulk_docs`` requests.
+
+A `WriteBatcher` queues docs passed to `WriteBatcher.save()` and writes them
+with `microfiber.Database.save_many()` once *max_docs* are queued, or
+*max_delay* seconds after the first one was, whichever comes first.  Use it
+as a context manager so the last batch is always flushed:
+
+>>> class MockDatabase:
+...     def save_many(self, docs):
+...         print('save_many', [d['_id'] for d in docs])
+...
+>>> with WriteBatcher(MockDatabase(), max_docs=2) as batch:
+...     for _id in ('foo', 'bar', 'baz'):
+...         batch.save({'_id': _id})
+...
+save_many ['foo', 'bar']
+save_many ['baz']
+
+Each doc has its own conflict policy, to match what the caller did when saving
+docs one at a time: with `IGNORE` a conflict is dropped (for example, when the
+doc ID is content addressed), and with `RAISE` a `BatchConflict` is raised
+from the next `WriteBatcher.flush()` or `WriteBatcher.close()` call.
+"""
+
+import threading
+import logging
+
+from microfiber import BulkConflict
+
+
+log = logging.getLogger(__name__)
+
+# Conflict policies:
+IGNORE = 'ignore'
+RAISE = 'raise'
+
+# Flush once this many docs are queued:
+MAX_DOCS = 100
+
+# Or this many seconds after the first doc was queued:
+MAX_DELAY = 0.25
+
+
+class BatchConflict(Exception):
+    """
+    Raised when docs saved with the `RAISE` policy had conflicts.
+    """
+
+    def __init__(self, docs):
+        self.docs = docs
+        super().__init__(
+            'conflict on {}'.format(', '.join(d['_id'] for d in docs))
+        )
+
+
+class WriteBatcher:
+    def __init__(self, db, max_docs=MAX_DOCS, max_delay=MAX_DELAY):
+        if max_docs < 1:
+            raise ValueError('need max_docs >= 1; got {!r}'.format(max_docs))
+        self.db = db
+        self.max_docs = max_docs
+        self.max_delay = max_delay
+        self.pending = []
+        self.conflicts = []
+        self.timer = None
+        self.closed = False
+        self.docs = 0
+        self.requests = 0
+        self.ignored = 0
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.cancel()
+
+    def save(self, doc, policy=RAISE):
+        """
+        Queue *doc* to be saved in the next batch.
+        """
+        if policy not in (IGNORE, RAISE):
+            raise ValueError('bad conflict policy: {!r}'.format(policy))
+        with self.lock:
+            if self.closed:
+                raise Exception('WriteBatcher is closed')
+            self.pending.append((doc, policy))
+            full = (len(self.pending) >= self.max_docs)
+            if not full and self.timer is None and self.max_delay is not None:
+                self.timer = threading.Timer(self.max_delay, self.on_timer)
+                self.timer.daemon = True
+                self.timer.start()
+        if full:
+            self.write()
+
+    def on_timer(self):
+        try:
+            self.write()
+        except Exception:
+            log.exception('%s: error writing batch', self.__class__.__name__)
+
+    def write(self):
+        with self.flush_lock:
+            with self.lock:
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+                pending = self.pending
+                self.pending = []
+            if not pending:
+                return
+            docs = [doc for (doc, policy) in pending]
+            self.requests += 1
+            self.docs += len(docs)
+            try:
+                self.db.save_many(docs)
+            except BulkConflict as e:
+                policies = dict((id(doc), policy) for (doc, policy) in pending)
+                with self.lock:
+                    for doc in e.conflicts:
+                        if policies[id(doc)] == IGNORE:
+                            self.ignored += 1
+                        else:
+                            self.conflicts.append(doc)
+
+    def flush(self):
+        """
+        Write all queued docs now.
+
+        Raises `BatchConflict` if any `RAISE` doc had a conflict since the
+        last flush.
+        """
+        self.write()
+        with self.lock:
+            conflicts = self.conflicts
+            self.conflicts = []
+        if conflicts:
+            raise BatchConflict(conflicts)
+
+    def cancel(self):
+        with self.lock:
+            self.closed = True
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self.pending = []
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+        try:
+            self.flush()
+        finally:
+            if self.docs:
+                log.info('%s: %d docs in %d requests, %d round-trips saved',
+                    self.__class__.__name__, self.docs, self.requests,
+                    self.docs - self.requests
+                )
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'docs': self.docs,
+                'requests': self.requests,
+                'requests_saved': self.docs - self.requests,
+                'ignored': self.ignored,
+            }
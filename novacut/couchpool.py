@@ -0,0 +1,214 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Thread-safe pool of persistent CouchDB connections.
+
+A `microfiber.Database` keeps its HTTP connection open between requests, but
+it can't be used from more than one thread at a time.  A `Pool` keeps up to
+*size* `Database` instances for one database and lends one out per request,
+so threads reuse connections rather than each opening their own.
+
+A `Pool` has the `Database` methods novacut uses (`Pool.get()`,
+`Pool.save()`, etc.), so it can be passed where a `Database` is expected.  For
+several requests in a row on the same connection, use `Pool.connection()`.
+
+A connection that fails with anything other than an HTTP error response is
+discarded, and an idle connection is checked with a cheap request before it's
+lent out again after *check_after* seconds.
+"""
+
+from contextlib import contextmanager
+import time
+import threading
+import logging
+
+from microfiber import Database, HTTPError
+
+
+log = logging.getLogger(__name__)
+
+# Default max connections per database:
+POOL_SIZE = 4
+
+# Seconds a connection can sit idle before it's checked:
+CHECK_AFTER = 30
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class Pool:
+    def __init__(self, env, name, size=POOL_SIZE, check_after=CHECK_AFTER,
+            wait_metric=None):
+        if size < 1:
+            raise ValueError('need size >= 1; got {!r}'.format(size))
+        self.env = env
+        self.name = name
+        self.url = env['url']
+        self.size = size
+        self.check_after = check_after
+        self.wait_metric = wait_metric
+        self.idle = []
+        self.count = 0
+        self.created = 0
+        self.discarded = 0
+        self.acquired = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+        self.cond = threading.Condition()
+
+    def __repr__(self):
+        return '{}({!r}, {!r})'.format(
+            self.__class__.__name__, self.url, self.name
+        )
+
+    def create(self):
+        return Database(self.name, self.env)
+
+    def check(self, db):
+        """
+        Return True if the idle connection *db* still works.
+        """
+        try:
+            db.get()
+            return True
+        except Exception:
+            log.warning('discarding stale connection to %r', self)
+            return False
+
+    def acquire(self, timeout=None):
+        start = time.monotonic()
+        with self.cond:
+            while not (self.idle or self.count < self.size):
+                remaining = None
+                if timeout is not None:
+                    remaining = timeout - (time.monotonic() - start)
+                if not self.cond.wait(remaining):
+                    raise TimeoutError(
+                        'no connection to {!r} after {}s'.format(self, timeout)
+                    )
+            elapsed = time.monotonic() - start
+            self.acquired += 1
+            self.wait_seconds += elapsed
+            self.max_wait = max(self.max_wait, elapsed)
+            if elapsed > 0.001:
+                self.waited += 1
+            if self.idle:
+                (db, used) = self.idle.pop()
+            else:
+                (db, used) = (None, None)
+            self.count += 1
+        if self.wait_metric is not None:
+            self.wait_metric.observe(elapsed)
+        if db is not None and start - used >= self.check_after:
+            if not self.check(db):
+                with self.cond:
+                    self.discarded += 1
+                db = None
+        if db is None:
+            try:
+                db = self.create()
+            except:
+                with self.cond:
+                    self.count -= 1
+                    self.cond.notify()
+                raise
+            with self.cond:
+                self.created += 1
+        return db
+
+    def release(self, db, ok=True):
+        with self.cond:
+            self.count -= 1
+            if ok:
+                self.idle.append((db, time.monotonic()))
+            else:
+                self.discarded += 1
+            self.cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        Borrow a `Database` for the duration of a ``with`` block.
+        """
+        db = self.acquire(timeout)
+        ok = False
+        try:
+            yield db
+            ok = True
+        except HTTPError:
+            # The server replied, so the connection is fine:
+            ok = True
+            raise
+        finally:
+            self.release(db, ok)
+
+    def get(self, *parts, **options):
+        with self.connection() as db:
+            return db.get(*parts, **options)
+
+    def get_many(self, ids):
+        with self.connection() as db:
+            return db.get_many(ids)
+
+    def save(self, doc):
+        with self.connection() as db:
+            return db.save(doc)
+
+    def save_many(self, docs):
+        with self.connection() as db:
+            return db.save_many(docs)
+
+    def view(self, design, view, **options):
+        with self.connection() as db:
+            return db.view(design, view, **options)
+
+    def to_dict(self):
+        with self.cond:
+            return {
+                'size': self.size,
+                'open': self.count + len(self.idle),
+                'idle': len(self.idle),
+                'created': self.created,
+                'discarded': self.discarded,
+                'acquired': self.acquired,
+                'waited': self.waited,
+                'wait_seconds': self.wait_seconds,
+                'max_wait': self.max_wait,
+            }
+
+
+def get_pool(env, name, size=POOL_SIZE, wait_metric=None):
+    """
+    Return the process-wide `Pool` for database *name* on the *env* server.
+
+    The *size* and *wait_metric* are only used when the pool is created.
+    """
+    key = (env['url'], name)
+    with _pools_lock:
+        try:
+            return _pools[key]
+        except KeyError:
+            pool = Pool(env, name, size, wait_metric=wait_metric)
+            _pools[key] = pool
+            return pool
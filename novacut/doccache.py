@@ -0,0 +1,245 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Read-through doc cache atop a `microfiber.Database`.
+
+A `DocCache` has the same `get()` and `get_many()` as the `Database` it wraps,
+so it can be passed anywhere a database is only read from (for example, as the
+*src* in `schema.save_to_intrinsic()`).
+
+Cached docs are dropped when the database ``_changes`` feed reports a new
+revision, which is checked at most every *max_age* seconds.  A missing doc is
+cached too (negative caching), until it shows up in the feed.  Docs saved
+through `DocCache.save()` are cached with their new ``_rev`` right away.
+
+So a doc, or the fact that a doc is missing, can be up to *max_age* seconds
+stale.  Before a read-modify-write, call ``DocCache.update(force=True)`` so the
+read is current, and be ready for a `microfiber.Conflict` from the save
+anyway (which also drops the doc from the cache).
+
+Callers get a deep copy of each doc, so they're free to modify it.
+
+The lock only guards the cache itself; requests to the database are made
+outside of it, so one slow request doesn't hold up reads from other threads.
+"""
+
+from collections import OrderedDict
+from copy import deepcopy
+import time
+import threading
+import logging
+
+from microfiber import NotFound
+
+
+log = logging.getLogger(__name__)
+
+# Max docs kept per database:
+MAX_DOCS = 4096
+
+# Max seconds between checks of the _changes feed:
+MAX_AGE = 0.5
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class DocCache:
+    def __init__(self, db, max_docs=MAX_DOCS, max_age=MAX_AGE):
+        if max_docs < 1:
+            raise ValueError('need max_docs >= 1; got {!r}'.format(max_docs))
+        self.db = db
+        self.max_docs = max_docs
+        self.max_age = max_age
+        self.docs = OrderedDict()
+        self.since = None
+        self.checked = None
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+        self.update_lock = threading.Lock()
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.db)
+
+    def update(self, force=False):
+        """
+        Drop cached docs changed since the last update.
+
+        Unless *force* is ``True``, this does nothing if the feed was checked
+        less than *max_age* seconds ago, or if another thread is checking it.
+        """
+        if force:
+            self.update_lock.acquire()
+        elif not self.update_lock.acquire(False):
+            return
+        try:
+            now = time.monotonic()
+            if not force and self.checked is not None:
+                if now - self.checked < self.max_age:
+                    return
+            if self.since is None:
+                # Nothing is cached yet, so there's no need to replay history:
+                since = self.db.get()['update_seq']
+                with self.lock:
+                    self.epoch += 1
+                self.since = since
+                self.checked = now
+                return
+            changes = self.db.get('_changes', since=self.since)
+            with self.lock:
+                if changes['results']:
+                    # Docs fetched before now might be older than this update:
+                    self.epoch += 1
+                for row in changes['results']:
+                    doc = self.docs.get(row['id'], False)
+                    if doc is False:
+                        continue
+                    if isinstance(doc, dict):
+                        if row['changes'][0]['rev'] == doc.get('_rev'):
+                            continue  # Already cached by `DocCache.save()`
+                    del self.docs[row['id']]
+                    self.invalidations += 1
+            self.since = changes['last_seq']
+            self.checked = now
+        finally:
+            self.update_lock.release()
+
+    def _store(self, _id, doc, epoch):
+        if epoch != self.epoch:
+            # The feed was read while *doc* was being fetched, so it may
+            # already be stale:
+            self.docs.pop(_id, None)
+            return
+        self.docs[_id] = doc
+        self.docs.move_to_end(_id)
+        while len(self.docs) > self.max_docs:
+            self.docs.popitem(last=False)
+            self.evictions += 1
+
+    def _lookup(self, _id, need_doc=True):
+        doc = self.docs.get(_id, False)
+        if doc is False or (doc is None and need_doc):
+            # A ``None`` from `DocCache.get_many()` is only a hit for another
+            # `DocCache.get_many()`, as `DocCache.get()` still needs to ask
+            # the database so it can raise `microfiber.NotFound`:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.docs.move_to_end(_id)
+        return doc
+
+    def get(self, _id):
+        self.update()
+        with self.lock:
+            doc = self._lookup(_id)
+            epoch = self.epoch
+        if isinstance(doc, NotFound):
+            raise doc.with_traceback(None)
+        if doc:
+            return deepcopy(doc)
+        # Not cached, or only known missing from `get_many()`:
+        try:
+            doc = self.db.get(_id)
+        except NotFound as e:
+            with self.lock:
+                self._store(_id, e, epoch)
+            raise
+        with self.lock:
+            self._store(_id, doc, epoch)
+        return deepcopy(doc)
+
+    def get_many(self, ids):
+        """
+        Like `microfiber.Database.get_many()`, fetching only uncached docs.
+
+        Docs that don't exist are returned as ``None``.
+        """
+        self.update()
+        found = {}
+        missing = []
+        with self.lock:
+            for _id in ids:
+                doc = self._lookup(_id, False)
+                if doc is False:
+                    missing.append(_id)
+                elif isinstance(doc, NotFound):
+                    found[_id] = None
+                else:
+                    found[_id] = doc
+            epoch = self.epoch
+        if missing:
+            fetched = self.db.get_many(missing)
+            with self.lock:
+                for (_id, doc) in zip(missing, fetched):
+                    self._store(_id, doc, epoch)
+                    found[_id] = doc
+        return [deepcopy(found[_id]) for _id in ids]
+
+    def save(self, doc):
+        """
+        Save *doc*, caching it with its new ``_rev``.
+        """
+        self.update()
+        with self.lock:
+            epoch = self.epoch
+        try:
+            result = self.db.save(doc)
+        except:
+            with self.lock:
+                self.docs.pop(doc['_id'], None)
+            raise
+        with self.lock:
+            self._store(doc['_id'], deepcopy(doc), epoch)
+        return result
+
+    def to_dict(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'docs': len(self.docs),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': (self.hits / total if total else 0.0),
+            }
+
+
+def get_cache(db):
+    """
+    Return the process-wide `DocCache` for *db*.
+
+    All `microfiber.Database` instances for the same database share a cache.
+    """
+    key = (db.url, db.name)
+    with _caches_lock:
+        try:
+            return _caches[key]
+        except KeyError:
+            log.info('new doc cache for %r', db)
+            cache = DocCache(db)
+            _caches[key] = cache
+            return cache
@@ -0,0 +1,628 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Render a job across several peers, using the media Dmedia already replicates.
+
+A job is split into segments of at most `SEGMENT_FRAMES` frames, each stored
+as a ``'novacut/task'`` doc in the main Novacut database.  That database is
+replicated between peers, so any peer can pick up a task.  A peer only claims
+a task when all of its source files are available in its local Dmedia stores,
+and it ranks tasks by locality (the fraction of their bytes that are local) so
+partially local tasks are left to peers that hold more of their media.
+
+A peer that skips a task records the files it is missing in the task doc, so a
+task whose files aren't all on any one peer shows up as blocked in CouchDB
+rather than stalling the job silently.
+
+A claim is a lease: the peer writes its ID and an expiration time into the
+task doc, and CouchDB's MVCC guarantees only one peer wins (the others get a
+`microfiber.Conflict`).  The peer renews its lease while rendering, so a peer
+that crashes or goes offline simply lets its lease expire, after which another
+peer can claim the task.
+
+Each finished segment is imported into Dmedia (and so replicated like any
+other file).  Once all segments are done, a final "join" task concatenates
+them without re-encoding, and the result is recorded in the job like a regular
+render.
+"""
+
+import time
+import logging
+
+from dbase32 import random_id
+from gi.repository import GLib
+from microfiber import Conflict
+
+from .render import Slice, Renderer, Joiner
+from .renderservice import Worker, get_raw_slices, resolve_files
+from .validate import DemuxValidator, run_pipeline
+
+
+log = logging.getLogger(__name__)
+
+TASK_TYPE = 'novacut/task'
+
+# Default maximum frames per segment (30 seconds at 30 fps):
+SEGMENT_FRAMES = 900
+
+# How long a claim is valid for, in seconds, unless renewed:
+LEASE_SECONDS = 60
+
+
+class LeaseLost(Exception):
+    """
+    Raised when another peer took over a task while it was being rendered.
+    """
+
+    def __init__(self, _id):
+        self._id = _id
+        super().__init__('lost lease on {}'.format(_id))
+
+
+def plan_segments(raw_slices, segment_frames=SEGMENT_FRAMES):
+    """
+    Split *raw_slices* into segments of at most *segment_frames* frames.
+
+    Returns a list of ``(offset, slices)`` tuples, where *offset* is the
+    timeline frame at which the segment starts and each slice is a
+    ``(src, start, stop)`` tuple.  Slices are split across segments as needed.
+    For example:
+
+    >>> raw_slices = [('A', 'foo', 0, 10), ('B', 'bar', 5, 25)]
+    >>> for segment in plan_segments(raw_slices, 12):
+    ...     segment
+    ...
+    (0, (('foo', 0, 10), ('bar', 5, 7)))
+    (12, (('bar', 7, 19),))
+    (24, (('bar', 19, 25),))
+
+    """
+    if not (isinstance(segment_frames, int) and segment_frames >= 1):
+        raise ValueError(
+            'need segment_frames >= 1; got {!r}'.format(segment_frames)
+        )
+    segments = []
+    current = []
+    size = 0
+    offset = 0
+    for (_id, src, start, stop) in raw_slices:
+        while start < stop:
+            n = min(stop - start, segment_frames - size)
+            current.append((src, start, start + n))
+            start += n
+            size += n
+            if size == segment_frames:
+                segments.append((offset, tuple(current)))
+                offset += size
+                current = []
+                size = 0
+    if current:
+        segments.append((offset, tuple(current)))
+    return segments
+
+
+def task_id(job_id, index):
+    """
+    Return the deterministic doc ID of a segment task.
+
+    For example:
+
+    >>> task_id('DEADBEEF', 7)
+    'DEADBEEF-0007'
+
+    Because the ID only depends on the job and segment index, two peers that
+    split the same job produce the same task docs.
+    """
+    return '{}-{:04d}'.format(job_id, index)
+
+
+def join_task_id(job_id):
+    return '{}-join'.format(job_id)
+
+
+def create_task(job_id, index, count, offset, slices):
+    return {
+        '_id': task_id(job_id, index),
+        'type': TASK_TYPE,
+        'time': time.time(),
+        'kind': 'segment',
+        'job_id': job_id,
+        'index': index,
+        'count': count,
+        'offset': offset,
+        'frames': sum(stop - start for (src, start, stop) in slices),
+        'slices': [list(s) for s in slices],
+        'files': sorted(set(s[0] for s in slices)),
+        'state': 'open',
+        'lease': None,
+        'blocked': {},
+        'attempts': 0,
+        'file_id': None,
+    }
+
+
+def create_join_task(job_id, count):
+    return {
+        '_id': join_task_id(job_id),
+        'type': TASK_TYPE,
+        'time': time.time(),
+        'kind': 'join',
+        'job_id': job_id,
+        'index': count,
+        'count': count,
+        'files': [],
+        'state': 'open',
+        'lease': None,
+        'blocked': {},
+        'attempts': 0,
+        'file_id': None,
+    }
+
+
+def split_job(db, job_id, segment_frames=SEGMENT_FRAMES):
+    """
+    Create the task docs for the job *job_id*.
+
+    It's safe to call this more than once, or from more than one peer; task
+    docs that already exist are left alone.
+    """
+    job = db.get(job_id)
+    raw_slices = get_raw_slices(db, job['node']['root'])
+    segments = plan_segments(raw_slices, segment_frames)
+    if not segments:
+        raise ValueError('job {} has no frames to render'.format(job_id))
+    count = len(segments)
+    docs = [
+        create_task(job_id, index, count, offset, slices)
+        for (index, (offset, slices)) in enumerate(segments)
+    ]
+    docs.append(create_join_task(job_id, count))
+    for doc in docs:
+        try:
+            db.save(doc)
+        except Conflict:
+            log.info('Task %s already exists', doc['_id'])
+    log.info('Split %s into %d segments', job_id, count)
+    return docs
+
+
+def get_job_tasks(db, job_id):
+    rows = db.view('task', 'job', key=job_id, include_docs=True)['rows']
+    return sorted((r['doc'] for r in rows), key=lambda doc: doc['index'])
+
+
+def get_open_tasks(db):
+    rows = db.view('task', 'open', include_docs=True)['rows']
+    return [r['doc'] for r in rows]
+
+
+def is_local(Dmedia, files):
+    """
+    Return ``True`` if all *files* are available in local Dmedia stores.
+    """
+    for _id in files:
+        (file_id, status, name) = Dmedia.Resolve(_id)
+        if status != 0:
+            return False
+    return True
+
+
+def get_local_files(Dmedia, files):
+    """
+    Return the subset of *files* available in local Dmedia stores.
+
+    Unlike `renderservice.resolve_files()`, a file that is only available on
+    another peer is not an error.
+    """
+    local = set()
+    for _id in files:
+        (file_id, status, name) = Dmedia.Resolve(_id)
+        if status == 0:
+            local.add(_id)
+    return local
+
+
+def get_file_sizes(db, files):
+    """
+    Return a ``dict`` mapping each of *files* to its size in bytes.
+
+    Files missing from the Dmedia library count as zero bytes.
+    """
+    files = sorted(files)
+    sizes = {}
+    for (_id, doc) in zip(files, db.get_many(files)):
+        sizes[_id] = (0 if doc is None else doc.get('bytes', 0))
+    return sizes
+
+
+def locality_score(files, local, sizes):
+    """
+    Return the fraction of the bytes in *files* that are in *local*.
+
+    For example:
+
+    >>> locality_score(['A', 'B'], {'A'}, {'A': 300, 'B': 100})
+    0.75
+    >>> locality_score(['A', 'B'], {'A', 'B'}, {'A': 300, 'B': 100})
+    1.0
+
+    If the sizes are unknown, only a task with all files local scores 1.0:
+
+    >>> locality_score(['A', 'B'], {'A'}, {})
+    0.0
+
+    """
+    total = sum(sizes.get(_id, 0) for _id in files)
+    if total == 0:
+        return (1.0 if set(files).issubset(local) else 0.0)
+    return sum(sizes.get(_id, 0) for _id in files if _id in local) / total
+
+
+def rank_tasks(tasks, local, sizes):
+    """
+    Return ``(score, doc)`` pairs for *tasks*, most local first.
+
+    For example:
+
+    >>> tasks = [
+    ...     {'job_id': 'J', 'index': 0, 'files': ['A', 'B']},
+    ...     {'job_id': 'J', 'index': 1, 'files': ['B']},
+    ...     {'job_id': 'J', 'index': 2, 'files': ['A']},
+    ... ]
+    >>> for (score, doc) in rank_tasks(tasks, {'A'}, {'A': 1, 'B': 3}):
+    ...     (score, doc['index'])
+    ...
+    (1.0, 2)
+    (0.25, 0)
+    (0.0, 1)
+
+    Ties are broken by job and segment index, so peers with the same files
+    tend to work through a job in order.
+    """
+    ranked = [
+        (locality_score(doc['files'], local, sizes), doc) for doc in tasks
+    ]
+    ranked.sort(key=lambda r: (-r[0], r[1]['job_id'], r[1]['index']))
+    return ranked
+
+
+def is_claimable(doc, now):
+    """
+    Return ``True`` if the task *doc* can be claimed at time *now*.
+
+    For example:
+
+    >>> is_claimable({'state': 'open', 'lease': None}, 1000)
+    True
+    >>> is_claimable({'state': 'claimed', 'lease': {'expires': 1060}}, 1000)
+    False
+    >>> is_claimable({'state': 'claimed', 'lease': {'expires': 1060}}, 1061)
+    True
+
+    """
+    if doc['state'] == 'open':
+        return True
+    if doc['state'] == 'claimed':
+        return doc['lease']['expires'] < now
+    return False
+
+
+def claim_task(db, doc, peer_id, lease_seconds=LEASE_SECONDS, now=None):
+    """
+    Try to claim the task *doc* for *peer_id*.
+
+    Returns ``True`` if the claim was saved.  Returns ``False`` if the task
+    isn't claimable, or if another peer changed it first.
+    """
+    if now is None:
+        now = time.time()
+    if not is_claimable(doc, now):
+        return False
+    doc['state'] = 'claimed'
+    doc['lease'] = {'peer': peer_id, 'expires': now + lease_seconds}
+    doc['attempts'] += 1
+    doc['blocked'] = {}
+    try:
+        db.save(doc)
+    except Conflict:
+        log.info('Lost race to claim %s', doc['_id'])
+        return False
+    log.info('Claimed %s as %s', doc['_id'], peer_id)
+    return True
+
+
+def block_task(db, doc, peer_id, missing, now=None):
+    """
+    Record that *peer_id* can't render the task *doc* without *missing* files.
+
+    The doc is only saved when the files this peer is missing have changed.
+    Returns ``True`` if it was saved, ``False`` otherwise (including when
+    another peer changed the task first).
+    """
+    if now is None:
+        now = time.time()
+    missing = sorted(missing)
+    blocked = doc.setdefault('blocked', {})
+    if blocked.get(peer_id, {}).get('missing') == missing:
+        return False
+    blocked[peer_id] = {'missing': missing, 'time': now}
+    try:
+        db.save(doc)
+    except Conflict:
+        return False
+    return True
+
+
+def renew_lease(db, doc, peer_id, lease_seconds=LEASE_SECONDS, now=None):
+    """
+    Extend the lease on a task that *peer_id* has claimed.
+
+    Raises `microfiber.Conflict` if the task was changed by another peer,
+    meaning the lease was lost.
+    """
+    if now is None:
+        now = time.time()
+    if doc['state'] != 'claimed' or doc['lease']['peer'] != peer_id:
+        raise ValueError(
+            'task {} not claimed by {}'.format(doc['_id'], peer_id)
+        )
+    doc['lease'] = {'peer': peer_id, 'expires': now + lease_seconds}
+    db.save(doc)
+
+
+def complete_task(db, doc, file_id):
+    """
+    Mark a task as done, with *file_id* being its output file.
+
+    Raises `microfiber.Conflict` if the lease was lost.
+    """
+    doc['state'] = 'done'
+    doc['lease'] = None
+    doc['file_id'] = file_id
+    db.save(doc)
+
+
+def release_task(db, doc):
+    """
+    Give up a claimed task so another peer can claim it right away.
+    """
+    doc['state'] = 'open'
+    doc['lease'] = None
+    db.save(doc)
+
+
+def get_join_files(tasks, count):
+    """
+    Return the segment file IDs, in order, or ``None`` if not all are done.
+    """
+    segments = [t for t in tasks if t['kind'] == 'segment']
+    if len(segments) != count:
+        return None
+    if any(t['state'] != 'done' for t in segments):
+        return None
+    return [t['file_id'] for t in segments]
+
+
+def check_join(filename, frames):
+    """
+    Return ``True`` if the joined *filename* has *frames* contiguous frames.
+
+    The container timestamps are checked without decoding, so this catches
+    segments whose timestamps overlap or leave gaps after being joined.
+    """
+    inst = run_pipeline(DemuxValidator, filename, False, False)
+    if inst.success is not True:
+        log.error('Joined file %r has bad timestamps', filename)
+        return False
+    if inst.info['frames'] != frames:
+        log.error('Joined file %r has %d frames, expected %d',
+            filename, inst.info['frames'], frames
+        )
+        return False
+    return True
+
+
+class FarmWorker(Worker):
+    def __init__(self, Dmedia, env, peer_id=None,
+            lease_seconds=LEASE_SECONDS):
+        super().__init__(Dmedia, env)
+        self.peer_id = (random_id() if peer_id is None else peer_id)
+        self.lease_seconds = lease_seconds
+        self.task = None
+        self.running = None
+        self.renew_source = None
+        self.lease_lost = False
+        self.wanted = set()
+        self.blocked = set()
+
+    def get_candidates(self, now):
+        candidates = []
+        for doc in get_open_tasks(self.novacut_db):
+            if not is_claimable(doc, now):
+                continue
+            if doc['kind'] == 'join':
+                tasks = get_job_tasks(self.novacut_db, doc['job_id'])
+                files = get_join_files(tasks, doc['count'])
+                if files is None:
+                    continue
+                doc['files'] = files
+                doc['frames'] = sum(
+                    t['frames'] for t in tasks if t['kind'] == 'segment'
+                )
+            candidates.append(doc)
+        return candidates
+
+    def find_task(self, now=None):
+        """
+        Claim the open task with the best locality, if it is fully local.
+
+        Every task that isn't fully local is marked as blocked for this peer
+        (see `block_task()`), and its missing files are added to
+        `FarmWorker.wanted`, which is reported by `FarmWorker.to_dict()` so
+        the files can be fetched while this peer renders other segments.
+        """
+        if now is None:
+            now = time.time()
+        self.blocked.clear()
+        candidates = self.get_candidates(now)
+        files = set()
+        for doc in candidates:
+            files.update(doc['files'])
+        local = get_local_files(self.Dmedia, files)
+        sizes = get_file_sizes(self.dmedia_db, files)
+        for (score, doc) in rank_tasks(candidates, local, sizes):
+            if score < 1.0:
+                self.block(doc, set(doc['files']) - local, now)
+                continue
+            if claim_task(self.novacut_db, doc, self.peer_id,
+                    self.lease_seconds, now):
+                return doc
+        return None
+
+    def want(self, files):
+        new = files - self.wanted
+        if new:
+            log.info('Task needs %d files not in local stores: %s',
+                len(new), sorted(new)
+            )
+            self.wanted.update(new)
+
+    def block(self, doc, missing, now=None):
+        self.want(missing)
+        self.blocked.add(doc['_id'])
+        if block_task(self.novacut_db, doc, self.peer_id, missing, now):
+            log.warning('Blocked on %s, missing %d files',
+                doc['_id'], len(missing)
+            )
+
+    def to_dict(self):
+        return {
+            'peer_id': self.peer_id,
+            'wanted': sorted(self.wanted),
+            'blocked': sorted(self.blocked),
+        }
+
+    def on_renew(self):
+        try:
+            renew_lease(self.novacut_db, self.task, self.peer_id,
+                self.lease_seconds
+            )
+            return True
+        except Conflict:
+            log.warning('Lost lease on %s, aborting', self.task['_id'])
+            # Returning False removes the timeout:
+            self.renew_source = None
+            self.lease_lost = True
+            if self.running is not None:
+                self.running.complete(False)
+            return False
+
+    def run_pipeline(self, doc, inst):
+        """
+        Run *inst* to completion, unless the lease on *doc* is lost first.
+        """
+        self.running = inst
+        try:
+            inst.run()
+            self.mainloop.run()
+        finally:
+            self.running = None
+        if self.lease_lost:
+            raise LeaseLost(doc['_id'])
+
+    def render_segment(self, doc, settings):
+        _map = resolve_files(self.Dmedia, doc['files'])
+        slices = tuple(
+            Slice(start, stop, _map[src])
+            for (src, start, stop) in doc['slices']
+        )
+        dst = self.Dmedia.AllocateTmp()
+        renderer = Renderer(self.on_complete, slices, settings, dst,
+            prefetch=True
+        )
+        self.run_pipeline(doc, renderer)
+        if renderer.success is not True:
+            raise SystemExit('renderer encountered a fatal error')
+        return self.Dmedia.HashAndMove(dst, 'render')
+
+    def join_segments(self, doc, job, settings):
+        _map = resolve_files(self.Dmedia, doc['files'])
+        filenames = [_map[_id] for _id in doc['files']]
+        dst = self.Dmedia.AllocateTmp()
+        joiner = Joiner(self.on_complete, filenames, settings, dst)
+        self.run_pipeline(doc, joiner)
+        if joiner.success is not True:
+            raise SystemExit('joiner encountered a fatal error')
+        if not check_join(dst, doc['frames']):
+            raise SystemExit('joined file is not valid for {}'.format(
+                doc['_id']
+            ))
+        return self.save_render(job, settings, dst)
+
+    def run_task(self, doc):
+        """
+        Run the claimed task *doc*, renewing its lease as needed.
+        """
+        self.task = doc
+        self.lease_lost = False
+        job = self.docs.get(doc['job_id'])
+        settings = self.docs.get(job['node']['settings'])['node']
+        interval = max(1, self.lease_seconds // 3)
+        self.renew_source = GLib.timeout_add_seconds(interval, self.on_renew)
+        try:
+            if doc['kind'] == 'join':
+                obj = self.join_segments(doc, job, settings)
+            else:
+                obj = self.render_segment(doc, settings)
+        except LeaseLost:
+            # The task now belongs to another peer, so don't release it:
+            log.warning('Abandoned %s after losing its lease', doc['_id'])
+            return None
+        except:
+            try:
+                release_task(self.novacut_db, doc)
+            except Conflict:
+                pass
+            raise
+        finally:
+            if self.renew_source is not None:
+                GLib.source_remove(self.renew_source)
+                self.renew_source = None
+            self.task = None
+        try:
+            complete_task(self.novacut_db, doc, obj['file_id'])
+        except Conflict:
+            # Another peer took over after our lease expired:
+            log.warning('Lease on %s expired, discarding result', doc['_id'])
+            return None
+        return obj
+
+    def work(self):
+        """
+        Run tasks until none can be claimed by this peer.
+        """
+        results = []
+        while True:
+            doc = self.find_task()
+            if doc is None:
+                return results
+            results.append(self.run_task(doc))
@@ -27,15 +27,17 @@ don't want to accumulate too much magic wrapper sauce!
 """
 
 from fractions import Fraction
+import time
 import logging
 
 from gi.repository import GLib, Gst
 
-from .timefuncs import frame_to_nanosecond, nanosecond_to_frame
+from .timefuncs import FrameClock
+from . import tracing
 
 
 log = logging.getLogger(__name__)
-Gst.init()
+_initialized = False
 
 VIDEOSCALE_METHOD = 5  # Use sinc (multi-tap) videoscale method
 FLAGS_ACCURATE = Gst.SeekFlags.FLUSH | Gst.SeekFlags.ACCURATE
@@ -43,6 +45,25 @@ FLAGS_KEY_UNIT = Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT
 TYPE_ERROR = '{}: need a {!r}; got a {!r}: {!r}'
 
 
+def init_gst():
+    """
+    Call `Gst.init()`, unless it has already been called.
+
+    This is deferred until the first element, caps, or `Pipeline` is created
+    so that merely importing this module stays cheap.
+    """
+    global _initialized
+    if _initialized:
+        return
+    _initialized = True
+    tracing.configure_gst_tracers()
+    Gst.init()
+    if tracing.enable_from_env() is not None:
+        # Otherwise every tracer record is also printed to stderr:
+        Gst.debug_remove_log_function(None)
+        Gst.debug_add_log_function(tracing.on_gst_log, None)
+
+
 class ElementFactoryError(Exception):
     """
     Raised when `Gst.ElementFactory.make()` fails.
@@ -100,6 +121,7 @@ def make_element(name, props=None):
         raise TypeError(
             TYPE_ERROR.format('props', dict, type(props), props)
         )
+    init_gst()
     element = Gst.ElementFactory.make(name, None)
     if element is None:
         log.error('could not create GStreamer element %r', name)
@@ -182,6 +204,7 @@ def make_caps(mime, desc):
     'video/x-raw, height=(int)450, width=(int)800'
 
     """
+    init_gst()
     return Gst.caps_from_string(make_caps_string(mime, desc))
 
 
@@ -203,6 +226,18 @@ def get_fraction(structure, name):
     return Fraction(num, denom)
 
 
+def get_factory_name(element):
+    """
+    Return the factory name of *element*, or its type name if it has none.
+
+    Bins created directly (like the pipeline itself) have no factory.
+    """
+    factory = element.get_factory()
+    if factory is None:
+        return type(element).__name__
+    return factory.get_name()
+
+
 def add_elements(parent, *elements):
     for el in elements:
         parent.add(el)
@@ -251,13 +286,26 @@ class Pipeline:
             )
         self.callback = callback
         self.handlers = []
+        self.probes = []
         self.success = None
+        init_gst()
         self.pipeline = Gst.Pipeline()
         self.bus = self.pipeline.get_bus()
         self.bus.add_signal_watch()
         self.connect(self.bus, 'message::error', self.on_error)
         self.connect(self.bus, 'message::eos', self.on_eos)
 
+        # Only when tracing is enabled (see `novacut.tracing`):
+        tracer = tracing.get_tracer()
+        if tracer is not None:
+            self.traced_queues = False
+            self.traced_first_buffer = False
+            self.connect(self.bus, 'message::state-changed',
+                self.on_trace_state_changed
+            )
+            self.connect(self.bus, 'message::eos', self.on_trace_eos)
+            tracer.instant(self.trace_name(), 'init')
+
     def connect(self, obj, signal, callback):
         """
         Connect a GObject signal handler.
@@ -275,6 +323,20 @@ class Pipeline:
         hid = obj.connect(signal, callback)
         self.handlers.append((obj, hid))
 
+    def add_probe(self, pad, mask, callback):
+        """
+        Add a `Gst.Pad` probe.
+
+        Like signal handlers, probe callbacks create reference cycles, so this
+        method appends a ``(pad,probe_id)`` tuple to the `Pipeline.probes` list
+        after ``pad.add_probe()`` is called.
+
+        `Pipeline.destroy()` will call ``pad.remove_probe(probe_id)`` for each
+        pair in this list.
+        """
+        probe_id = pad.add_probe(mask, callback)
+        self.probes.append((pad, probe_id))
+
     def destroy(self):
         """
         Free all resources associated with this instance.
@@ -284,9 +346,12 @@ class Pipeline:
             1.  Disconnects all signal handlers that were connected using
                 `Pipeline.connect()`
 
-            2.  Removes the signal watch from the Gst.Bus instance
+            2.  Removes all pad probes that were added using
+                `Pipeline.add_probe()`
 
-            3.  Sets the Gst.Pipeline instance to Gst.State.NULL
+            3.  Removes the signal watch from the Gst.Bus instance
+
+            4.  Sets the Gst.Pipeline instance to Gst.State.NULL
 
         This method should only be called from the main thread.  It can be
         safely called multiple times (subsequent calls have no effect).
@@ -296,6 +361,10 @@ class Pipeline:
         while self.handlers:
             (obj, hid) = self.handlers.pop()
             obj.handler_disconnect(hid)
+        probes = getattr(self, 'probes', [])
+        while probes:
+            (pad, probe_id) = probes.pop()
+            pad.remove_probe(probe_id)
         if hasattr(self, 'bus'):
             self.bus.remove_signal_watch()
             del self.bus
@@ -311,6 +380,7 @@ class Pipeline:
             )
             return
         self.success = (True if success is True else False)
+        self.trace('complete', {'success': self.success})
         self.destroy()
         self.callback(self, self.success)
 
@@ -328,15 +398,63 @@ class Pipeline:
         """
         Synchronously go to Gst.State.PAUSED.
         """
+        start = time.perf_counter()
         self.pipeline.set_state(Gst.State.PAUSED)
         self.pipeline.get_state(Gst.CLOCK_TIME_NONE)
+        tracer = tracing.get_tracer()
+        if tracer is not None:
+            tracer.complete(self.trace_name(), 'pause', start)
 
     def play(self):
         """
         Asynchronously go to Gst.State.PLAYING.
         """
+        self.trace('play')
         self.pipeline.set_state(Gst.State.PLAYING)
 
+    def trace_name(self):
+        return '{}#{:x}'.format(self.__class__.__name__, id(self))
+
+    def trace(self, event, args=None):
+        """
+        Record *event* if tracing is enabled.
+        """
+        tracer = tracing.get_tracer()
+        if tracer is not None:
+            tracer.instant(self.trace_name(), event, args)
+
+    def on_trace_state_changed(self, bus, msg):
+        if msg.src is not self.pipeline:
+            return
+        (old, new, pending) = msg.parse_state_changed()
+        self.trace('state-changed',
+            {'old': old.value_nick, 'new': new.value_nick}
+        )
+        # Once PAUSED, elements are linked so queues can be found:
+        if new == Gst.State.PAUSED and not self.traced_queues:
+            self.traced_queues = True
+            for element in self.pipeline.iterate_recurse():
+                if get_factory_name(element) == 'queue':
+                    self.add_probe(element.get_static_pad('src'),
+                        Gst.PadProbeType.BUFFER, self.on_trace_queue_probe
+                    )
+
+    def on_trace_queue_probe(self, pad, info):
+        tracer = tracing.get_tracer()
+        if tracer is not None:
+            q = pad.get_parent()
+            name = self.trace_name()
+            tracer.counter(name + ' ' + q.get_name(),
+                {'buffers': q.get_property('current-level-buffers')}
+            )
+            if not self.traced_first_buffer:
+                self.traced_first_buffer = True
+                tracer.instant(name, 'first-buffer')
+        return Gst.PadProbeReturn.OK
+
+    def on_trace_eos(self, bus, msg):
+        self.trace('eos')
+
     def on_error(self, bus, msg):
         log.error('%s.on_error(): %s',
             self.__class__.__name__, msg.parse_error()
@@ -377,6 +495,16 @@ class Decoder(Pipeline):
         # Connect signal handlers using Pipeline.connect():
         self.connect(self.dec, 'pad-added', self.on_pad_added)
 
+    @property
+    def framerate(self):
+        return self._framerate
+
+    @framerate.setter
+    def framerate(self, framerate):
+        # Keep a FrameClock in sync so per-frame conversions are cheap:
+        self._framerate = framerate
+        self.clock = (None if framerate is None else FrameClock(framerate))
+
     def get_duration(self):
         (success, ns) = self.pipeline.query_duration(Gst.Format.TIME)
         if success is True:
@@ -386,17 +514,21 @@ class Decoder(Pipeline):
         )
 
     def frame_to_nanosecond(self, frame):
-        return frame_to_nanosecond(frame, self.framerate)
+        return self.clock.frame_to_nanosecond(frame)
 
     def nanosecond_to_frame(self, nanosecond):
-        return nanosecond_to_frame(nanosecond, self.framerate)
+        return self.clock.nanosecond_to_frame(nanosecond)
 
     def seek_simple(self, ns, key_unit=False):
         flags = (FLAGS_KEY_UNIT if key_unit is True else FLAGS_ACCURATE)
+        self.trace('seek', {'start': ns, 'key_unit': key_unit})
         self.pipeline.seek_simple(Gst.Format.TIME, flags, ns)
 
     def seek(self, start_ns, stop_ns, key_unit=False):
         flags = (FLAGS_KEY_UNIT if key_unit is True else FLAGS_ACCURATE)
+        self.trace('seek',
+            {'start': start_ns, 'stop': stop_ns, 'key_unit': key_unit}
+        )
         self.pipeline.seek(
             1.0,
             Gst.Format.TIME,        
@@ -0,0 +1,204 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Incremental intrinsic hashing of a project's edit graph.
+
+`schema.save_to_intrinsic()` walks the whole graph below the root on every
+call.  But intrinsic IDs are content addressed, so when a node changes, only
+that node and its ancestors get new IDs.
+
+`IntrinsicIndex` fetches docs on demand, keeping the most recently used ones
+and a reverse index from each child to the cached nodes that reference it (the
+same relationship the ``node/src`` view emits).  It follows the project
+database's ``_changes`` feed (without docs) only for invalidation: a changed
+node is dropped from the cache along with its cached intrinsic ID and those of
+its ancestors, and `IntrinsicIndex.save()` only rehashes that dirty path.
+
+Dropping a doc to stay under `MAX_DOCS` also drops the cached IDs of its
+ancestors, as its own children are no longer tracked.  The IDs are identical
+to those from `schema.save_to_intrinsic()`, because the same
+`schema.intrinsic_graph()` does the hashing, just with a cache that outlives a
+single call.
+"""
+
+from collections import OrderedDict
+import threading
+import logging
+
+from dbase32 import RANDOM_B32LEN
+from .schema import iter_src, intrinsic_graph
+from .bulk import WriteBatcher, IGNORE
+
+
+log = logging.getLogger(__name__)
+
+# Max docs kept per project:
+MAX_DOCS = 4096
+
+
+class _Results(dict):
+    """
+    Cache for `schema.intrinsic_graph()` that records newly computed IDs.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.new = set()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.new.add(key)
+
+
+def get_children(doc):
+    """
+    Return the IDs a novacut/node *doc* references.
+
+    For example:
+
+    >>> doc = {'type': 'novacut/node', 'node': {'src': ['A', {'id': 'B'}]}}
+    >>> sorted(get_children(doc))
+    ['A', 'B']
+    >>> get_children({'type': 'dmedia/file'})
+    set()
+
+    """
+    if doc.get('type') != 'novacut/node':
+        return set()
+    try:
+        return set(iter_src(doc['node']['src']))
+    except (KeyError, TypeError):
+        return set()
+
+
+class IntrinsicIndex:
+    def __init__(self, src, dst, max_docs=MAX_DOCS):
+        if max_docs < 1:
+            raise ValueError('need max_docs >= 1; got {!r}'.format(max_docs))
+        self.src = src
+        self.dst = dst
+        self.max_docs = max_docs
+        self.docs = OrderedDict()
+        self.children = {}
+        self.parents = {}
+        self.results = _Results()
+        self.since = None
+        self.lock = threading.Lock()
+
+    def get_doc(self, _id):
+        try:
+            doc = self.docs[_id]
+            self.docs.move_to_end(_id)
+            return doc
+        except KeyError:
+            pass
+        doc = self.src.get(_id)
+        self.apply(_id, doc)
+        return doc
+
+    def apply(self, _id, doc):
+        """
+        Update the index for a fetched (or dropped, when *doc* is None) doc.
+        """
+        for child in self.children.pop(_id, ()):
+            parents = self.parents[child]
+            parents.discard(_id)
+            if not parents:
+                del self.parents[child]
+        if doc is None:
+            self.docs.pop(_id, None)
+        else:
+            self.docs[_id] = doc
+            children = get_children(doc)
+            if children:
+                self.children[_id] = children
+                for child in children:
+                    self.parents.setdefault(child, set()).add(_id)
+        self.invalidate(_id)
+
+    def invalidate(self, _id):
+        """
+        Drop the cached intrinsic IDs of *_id* and all its ancestors.
+        """
+        self.results.pop(_id, None)
+        if len(_id) != RANDOM_B32LEN:
+            # A file (or intrinsic node) ID doesn't change with its doc:
+            return
+        stack = list(self.parents.get(_id, ()))
+        seen = set()
+        while stack:
+            parent = stack.pop()
+            if parent in seen:
+                continue
+            seen.add(parent)
+            self.results.pop(parent, None)
+            stack.extend(self.parents.get(parent, ()))
+
+    def trim(self):
+        """
+        Drop the least recently used docs beyond `IntrinsicIndex.max_docs`.
+        """
+        while len(self.docs) > self.max_docs:
+            self.apply(next(iter(self.docs)), None)
+
+    def update(self):
+        """
+        Drop the docs that changed in the project database since the last
+        update.
+        """
+        if self.since is None:
+            # Nothing is cached yet, so earlier changes don't matter:
+            self.since = self.src.get()['update_seq']
+            return 0
+        changes = self.src.get('_changes', since=self.since)
+        for row in changes['results']:
+            _id = row['id']
+            if not _id.startswith('_design/'):
+                self.apply(_id, None)
+        self.since = changes['last_seq']
+        return len(changes['results'])
+
+    def intrinsic_id(self, root):
+        return intrinsic_graph(root, self.get_doc, self.results)
+
+    def save(self, root):
+        """
+        Save the intrinsic graph of *root* to the destination database.
+
+        Only docs for nodes hashed since the last save are written.
+        """
+        with self.lock:
+            self.update()
+            self.results.new.clear()
+            iroot = self.intrinsic_id(root)
+            new = self.results.new
+            self.results.new = set()
+            log.info('Hashed %d changed nodes below %s', len(new), root)
+            with WriteBatcher(self.dst, max_delay=None) as batch:
+                for key in sorted(new):
+                    doc = dict(self.results[key])
+                    doc.pop('_rev', None)
+                    doc.pop('_attachments', None)
+                    batch.save(doc, IGNORE)
+            self.trim()
+            return iroot
+
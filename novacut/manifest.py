@@ -0,0 +1,175 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Per-frame digest manifests for cheaply verifying and comparing renders.
+
+A `FrameManifest` is filled in by `novacut.render.Output` during a render.  It
+records a digest of each frame just before it's encoded, plus the timestamps
+and size of each encoded packet.  Comparing two renders is then just a matter
+of comparing their manifests, no decoding needed.
+
+For example:
+
+>>> m1 = FrameManifest()
+>>> m1.add_frame(b'frame zero', 0, 41666666)
+>>> m1.add_frame(b'frame one', 41666666, 41666667)
+>>> m2 = FrameManifest.from_dict(m1.to_dict())
+>>> diff_manifests(m1, m2)
+()
+>>> m2.frames[1] = m2.frames[1]._replace(digest='00')
+>>> diff_manifests(m1, m2)
+(1,)
+
+These digests are not used for anything security related, so a fast hash is
+used rather than SHA-1.
+"""
+
+import os
+from os import path
+import json
+import logging
+from collections import namedtuple
+
+try:
+    from hashlib import blake2b
+except ImportError:
+    blake2b = None
+    from hashlib import md5
+
+
+log = logging.getLogger(__name__)
+FrameInfo = namedtuple('FrameInfo', 'digest pts duration')
+PacketInfo = namedtuple('PacketInfo', 'pts dts size')
+
+# Manifest is saved alongside the render, at the render filename plus this:
+MANIFEST_EXT = '.manifest.json'
+
+# Once a render is imported into Dmedia, its manifest is kept in here:
+MANIFEST_DIR = path.join('.cache', 'novacut', 'manifests')
+
+# Same value as Gst.CLOCK_TIME_NONE, stored as None in the manifest:
+CLOCK_TIME_NONE = 2**64 - 1
+
+if blake2b is not None:
+    HASH_NAME = 'blake2b-160'
+
+    def frame_digest(data):
+        return blake2b(data, digest_size=20).hexdigest()
+else:
+    HASH_NAME = 'md5'
+
+    def frame_digest(data):
+        return md5(data).hexdigest()
+
+
+def _clock_time(value):
+    return (None if value == CLOCK_TIME_NONE else value)
+
+
+class FrameManifest:
+    def __init__(self, hash_name=HASH_NAME):
+        self.hash_name = hash_name
+        self.frames = []
+        self.packets = []
+
+    def add_frame(self, data, pts, duration):
+        self.frames.append(FrameInfo(frame_digest(data), pts, duration))
+
+    def add_packet(self, pts, dts, size):
+        self.packets.append(
+            PacketInfo(_clock_time(pts), _clock_time(dts), size)
+        )
+
+    def to_dict(self):
+        return {
+            'hash': self.hash_name,
+            'frames': [list(f) for f in self.frames],
+            'packets': [list(p) for p in self.packets],
+        }
+
+    @classmethod
+    def from_dict(cls, obj):
+        inst = cls(obj['hash'])
+        inst.frames.extend(FrameInfo(*f) for f in obj['frames'])
+        inst.packets.extend(PacketInfo(*p) for p in obj['packets'])
+        return inst
+
+    def save(self, filename):
+        log.info('Saving manifest of %d frames to %r',
+            len(self.frames), filename
+        )
+        with open(filename, 'w') as fp:
+            json.dump(self.to_dict(), fp, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'r') as fp:
+            return cls.from_dict(json.load(fp))
+
+
+def diff_manifests(m1, m2):
+    """
+    Return indexes of frames that differ between two manifests.
+
+    Frames present in only one of the manifests are included.
+    """
+    if m1.hash_name != m2.hash_name:
+        raise ValueError(
+            'cannot compare {!r} with {!r} manifest'.format(
+                m1.hash_name, m2.hash_name
+            )
+        )
+    (f1, f2) = (m1.frames, m2.frames)
+    common = min(len(f1), len(f2))
+    diff = [i for i in range(common) if f1[i] != f2[i]]
+    diff.extend(range(common, max(len(f1), len(f2))))
+    return tuple(diff)
+
+
+def manifest_filename(file_id, home=None):
+    """
+    Return the filename of the manifest for the render with *file_id*.
+
+    For example:
+
+    >>> manifest_filename('FILEID', home='/home/user')
+    '/home/user/.cache/novacut/manifests/FILEID.manifest.json'
+
+    """
+    if home is None:
+        home = path.abspath(os.environ['HOME'])
+    return path.join(home, MANIFEST_DIR, file_id + MANIFEST_EXT)
+
+
+def move_manifest(filename, file_id, home=None):
+    """
+    Move the manifest saved next to *filename* to its place for *file_id*.
+
+    Returns the new manifest filename, or ``None`` if there is no manifest.
+    """
+    src = filename + MANIFEST_EXT
+    if not path.isfile(src):
+        return None
+    dst = manifest_filename(file_id, home)
+    os.makedirs(path.dirname(dst), exist_ok=True)
+    os.replace(src, dst)
+    return dst
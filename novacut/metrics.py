@@ -0,0 +1,278 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+In-process metrics (counters, gauges, histograms) for `novacut-service`.
+
+Metrics are rendered in the Prometheus text exposition format.  For example:
+
+>>> registry = Registry()
+>>> jobs = registry.add(Counter('jobs_total', 'Jobs run', ('type',)))
+>>> jobs.labels('render_job').inc()
+>>> print(registry.render(), end='')
+# HELP jobs_total Jobs run
+# TYPE jobs_total counter
+jobs_total{type="render_job"} 1
+
+To keep overhead low on hot paths, hold on to the child returned by
+`Metric.labels()` rather than looking it up each time.
+"""
+
+from bisect import bisect_left
+from functools import partial
+import threading
+
+
+TYPE_ERROR = '{}: need a {!r}; got a {!r}: {!r}'
+
+# Default histogram buckets, in seconds, suitable for job durations:
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 30, 60, 120, 300, 600,
+)
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_value(value):
+    """
+    Format a sample value.
+
+    For example:
+
+    >>> _format_value(3)
+    '3'
+    >>> _format_value(float('inf'))
+    '+Inf'
+
+    """
+    if value == float('inf'):
+        return '+Inf'
+    if value == float('-inf'):
+        return '-Inf'
+    return repr(value)
+
+
+def _format_labels(names, values):
+    """
+    Format a label set.
+
+    For example:
+
+    >>> _format_labels(('type', 'status'), ('render_job', 'error'))
+    '{type="render_job",status="error"}'
+    >>> _format_labels((), ())
+    ''
+
+    """
+    if not names:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, _escape(str(value)))
+        for (name, value) in zip(names, values)
+    ) + '}'
+
+
+class CounterChild:
+    __slots__ = ('value', 'lock')
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if amount < 0:
+            raise ValueError('counters can only increase; got {!r}'.format(
+                amount
+            ))
+        with self.lock:
+            self.value += amount
+
+    def samples(self):
+        return (('', (), self.value),)
+
+
+class GaugeChild:
+    __slots__ = ('value', 'lock')
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def samples(self):
+        return (('', (), self.value),)
+
+
+class HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', 'lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self):
+        with self.lock:
+            counts = list(self.counts)
+            (total, count) = (self.sum, self.count)
+        cumulative = 0
+        for (bound, n) in zip(self.buckets + (float('inf'),), counts):
+            cumulative += n
+            yield ('_bucket', (('le', _format_value(bound)),), cumulative)
+        yield ('_sum', (), total)
+        yield ('_count', (), count)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames, new_child):
+        if not isinstance(labelnames, tuple):
+            raise TypeError(
+                TYPE_ERROR.format('labelnames', tuple, type(labelnames),
+                    labelnames
+                )
+            )
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.new_child = new_child
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def labels(self, *values):
+        """
+        Return the child metric for the label *values*.
+        """
+        try:
+            return self.children[values]
+        except KeyError:
+            pass
+        if len(values) != len(self.labelnames):
+            raise ValueError('{}: need {} label values; got {!r}'.format(
+                self.name, len(self.labelnames), values
+            ))
+        with self.lock:
+            return self.children.setdefault(values, self.new_child())
+
+    def render(self):
+        lines = [
+            '# HELP {} {}'.format(self.name, self.help),
+            '# TYPE {} {}'.format(self.name, self.kind),
+        ]
+        with self.lock:
+            children = sorted(self.children.items())
+        for (values, child) in children:
+            for (suffix, extra, value) in child.samples():
+                names = self.labelnames + tuple(e[0] for e in extra)
+                allvalues = values + tuple(e[1] for e in extra)
+                lines.append('{}{}{} {}'.format(self.name, suffix,
+                    _format_labels(names, allvalues), _format_value(value)
+                ))
+        return '\n'.join(lines) + '\n'
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames, CounterChild)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames, GaugeChild)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames,
+            partial(HistogramChild, self.buckets)
+        )
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def add(self, metric):
+        if not isinstance(metric, Metric):
+            raise TypeError(
+                TYPE_ERROR.format('metric', Metric, type(metric), metric)
+            )
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(
+                    'metric {!r} already registered'.format(metric.name)
+                )
+            self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text exposition format.
+        """
+        with self.lock:
+            metrics = [self.metrics[name] for name in sorted(self.metrics)]
+        return ''.join(m.render() for m in metrics)
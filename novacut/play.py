@@ -25,18 +25,22 @@ Realtime preview playback of a (flattened) Novacut edit graph.
 
 from fractions import Fraction
 from queue import Queue, Full, Empty
+import time
 import logging
 
 from gi.repository import GLib, Gst
 
-from .timefuncs import video_pts_and_duration
+from .timefuncs import FrameClock
+from .prefetch import Prefetcher
+from .timeline import SliceIndex
 from .gsthelpers import Decoder, Pipeline, make_element, add_and_link_elements
+from .gsthelpers import make_caps
 
 
 log = logging.getLogger(__name__)
 QUEUE_SIZE = 16
 SPARE_DECODERS = 1
-VIDEO_CAPS = Gst.caps_from_string('video/x-raw')
+VIDEO_CAPS = make_caps('video/x-raw', {})
 
 
 class SliceDecoder(Decoder):
@@ -103,13 +107,17 @@ class SliceDecoder(Decoder):
 
 
 class VideoSink(Pipeline):
-    def __init__(self, callback, sample_queue, xid):
+    def __init__(self, callback, sample_queue, xid, start=0,
+            on_first_frame=None):
         super().__init__(callback)
         self.sample_queue = sample_queue
         self.xid = xid
-        self.frame = 0
+        self.start = start
+        self.frame = start
+        self.on_first_frame = on_first_frame
         self.sent_eos = False
         self.framerate = Fraction(30000, 1001)
+        self.clock = FrameClock(self.framerate)
 
         # Create elements:
         self.src = make_element('appsrc', {'format': 3})
@@ -130,6 +138,8 @@ class VideoSink(Pipeline):
         GLib.timeout_add(50, self.wait_for_queue_to_fill)
 
     def wait_for_queue_to_fill(self):
+        if self.success is not None:
+            return False  # Destroyed, say by `Player.seek()`
         if self.sample_queue.full():
             self.play()
             return False
@@ -158,9 +168,14 @@ class VideoSink(Pipeline):
                     log.error('miss at frame %d', self.frame)
                     self.pause()
         if miss is True:
-            GLib.timeout_add(2000, self.play)
+            GLib.timeout_add(2000, self.resume)
         return sample
 
+    def resume(self):
+        if self.success is None:
+            self.play()
+        return False
+
     def on_need_data(self, appsrc, amount):
         try:
             if self.sent_eos:
@@ -175,36 +190,104 @@ class VideoSink(Pipeline):
             log.info('need-data, frame=%d, queue=%d', self.frame,
                 self.q.get_property('current-level-buffers')
             )
-            ts = video_pts_and_duration(self.frame, self.framerate)
+            # Timestamps start from zero, even after a seek:
+            ts = self.clock.video_pts_and_duration(self.frame - self.start)
             self.frame += 1
             buf = sample.get_buffer()
             buf.pts = ts.pts
             buf.duration = ts.duration
             appsrc.emit('push-sample', sample)    
+            if self.frame == self.start + 1:
+                self.trace('first-frame', {'frame': self.start})
+                if self.on_first_frame is not None:
+                    GLib.idle_add(self.on_first_frame, self)
         except:
             log.exception('%s.on_need_data():', self.__class__.__name__)
             self.complete(False)
 
 
 class Player:
-    def __init__(self, callback, slices, xid):
+    def __init__(self, callback, slices, xid, prefetch=False, start=0):
         if not callable(callback):
             raise TypeError(
                 'callback: not callable: {!r}'.format(callback)
             )
         self.callback = callback
         self.slices = list(slices)
+        self.timeline = SliceIndex(self.slices)
+        self.xid = xid
+        self.prefetch = prefetch
         self.success = None
-        self.total_frames = sum(s.stop - s.start for s in slices)
+        self.total_frames = self.timeline.frames
         self.sample_queue = Queue(QUEUE_SIZE)
+        self.pending = []
         self.prerolled = []
+        self.index = 0
+        self.prefetcher = None
         self.input = None
-        self.output = VideoSink(self.on_output_complete, self.sample_queue, xid)
+        self.output = None
+        self.running = False
+        self.seek_time = None
+        self.time_to_first_frame = None
+        self.seek(start)
+
+    def seek(self, frame):
+        """
+        Start playback at timeline *frame*.
+
+        This can be called before `Player.run()`, or while playing, in which
+        case the current decoders and output are replaced.  Only the slices
+        from the one containing *frame* onward are decoded.
+        """
+        if not (frame == 0 or 0 <= frame < self.total_frames):
+            raise IndexError(
+                'need 0 <= frame < {}; got {}'.format(self.total_frames, frame)
+            )
+        log.info('seek to frame %d of %d', frame, self.total_frames)
+        self.seek_time = time.monotonic()
+        self.time_to_first_frame = None
+        self.stop_inputs()
+        if self.output is not None:
+            self.output.destroy()
+
+        # The first slice is clipped to start at the right source frame:
+        self.pending = [
+            s for (i, s) in self.timeline.overlapping(frame, self.total_frames)
+        ]
+        self.index = 0
+        if self.prefetch is True:
+            self.prefetcher = Prefetcher(self.pending)
+        self.start = frame
+        self.output = VideoSink(self.on_output_complete, self.sample_queue,
+            self.xid, frame, self.on_first_frame
+        )
+        if self.running:
+            self.start_playback()
+
+    def stop_inputs(self):
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+            self.prefetcher = None
+        while self.prerolled:
+            dec = self.prerolled.pop(0)
+            dec.destroy()
+        if self.input is not None:
+            self.input.destroy()
+            self.input = None
+        # Drop samples decoded for the old position:
+        while True:
+            try:
+                self.sample_queue.get(block=False)
+            except Empty:
+                break
 
     def next_preroll(self):
-        if not self.slices:
+        if not self.pending:
             return False
-        s = self.slices.pop(0)
+        s = self.pending.pop(0)
+        if self.prefetcher is not None:
+            self.prefetcher.advance(self.index)
+        self.index += 1
         dec = SliceDecoder(self.on_input_complete, self.sample_queue, s)
         self.prerolled.append(dec)
         dec.preroll()
@@ -223,24 +306,34 @@ class Player:
             self.input.run()
             self.next_preroll()
 
+    def start_playback(self):
+        if self.prefetcher is not None:
+            self.prefetcher.start()
+        self.init_preroll()
+        self.next()
+        self.output.run()
+
     def run(self):
         log.info('**** Plaing %s slices, %s frames...',
             len(self.slices), self.total_frames
         )
-        self.init_preroll()
-        self.next()
-        self.output.run()
+        self.running = True
+        self.start_playback()
+
+    def on_first_frame(self, inst):
+        if inst is not self.output or self.seek_time is None:
+            return
+        self.time_to_first_frame = time.monotonic() - self.seek_time
+        log.info('First frame %d after %.3f seconds',
+            inst.start, self.time_to_first_frame
+        )
 
     def destroy(self):
         if self.success is not True:
             self.success = False
         log.info('%s.destroy()', self.__class__.__name__)
-        while self.prerolled:
-            dec = self.prerolled.pop(0)
-            dec.destroy()
-        if self.input is not None:
-            self.input.destroy()
-            self.input = None
+        self.running = False
+        self.stop_inputs()
         if self.output is not None:
             self.output.destroy()
             self.output = None
@@ -264,11 +357,12 @@ class Player:
     def check_output_frames(self):
         if self.total_frames == self.output.frame:
             log.info('Output received all %s frames from Input!',
-                self.total_frames
+                self.total_frames - self.output.start
             )
             return True
         log.error('Expected %s total frames, output received %s',
-            self.total_frames, self.output.frame
+            self.total_frames - self.output.start,
+            self.output.frame - self.output.start
         )
         return False
 
@@ -0,0 +1,212 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Read-ahead of the source media for upcoming slices.
+
+A `Prefetcher` walks the slice list in a background thread, asking the kernel
+(via ``posix_fadvise(POSIX_FADV_WILLNEED)``) to start reading the byte ranges
+each slice will need, so that opening and seeking into the next slice doesn't
+stall on a cold disk.
+
+The byte range of a slice is estimated from the file size and, once known, the
+number of frames in the file (see `Prefetcher.set_frames()`).  Before that,
+small files are read-ahead entirely, and for large files only the head and
+tail are, which is where containers keep their headers and seek index.
+
+Outstanding read-ahead (bytes advised for slices that haven't started
+decoding yet) is bounded by a byte budget.
+"""
+
+import os
+import time
+import threading
+import logging
+
+
+log = logging.getLogger(__name__)
+
+# Max bytes advised ahead of the slice currently being decoded:
+PREFETCH_BUDGET = 256 * 1024 * 1024
+
+# Bytes at the start and end of a file that hold the container index:
+HEAD_BYTES = 1024 * 1024
+TAIL_BYTES = 1024 * 1024
+
+# Frames of padding each side of a slice, roughly a GOP:
+PAD_FRAMES = 30
+
+
+def merge_ranges(ranges):
+    """
+    Merge overlapping or adjacent ``(offset, length)`` byte ranges.
+
+    For example:
+
+    >>> merge_ranges([(100, 50), (0, 10), (10, 5), (120, 100)])
+    [(0, 15), (100, 120)]
+
+    """
+    merged = []
+    for (offset, length) in sorted(ranges):
+        if length <= 0:
+            continue
+        if merged and offset <= merged[-1][0] + merged[-1][1]:
+            (prev, prev_length) = merged[-1]
+            end = max(prev + prev_length, offset + length)
+            merged[-1] = (prev, end - prev)
+        else:
+            merged.append((offset, length))
+    return merged
+
+
+def get_ranges(size, start, stop, frames=None):
+    """
+    Estimate the byte ranges needed to decode frames *start* to *stop*.
+
+    When the number of *frames* in the file is known, the range is
+    interpolated from the file size, with `PAD_FRAMES` of padding each side:
+
+    >>> get_ranges(100000000, 100, 200, frames=1000)
+    [(0, 1048576), (7000000, 16000000), (98951424, 1048576)]
+
+    Otherwise, the head and tail of the file are used:
+
+    >>> get_ranges(100 * 1024 * 1024, 100, 200)
+    [(0, 1048576), (103809024, 1048576)]
+
+    Files smaller than the head plus tail are read entirely:
+
+    >>> get_ranges(1500000, 100, 200)
+    [(0, 1500000)]
+
+    """
+    ranges = [
+        (0, min(size, HEAD_BYTES)),
+        (max(0, size - TAIL_BYTES), min(size, TAIL_BYTES)),
+    ]
+    if frames:
+        begin = max(0, (start - PAD_FRAMES) * size // frames)
+        end = min(size, (stop + PAD_FRAMES) * size // frames)
+        ranges.append((begin, end - begin))
+    return merge_ranges(ranges)
+
+
+def advise_willneed(filename, ranges):
+    """
+    Ask the kernel to read-ahead *ranges* of *filename*.
+    """
+    fd = os.open(filename, os.O_RDONLY)
+    try:
+        for (offset, length) in ranges:
+            os.posix_fadvise(fd, offset, length, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+class Prefetcher:
+    def __init__(self, slices, budget=PREFETCH_BUDGET):
+        self.slices = tuple(slices)
+        self.budget = budget
+        self.frames = {}
+        self.advised = [0] * len(self.slices)
+        self.position = 0
+        self.closed = False
+        self.bytes = 0
+        self.calls = 0
+        self.elapsed = 0.0
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def start(self):
+        if not hasattr(os, 'posix_fadvise'):
+            log.warning('os.posix_fadvise() not available, not prefetching')
+            return
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def set_frames(self, filename, frames):
+        """
+        Record the total *frames* in *filename*, for better range estimates.
+        """
+        with self.cond:
+            self.frames[filename] = frames
+
+    def advance(self, index):
+        """
+        Note that slice *index* has started decoding.
+        """
+        with self.cond:
+            self.position = index
+            self.cond.notify_all()
+
+    def outstanding(self, index):
+        return sum(self.advised[self.position + 1:index])
+
+    def wait_for_budget(self, index, nbytes):
+        with self.cond:
+            while not self.closed and index > self.position:
+                if self.outstanding(index) + nbytes <= self.budget:
+                    break
+                self.cond.wait()
+            return not self.closed
+
+    def get_ranges(self, s, size):
+        with self.cond:
+            frames = self.frames.get(s.filename)
+        return get_ranges(size, s.start, s.stop, frames)
+
+    def run(self):
+        for (i, s) in enumerate(self.slices):
+            try:
+                size = os.stat(s.filename).st_size
+                ranges = self.get_ranges(s, size)
+                nbytes = sum(r[1] for r in ranges)
+                if not self.wait_for_budget(i, nbytes):
+                    return
+                # The frame count may have been learned while waiting:
+                ranges = self.get_ranges(s, size)
+                nbytes = sum(r[1] for r in ranges)
+                start = time.perf_counter()
+                advise_willneed(s.filename, ranges)
+                with self.cond:
+                    self.elapsed += time.perf_counter() - start
+                    self.advised[i] = nbytes
+                    self.bytes += nbytes
+                    self.calls += len(ranges)
+            except OSError:
+                log.exception('Could not prefetch %r', s.filename)
+
+    def to_dict(self):
+        with self.cond:
+            return {
+                'bytes': self.bytes,
+                'calls': self.calls,
+                'elapsed': self.elapsed,
+            }
@@ -22,11 +22,14 @@
 from fractions import Fraction
 from collections import namedtuple
 import queue
+import time
 import logging
 
 from gi.repository import Gst
 
-from .timefuncs import nanosecond_to_frame, video_pts_and_duration
+from .timefuncs import FrameClock
+from .manifest import MANIFEST_EXT, FrameManifest
+from .prefetch import Prefetcher
 from .gsthelpers import (
     VIDEOSCALE_METHOD,
     Pipeline,
@@ -87,12 +90,20 @@ def _fraction(obj):
 
 
 class Input(Decoder):
-    def __init__(self, callback, buffer_queue, s, input_caps):
+    def __init__(self, callback, buffer_queue, s, input_caps, stats=None):
         super().__init__(callback, s.filename, video=True)
         self.buffer_queue = buffer_queue
         assert 0 <= s.start < s.stop
         self.s = s
         self.frame = s.start
+        self.stats = stats
+        self.run_start = None
+        self.convert_start = None
+        self.first_sample = None
+        self.last_sample = None
+        self.seek_time = 0.0
+        self.convert_time = 0.0
+        self.wait_time = 0.0
 
         # Create elements
         self.convert = make_element('videoconvert')
@@ -108,12 +119,19 @@ class Input(Decoder):
         # Wait until decode element's pad capabilities are known to
         # add elements and link pipeline.  Must be in paused state for this.
         self.connect(self.dec, 'pad-added', self.link_pipeline)
+
+        # Time the convert/scale stage when collecting a stage breakdown:
+        if stats is not None:
+            self.add_probe(self.convert.get_static_pad('sink'),
+                Gst.PadProbeType.BUFFER, self.on_convert_probe
+            )
         self.pause()
 
     def run(self):
         try:
             s = self.s
             log.info('START [%d:%d] %r', s.start, s.stop, s.filename)
+            self.run_start = time.perf_counter()
             self.pause()
             self.seek_by_frame(s.start, s.stop)
             self.play()
@@ -144,20 +162,48 @@ class Input(Decoder):
             raise
 
     def check_frame(self, buf):
-        frame = nanosecond_to_frame(buf.pts, self.framerate)
+        frame = self.nanosecond_to_frame(buf.pts)
         if self.frame != frame:
             raise ValueError(
                 'expected frame {!r}, got {!r}'.format(self.frame, frame)
             )
 
+    def on_convert_probe(self, pad, info):
+        self.convert_start = time.perf_counter()
+        return Gst.PadProbeReturn.OK
+
+    def mark_sample(self):
+        now = time.perf_counter()
+        if self.first_sample is None:
+            self.seek_time = self.convert_start - self.run_start
+            self.first_sample = self.convert_start
+        self.convert_time += now - self.convert_start
+        self.last_sample = now
+
+    def record_stats(self):
+        stats = self.stats
+        stats.add('seek', self.seek_time)
+        stats.add('convert', self.convert_time)
+        stats.add('queue_wait', self.wait_time)
+        # Decoding runs in its own streaming thread, so it's not directly
+        # measured; it's whatever is left of the streaming time:
+        streaming = self.last_sample - self.first_sample
+        stats.add('decode',
+            max(0.0, streaming - self.convert_time - self.wait_time)
+        )
+
     def on_new_sample(self, appsink):
         try:
             buf = appsink.emit('pull-sample').get_buffer()
             self.check_frame(buf)
             self.frame += 1
+            if self.stats is not None:
+                self.mark_sample()
+            start = time.perf_counter()
             while self.success is None:
                 try:
                     self.buffer_queue.put(buf, timeout=0.1)
+                    self.wait_time += time.perf_counter() - start
                     return Gst.FlowReturn.OK
                 except queue.Full:
                     pass
@@ -174,6 +220,8 @@ class Input(Decoder):
             self.complete(False)
         else:
             log.info('END [%d:%d] %r', s.start, s.stop, s.filename)
+            if self.stats is not None:
+                self.record_stats()
             self.complete(True)
 
 
@@ -192,14 +240,19 @@ def make_video_caps(desc):
 
 
 class Output(Pipeline):
-    def __init__(self, callback, buffer_queue, settings, filename):
+    def __init__(self, callback, buffer_queue, settings, filename,
+            manifest=None, stats=None):
         super().__init__(callback)
         self.buffer_queue = buffer_queue
+        self.manifest = manifest
+        self.stats = stats
         self.frame = 0
         self.sent_eos = False
+        self.encode_start = None
 
         desc = settings['video']['caps']
         (self.framerate, self.input_caps, output_caps) = make_video_caps(desc)
+        self.clock = FrameClock(self.framerate)
 
         # Create elements:
         self.src = make_element('appsrc', {'caps': output_caps, 'format': 3})
@@ -218,9 +271,42 @@ class Output(Pipeline):
         # Connect signal handlers using Pipeline.connect():
         self.connect(self.src, 'need-data', self.on_need_data)
 
+        # Record encoded packets when building a FrameManifest:
+        if manifest is not None:
+            self.add_probe(self.enc.get_static_pad('src'),
+                Gst.PadProbeType.BUFFER, self.on_packet_probe
+            )
+
+        # Time the encoder when collecting a stage breakdown:
+        if stats is not None:
+            self.add_probe(self.enc.get_static_pad('sink'),
+                Gst.PadProbeType.BUFFER, self.on_encode_probe
+            )
+            self.add_probe(self.enc.get_static_pad('src'),
+                Gst.PadProbeType.BUFFER, self.on_encoded_probe
+            )
+
     def run(self):
         self.play()
 
+    def on_packet_probe(self, pad, info):
+        buf = info.get_buffer()
+        self.manifest.add_packet(buf.pts, buf.dts, buf.get_size())
+        return Gst.PadProbeReturn.OK
+
+    def on_encode_probe(self, pad, info):
+        self.encode_start = time.perf_counter()
+        return Gst.PadProbeReturn.OK
+
+    def on_encoded_probe(self, pad, info):
+        # Only count the first packet pushed after each input frame; for
+        # encoders with internal threads this is a lower bound:
+        start = self.encode_start
+        if start is not None:
+            self.encode_start = None
+            self.stats.add('encode', time.perf_counter() - start)
+        return Gst.PadProbeReturn.OK
+
     def on_eos(self, bus, msg):
         self.complete(True)
 
@@ -244,9 +330,14 @@ class Output(Pipeline):
                 self.sent_eos = True
                 appsrc.emit('end-of-stream')
             else:
-                ts = video_pts_and_duration(self.frame, self.framerate)
+                ts = self.clock.video_pts_and_duration(self.frame)
                 buf.pts = ts.pts
                 buf.duration = ts.duration
+                if self.manifest is not None:
+                    self.manifest.add_frame(
+                        buf.extract_dup(0, buf.get_size()),
+                        ts.pts, ts.duration
+                    )
                 self.frame += 1
                 appsrc.emit('push-buffer', buf)
         except:
@@ -255,21 +346,30 @@ class Output(Pipeline):
 
 
 class Renderer:
-    def __init__(self, callback, slices, settings, filename):
+    def __init__(self, callback, slices, settings, filename, manifest=False,
+            stats=None, prefetch=False):
         if not callable(callback):
             raise TypeError(
                 'callback: not callable: {!r}'.format(callback)
             )
         self.callback = callback
         self.slices = slices
+        self.filename = filename
         self.success = None
         self.total_frames = sum(s.stop - s.start for s in slices)
         self.buffer_queue = queue.Queue(QUEUE_SIZE)
         self.input = None
-        self.output = Output(
-            self.on_output_complete, self.buffer_queue, settings, filename
+        self.index = -1
+        self.manifest = (FrameManifest() if manifest is True else None)
+        self.prefetcher = (Prefetcher(slices) if prefetch is True else None)
+        self.stats = stats
+        start = time.perf_counter()
+        self.output = Output(self.on_output_complete, self.buffer_queue,
+            settings, filename, self.manifest, stats
         )
         self.input_caps = self.output.input_caps
+        if stats is not None:
+            stats.add('construct', time.perf_counter() - start)
 
     def run(self):
         log.info('**** Rendering %s slices, %s frames...',
@@ -291,11 +391,15 @@ class Renderer:
         # But this detail is still worthwhile and will tend to keep memory
         # usage a bit lower.
         self.output.run()
+        if self.prefetcher is not None:
+            self.prefetcher.start()
         self.slices_iter = iter(self.slices)
         self.next()
 
     def destroy(self):
         log.info('Renderer.destroy()')
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
         if self.input is not None:
             self.input.destroy()
             self.input = None
@@ -331,11 +435,29 @@ class Renderer:
         if s is None:
             self.buffer_queue.put(None)
         else:
-            self.input = Input(
-                self.on_input_complete, self.buffer_queue, s, self.input_caps
+            self.index += 1
+            if self.prefetcher is not None:
+                self.prefetcher.advance(self.index)
+            start = time.perf_counter()
+            self.input = Input(self.on_input_complete, self.buffer_queue, s,
+                self.input_caps, self.stats
             )
+            if self.stats is not None:
+                self.stats.add('construct', time.perf_counter() - start)
+            if self.prefetcher is not None:
+                self.learn_frames(self.input)
             self.input.run()
 
+    def learn_frames(self, inst):
+        # The Input is prerolled, so the length of its file is now known:
+        if inst.framerate is None:
+            return
+        try:
+            frames = inst.nanosecond_to_frame(inst.get_duration())
+        except ValueError:
+            return
+        self.prefetcher.set_frames(inst.filename, frames)
+
     def on_input_complete(self, inst, success):
         assert inst is self.input
         if success is True:
@@ -355,10 +477,104 @@ class Renderer:
         )
         return False
 
+    def save_manifest(self):
+        if self.manifest is not None:
+            self.manifest.save(self.filename + MANIFEST_EXT)
+
     def on_output_complete(self, inst, success):
         assert inst is self.output
         if success is True and self.check_output_frames() is True:
+            self.save_manifest()
             self.complete(True)
         else:
             self.complete(False)
 
+
+# Demuxer to use for segments written by a given muxer:
+DEMUXERS = {
+    'matroskamux': 'matroskademux',
+    'webmmux': 'matroskademux',
+    'oggmux': 'oggdemux',
+    'qtmux': 'qtdemux',
+    'mp4mux': 'qtdemux',
+}
+
+
+def get_demuxer(desc):
+    """
+    Return the demuxer for files written by the muxer *desc*.
+
+    For example:
+
+    >>> get_demuxer({'name': 'matroskamux'})
+    'matroskademux'
+    >>> get_demuxer('oggmux')
+    'oggdemux'
+
+    """
+    name = (desc['name'] if isinstance(desc, dict) else desc)
+    try:
+        return DEMUXERS[name]
+    except KeyError:
+        raise ValueError('no demuxer for muxer {!r}'.format(name))
+
+
+class Joiner(Pipeline):
+    """
+    Join already encoded segments into a single file, without re-encoding.
+
+    Each segment must have been rendered with the same *settings* (see
+    `novacut.farm`).  Every segment starts at timestamp zero, and the concat
+    element adjusts the running time of each so they follow one another.
+    """
+
+    def __init__(self, callback, filenames, settings, filename):
+        super().__init__(callback)
+        if not filenames:
+            raise ValueError('need at least one segment to join')
+        self.filenames = filenames
+        demuxer = get_demuxer(settings['muxer'])
+
+        # Create elements:
+        self.concat = make_element('concat')
+        self.q = make_queue()
+        self.mux = make_element_from_desc(settings['muxer'])
+        self.sink = make_element('filesink',
+            {'location': filename, 'buffer-mode': 2}
+        )
+        add_and_link_elements(self.pipeline,
+            self.concat, self.q, self.mux, self.sink
+        )
+
+        # Request the concat pads up front so segments are played in order,
+        # regardless of the order their demuxers add pads:
+        self.sources = []
+        self.concat_pads = {}
+        for name in filenames:
+            src = make_element('filesrc', {'location': name})
+            demux = make_element(demuxer)
+            add_and_link_elements(self.pipeline, src, demux)
+            pad = self.concat.get_request_pad('sink_%u')
+            self.concat_pads[demux.get_name()] = pad
+            self.sources.append((src, demux))
+            self.connect(demux, 'pad-added', self.on_pad_added)
+
+    def run(self):
+        self.play()
+
+    def on_pad_added(self, element, pad):
+        try:
+            caps = pad.get_current_caps()
+            if caps is None:
+                caps = pad.query_caps(None)
+            string = caps.to_string()
+            log.debug('%s.on_pad_added(): %s', self.__class__.__name__, string)
+            if string.startswith('video/'):
+                pad.link(self.concat_pads[element.get_name()])
+        except:
+            log.exception('%s.on_pad_added():', self.__class__.__name__)
+            self.complete(False)
+            raise
+
+    def on_eos(self, bus, msg):
+        self.complete(True)
@@ -25,13 +25,18 @@ Adds CouchDB and Dmedia integration atop `novacut.render`.
 
 import os
 from os import path
+import time
 from datetime import datetime
+import threading
 import logging
 
 from gi.repository import GLib
 from microfiber import Database, dumps
 
 from .render import Slice, Renderer
+from .timeline import Timeline
+from .doccache import get_cache
+from .manifest import move_manifest
 
 
 log = logging.getLogger(__name__)
@@ -122,6 +127,8 @@ def get_raw_slices(db, root_id):
 
 
 def resolve_files(Dmedia, files):
+    # Only `novacut.farm` handles media that is spread across peers; a plain
+    # render (`Worker.run()`) still needs every file in a local store:
     _map = {}
     for _id in files:
         (file_id, status, name) = Dmedia.Resolve(_id)
@@ -139,21 +146,91 @@ def resolve_files(Dmedia, files):
     return _map
 
 
-def get_slices(Dmedia, db, root_id):
-    raw_slices = get_raw_slices(db, root_id)
-    files = sorted(set(r[1] for r in raw_slices))
-    _map = resolve_files(Dmedia, files)
+def resolve_timeline(Dmedia, timeline):
+    _map = resolve_files(Dmedia, sorted(timeline.files))
     return tuple(
         Slice(start, stop, _map[src])
-        for (_id, src, start, stop) in raw_slices
+        for (_id, src, start, stop) in timeline.slices
     )
 
 
+def get_slices(Dmedia, db, root_id):
+    return resolve_timeline(Dmedia, Timeline(get_raw_slices(db, root_id)))
+
+
+class _RecordingDB:
+    def __init__(self, db):
+        self.db = db
+        self.ids = set()
+
+    def get(self, _id):
+        self.ids.add(_id)
+        return self.db.get(_id)
+
+
+class TimelineIndex:
+    """
+    Cache of flattened timelines, kept current from the ``_changes`` feed.
+
+    Each cached `Timeline` remembers the node IDs that were read to build it,
+    and is dropped when any of those nodes changes.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.timelines = {}
+        self.deps = {}
+        self.roots = {}
+        self.since = None
+        self.lock = threading.Lock()
+
+    def invalidate(self, _id):
+        for root_id in self.roots.pop(_id, ()):
+            del self.timelines[root_id]
+            for dep in self.deps.pop(root_id):
+                roots = self.roots.get(dep)
+                if roots is not None:
+                    roots.discard(root_id)
+                    if not roots:
+                        del self.roots[dep]
+
+    def update(self):
+        if self.since is None:
+            # Nothing is cached yet, so there's no need to replay history:
+            self.since = self.db.get()['update_seq']
+            return
+        changes = self.db.get('_changes', since=self.since)
+        for row in changes['results']:
+            self.invalidate(row['id'])
+        self.since = changes['last_seq']
+
+    def get(self, root_id):
+        """
+        Return the `Timeline` for *root_id*, building it only if needed.
+        """
+        with self.lock:
+            self.update()
+            try:
+                return self.timelines[root_id]
+            except KeyError:
+                pass
+            db = _RecordingDB(self.db)
+            timeline = Timeline(get_raw_slices(db, root_id))
+            self.timelines[root_id] = timeline
+            self.deps[root_id] = db.ids
+            for _id in db.ids:
+                self.roots.setdefault(_id, set()).add(root_id)
+            return timeline
+
+
 class Worker:
-    def __init__(self, Dmedia, env):
+    def __init__(self, Dmedia, env, manifest=False):
         self.Dmedia = Dmedia
+        self.manifest = manifest
         self.novacut_db = Database('novacut-1', env)
         self.dmedia_db = Database('dmedia-1', env)
+        self.docs = get_cache(self.novacut_db)
+        self.timelines = TimelineIndex(self.novacut_db)
         self.mainloop = GLib.MainLoop()
 
     def on_complete(self, renderer, success):
@@ -161,32 +238,53 @@ class Worker:
         self.mainloop.quit()
 
     def run(self, job_id):
-        job = self.novacut_db.get(job_id)
+        # The job is saved again once rendered, so read the current revision:
+        self.docs.update(force=True)
+        job = self.docs.get(job_id)
         log.info('Rendering: %s', dumps(job, pretty=True))
-        settings = self.novacut_db.get(job['node']['settings'])
+        settings = self.docs.get(job['node']['settings'])
         log.info('With settings: %s', dumps(settings['node'], pretty=True))
 
-        root_id = job['node']['root']
-        slices = get_slices(self.Dmedia, self.novacut_db, root_id)
+        timeline = self.timelines.get(job['node']['root'])
+        slices = resolve_timeline(self.Dmedia, timeline)
 
         dst = self.Dmedia.AllocateTmp()
-        renderer = Renderer(self.on_complete, slices, settings['node'], dst)
+        renderer = Renderer(self.on_complete, slices, settings['node'], dst,
+            manifest=self.manifest, prefetch=True
+        )
+        start = time.monotonic()
         renderer.run()
         self.mainloop.run()
+        elapsed = time.monotonic() - start
         if renderer.success is not True:
             raise SystemExit('renderer encountered a fatal error')
         if path.getsize(dst) < 1:
             raise SystemExit('file-size is zero for {}'.format(job_id))
 
+        obj = self.save_render(job, settings['node'], dst)
+        obj['frames'] = renderer.total_frames
+        obj['elapsed'] = elapsed
+        log.info('Doc cache: %r', self.docs.to_dict())
+
+        return obj
+
+    def save_render(self, job, settings, dst):
+        """
+        Import the finished render *dst* into Dmedia and record it in *job*.
+        """
+        job_id = job['_id']
         obj = self.Dmedia.HashAndMove(dst, 'render')
         _id = obj['file_id']
+        manifest = move_manifest(dst, _id)
+        if manifest is not None:
+            obj['manifest'] = manifest
         doc = self.dmedia_db.get(_id)
         doc['render_of'] = job_id
 
         # Create the symlink
         ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        if settings['node'].get('ext'):
-            ts += '.' + settings['node']['ext']
+        if settings.get('ext'):
+            ts += '.' + settings['ext']
 
         home = path.abspath(os.environ['HOME'])
         name = path.join('Novacut', ts)
@@ -204,9 +302,8 @@ class Worker:
             'time': doc['time'],
             'link': name,
         }
-        self.novacut_db.save(job)
+        self.docs.save(job)
 
         obj['link'] = name
-
         return obj
 
@@ -135,7 +135,6 @@ import re
 
 from skein import skein512
 from dbase32 import db32enc, random_id, RANDOM_B32LEN
-from microfiber import Conflict
 from dmedia.schema import (
     _check,
     _at_least,
@@ -148,6 +147,8 @@ from dmedia.schema import (
     _intrinsic_id,
 )
 
+from .bulk import WriteBatcher, IGNORE
+
 
 # schema-compatibility version:
 VER = 1
@@ -169,6 +170,15 @@ DIGEST_BYTES = DIGEST_BITS // 8
 DIGEST_B32LEN = DIGEST_BITS // 5
 Intrinsic = namedtuple('Intrinsic', 'id data node')
 
+# Nodes with more src items than this are hashed incrementally, and their
+# inode docs don't get a "node" attachment:
+LARGE_NODE_SRC = 1000
+
+# Approximate size of the chunks fed to the hasher by iter_normalized():
+CHUNK_SIZE = 64 * 1024
+
+_normalized_encoder = json.JSONEncoder(sort_keys=True, separators=(',',':'))
+
 
 def normalized_dumps(obj):
     """
@@ -213,6 +223,56 @@ def hash_node(data):
     return db32enc(skein.digest())
 
 
+def iter_normalized(obj, chunk_size=CHUNK_SIZE):
+    """
+    Yield *obj* encoded as normalized JSON, in chunks of about *chunk_size*.
+
+    The chunks join to exactly what `normalized_dumps()` returns, but the
+    whole encoding is never held in memory at once:
+
+    >>> list(iter_normalized({'see': 1, 'aye': 2, 'bee': 3}, chunk_size=8))
+    [b'{"aye":2,', b'"bee":3,', b'"see":1}']
+
+    """
+    buf = []
+    size = 0
+    for piece in _normalized_encoder.iterencode(obj):
+        buf.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buf).encode('utf-8')
+            buf = []
+            size = 0
+    if buf:
+        yield ''.join(buf).encode('utf-8')
+
+
+def hash_node_iter(chunks):
+    """
+    Hash normalized JSON supplied as an iterable of *chunks*.
+
+    For example:
+
+    >>> node = {'src': [], 'type': 'video/sequence'}
+    >>> chunks = iter_normalized(node)
+    >>> hash_node_iter(chunks) == hash_node(normalized_dumps(node))
+    True
+
+    """
+    skein = skein512(digest_bits=DIGEST_BITS, pers=PERS_NODE)
+    for chunk in chunks:
+        skein.update(chunk)
+    return db32enc(skein.digest())
+
+
+def is_large_node(node):
+    """
+    Return ``True`` if *node* has more than `LARGE_NODE_SRC` src items.
+    """
+    src = node.get('src')
+    return isinstance(src, (list, dict)) and len(src) > LARGE_NODE_SRC
+
+
 def check_novacut(doc):
     """
     Verify the common schema that all Novacut docs should have.
@@ -603,6 +663,10 @@ def iter_src(src):
 
 
 def intrinsic_node(node):
+    if is_large_node(node):
+        # Don't build the full encoding, just hash it:
+        _id = hash_node_iter(iter_normalized(node))
+        return Intrinsic(_id, None, node)
     data = normalized_dumps(node)
     _id = hash_node(data)
     return Intrinsic(_id, data, node)
@@ -647,33 +711,35 @@ def intrinsic_graph(_id, get_doc, results):
 def save_to_intrinsic(root, src, dst):
     results = {}
     iroot = intrinsic_graph(root, src.get, results)
-    for doc in results.values():
-        for key in ('_rev', '_attachments'):
-            try:
-                del doc[key]
-            except KeyError:
-                pass
-        try:
-            dst.save(doc)
-        except Conflict:
-            pass
+    # Intrinsic IDs are content addressed, so a conflict means it's saved:
+    with WriteBatcher(dst, max_delay=None) as batch:
+        for doc in results.values():
+            for key in ('_rev', '_attachments'):
+                try:
+                    del doc[key]
+                except KeyError:
+                    pass
+            batch.save(doc, IGNORE)
     return iroot
 
 
 def create_inode(inode):
-    return {
+    doc = {
         '_id': inode.id,
-        '_attachments': {
-            'node': {
-                'data': b64encode(inode.data).decode('utf-8'),
-                'content_type': 'application/json',
-            }
-        },
         'type': 'novacut/inode',
         'time': time.time(),
         'node': inode.node,
         'renders': {},
     }
+    # Large nodes (see `intrinsic_node()`) are stored without the attachment:
+    if inode.data is not None:
+        doc['_attachments'] = {
+            'node': {
+                'data': b64encode(inode.data).decode('utf-8'),
+                'content_type': 'application/json',
+            }
+        }
+    return doc
 
 
 def create_settings(node):
@@ -711,3 +777,231 @@ def create_job(root, settings):
         'node': inode.node,
         'renders': {},
     }
+
+
+################################################################################
+# Compiled validators, for checking many docs at once:
+#
+# The check_*() functions above build a debugging label and walk the doc path
+# for every attribute they check, which dominates when validating thousands of
+# docs.  The same rules are expressed below as data, and compile_check() turns
+# them into a validator that does the minimum work per doc.
+#
+# A compiled validator only decides whether a doc is valid.  When a doc fails,
+# the original check_*() function is called so the exception raised is exactly
+# the same.
+
+EACH = object()  # Path placeholder: apply the rule to every item of a list
+DocError = namedtuple('DocError', 'index id error message')
+
+
+class _Ref:
+    """
+    A validator argument computed from the doc being checked.
+    """
+
+    __slots__ = ('func',)
+
+    def __init__(self, func):
+        self.func = func
+
+
+def _make_getter(path):
+    keys = tuple(path)
+    if not keys:
+        return lambda doc: doc
+    if len(keys) == 1:
+        (k1,) = keys
+        return lambda doc: doc[k1]
+    if len(keys) == 2:
+        (k1, k2) = keys
+        return lambda doc: doc[k1][k2]
+
+    def getter(doc):
+        value = doc
+        for key in keys:
+            value = value[key]
+        return value
+    return getter
+
+
+def _compile_rule(path, klass, *validators):
+    label = 'doc' + ''.join('[{!r}]'.format(key) for key in path)
+    bound = []
+    dynamic = False
+    for v in validators:
+        (func, args) = ((v[0], v[1:]) if isinstance(v, tuple) else (v, ()))
+        dynamic = dynamic or any(isinstance(a, _Ref) for a in args)
+        bound.append((func, args))
+    bound = tuple(bound)
+
+    def check_value(value, doc):
+        if klass is not None and not isinstance(value, klass):
+            raise TypeError(label)
+        if dynamic:
+            for (func, args) in bound:
+                func(value, label, *(
+                    (a.func(doc) if isinstance(a, _Ref) else a) for a in args
+                ))
+        else:
+            for (func, args) in bound:
+                func(value, label, *args)
+
+    if EACH not in path:
+        get = _make_getter(path)
+        return lambda doc: check_value(get(doc), doc)
+    i = path.index(EACH)
+    get_items = _make_getter(path[:i])
+    get = _make_getter(path[i + 1:])
+
+    def check_each(doc):
+        for item in get_items(doc):
+            check_value(get(item), doc)
+    return check_each
+
+
+def compile_check(check, rules):
+    """
+    Return a fast validator equivalent to *check*, built from *rules*.
+
+    Each rule is a ``(path, klass, *validators)`` tuple, the same arguments
+    the check functions pass to ``_check()``, except the path can contain
+    `EACH` and a validator argument can be a `_Ref`.
+
+    The validator raises exactly what *check* would raise for an invalid doc.
+    """
+    steps = tuple(_compile_rule(*rule) for rule in rules)
+
+    def compiled(doc):
+        try:
+            for step in steps:
+                step(doc)
+        except Exception:
+            # Let the reference implementation raise the detailed error:
+            check(doc)
+    compiled.__name__ = 'compiled_' + check.__name__
+    compiled.__doc__ = check.__doc__
+    return compiled
+
+
+NOVACUT_RULES = (
+    ([], dict),
+    (['_id'], None, _any_id),
+    (['type'], str, (_matches, 'novacut/[a-z]+$')),
+    (['time'], (int, float), (_at_least, 0)),
+)
+
+NODE_RULES = NOVACUT_RULES + (
+    (['_id'], None, _random_id),
+    (['type'], str, (_equals, 'novacut/node')),
+    (['node'], dict),
+    (['node', 'type'], str, _nonempty),
+    (['node', 'src'], (str, list, dict)),
+)
+
+RELATIVE_AUDIO_RULES = (
+    (['audio'], list),
+    (['audio', EACH], dict, _nonempty),
+    (['audio', EACH, 'id'], str, _random_id),
+    (['audio', EACH, 'offset'], int),
+)
+
+VIDEO_SEQUENCE_RULES = NODE_RULES + RELATIVE_AUDIO_RULES + (
+    (['node', 'type'], str, (_equals, 'video/sequence')),
+    (['node', 'src'], list),
+    (['node', 'src', EACH], str, _random_id),
+)
+
+SLICE_RULES = NODE_RULES + (
+    (['node', 'type'], str, (_is_in, 'video/slice', 'audio/slice')),
+    (['node', 'src'], str, _intrinsic_id),
+    (['node', 'start'], int, (_at_least, 0)),
+    (['node', 'stop'], int, (_at_least, 1)),
+    (['node', 'stop'], int,
+        (_at_least, _Ref(lambda doc: doc['node']['start'] + 1)),
+    ),
+)
+
+VIDEO_SLICE_RULES = SLICE_RULES + RELATIVE_AUDIO_RULES + (
+    (['node', 'type'], str, (_equals, 'video/slice')),
+)
+
+AUDIO_SLICE_RULES = SLICE_RULES + (
+    (['node', 'type'], str, (_equals, 'audio/slice')),
+)
+
+PROJECT_RULES = NOVACUT_RULES + (
+    (['_id'], None, _random_id),
+    (['type'], str, (_equals, 'novacut/project')),
+    (['db_name'], str,
+        (_equals, _Ref(lambda doc: project_db_name(doc['_id']))),
+    ),
+    (['title'], str),
+)
+
+fast_check_novacut = compile_check(check_novacut, NOVACUT_RULES)
+fast_check_node = compile_check(check_node, NODE_RULES)
+fast_check_video_sequence = compile_check(check_video_sequence,
+    VIDEO_SEQUENCE_RULES
+)
+fast_check_video_slice = compile_check(check_video_slice, VIDEO_SLICE_RULES)
+fast_check_audio_slice = compile_check(check_audio_slice, AUDIO_SLICE_RULES)
+fast_check_project = compile_check(check_project, PROJECT_RULES)
+
+NODE_CHECKS = {
+    'video/sequence': fast_check_video_sequence,
+    'video/slice': fast_check_video_slice,
+    'audio/slice': fast_check_audio_slice,
+}
+
+
+def get_fast_check(doc):
+    """
+    Return the compiled validator for *doc*, based on its type.
+
+    For example:
+
+    >>> get_fast_check({'type': 'novacut/project'}).__name__
+    'compiled_check_project'
+    >>> doc = {'type': 'novacut/node', 'node': {'type': 'video/slice'}}
+    >>> get_fast_check(doc).__name__
+    'compiled_check_video_slice'
+
+    """
+    try:
+        _type = doc['type']
+        if _type == 'novacut/node':
+            return NODE_CHECKS.get(doc['node']['type'], fast_check_node)
+        if _type == 'novacut/project':
+            return fast_check_project
+    except (TypeError, KeyError):
+        pass
+    return fast_check_novacut
+
+
+def check_docs(docs, check=None):
+    """
+    Validate many *docs* at once, returning a list of `DocError`.
+
+    If *check* is ``None``, each doc is checked with the validator returned by
+    `get_fast_check()`.  An empty list means all docs are valid.  For example:
+
+    >>> good = {
+    ...     '_id': 'NYXXMYLDOV3F6YTUO5PWM5DX', 'type': 'novacut/a', 'time': 1,
+    ... }
+    >>> bad = dict(good, time='1')
+    >>> [(e.index, e.id, e.error) for e in check_docs([good, bad])]
+    [(1, 'NYXXMYLDOV3F6YTUO5PWM5DX', 'TypeError')]
+
+    """
+    errors = []
+    for (i, doc) in enumerate(docs):
+        validator = (get_fast_check(doc) if check is None else check)
+        try:
+            validator(doc)
+        except (TypeError, ValueError) as e:
+            _id = (doc.get('_id') if isinstance(doc, dict) else None)
+            errors.append(
+                DocError(i, _id, e.__class__.__name__, str(e))
+            )
+    return errors
@@ -0,0 +1,80 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Microbenchmarks for the compiled validators in `novacut.schema`.
+
+Run them like this::
+
+    python3 -m novacut.tests.bench_schema
+
+"""
+
+import timeit
+
+
+SETUP = """
+from dbase32 import random_id
+from novacut import schema
+docs = []
+for i in range({}):
+    docs.append(schema.create_video_slice(random_id(30), 17, 69))
+    docs.append(schema.create_video_sequence([random_id() for j in range(20)]))
+    docs.append(schema.create_audio_slice(random_id(30), 48000, 96000))
+    docs.append(schema.create_project('Hobo Spaceship'))
+checks = {{
+    'novacut/project': schema.check_project,
+    'video/sequence': schema.check_video_sequence,
+    'video/slice': schema.check_video_slice,
+    'audio/slice': schema.check_audio_slice,
+}}
+def check_one(doc):
+    if doc['type'] == 'novacut/node':
+        checks[doc['node']['type']](doc)
+    else:
+        checks[doc['type']](doc)
+"""
+
+STATEMENTS = (
+    'for doc in docs: check_one(doc)',
+    'schema.check_docs(docs)',
+)
+
+
+def run_benchmarks(count=2500, number=5):
+    setup = SETUP.format(count)
+    results = []
+    for stmt in STATEMENTS:
+        elapsed = timeit.timeit(stmt, setup, number=number)
+        results.append((stmt, count * 4 * number / elapsed))
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=2500,
+        help='Number of docs of each type',
+    )
+    args = parser.parse_args()
+    for (stmt, rate) in run_benchmarks(args.count):
+        print('{:>12,.0f} docs/s  {}'.format(rate, stmt))
@@ -0,0 +1,112 @@
+# novacut: the collaborative video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Startup-time benchmark for Novacut modules and entry points.
+
+Each module import and each script (run with ``--help``, so it exits right
+after its top-level imports) is timed in a fresh interpreter.  Run it like
+this::
+
+    python3 -m novacut.tests.bench_startup --json startup.json
+
+"""
+
+import sys
+import time
+import subprocess
+from os import path
+
+from novacut.benchmark import summarize, save_results
+
+
+TREE = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+
+MODULES = (
+    'novacut',
+    'novacut.timefuncs',
+    'novacut.schema',
+    'novacut.metrics',
+    'novacut.workerpool',
+    'novacut.gsthelpers',
+    'novacut.render',
+    'novacut.validate',
+    'novacut.thumbnail',
+    'novacut.renderservice',
+)
+
+SCRIPTS = (
+    'novacut-cli',
+    'novacut-service',
+    'novacut-renderer',
+    'novacut-thumbnailer',
+    'novacut-video-checker',
+)
+
+
+def time_command(cmd, count):
+    times = []
+    for i in range(count):
+        start = time.perf_counter()
+        returncode = subprocess.call(cmd, cwd=TREE,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        elapsed = time.perf_counter() - start
+        if returncode != 0:
+            return {'count': 0, 'returncode': returncode}
+        times.append(elapsed)
+    return summarize(times)
+
+
+def run_benchmarks(count=10):
+    results = {
+        'baseline': time_command([sys.executable, '-c', 'pass'], count),
+    }
+    for name in MODULES:
+        cmd = [sys.executable, '-c', 'import ' + name]
+        results['import ' + name] = time_command(cmd, count)
+    for name in SCRIPTS:
+        cmd = [sys.executable, path.join(TREE, name), '--help']
+        results[name] = time_command(cmd, count)
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=10,
+        help='Number of runs per entry point',
+    )
+    parser.add_argument('--json', metavar='FILE',
+        help='Save results to FILE as JSON'
+    )
+    args = parser.parse_args()
+    results = run_benchmarks(args.count)
+    for (name, summary) in sorted(results.items()):
+        if summary['count'] == 0:
+            print('{:>10}  {}'.format(
+                'rc={}'.format(summary['returncode']), name
+            ))
+        else:
+            print('{:>8.1f}ms  {}'.format(summary['p50'] * 1000, name))
+    if args.json:
+        save_results(args.json, 'startup', results)
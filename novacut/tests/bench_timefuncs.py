@@ -0,0 +1,88 @@
+# novacut: the collaborative video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Microbenchmarks for the `novacut.timefuncs` module.
+
+Run them like this::
+
+    python3 -m novacut.tests.bench_timefuncs
+
+"""
+
+import timeit
+
+
+SETUP = """
+from fractions import Fraction
+from novacut.timefuncs import (
+    FrameClock,
+    frame_to_nanosecond,
+    nanosecond_to_frame,
+    video_pts_and_duration,
+    video_pts_and_duration_table,
+)
+framerate = Fraction({}, {})
+clock = FrameClock(framerate)
+frame = 123456
+ns = frame_to_nanosecond(frame, framerate)
+"""
+
+STATEMENTS = (
+    'frame_to_nanosecond(frame, framerate)',
+    'clock.frame_to_nanosecond(frame)',
+    'nanosecond_to_frame(ns, framerate)',
+    'clock.nanosecond_to_frame(ns)',
+    'video_pts_and_duration(frame, framerate)',
+    'clock.video_pts_and_duration(frame)',
+)
+
+FRAMERATES = (
+    (24, 1),
+    (24000, 1001),
+    (30000, 1001),
+    (60000, 1001),
+)
+
+
+def run_benchmarks(count=100000):
+    results = []
+    for (num, denom) in FRAMERATES:
+        setup = SETUP.format(num, denom)
+        for stmt in STATEMENTS:
+            elapsed = timeit.timeit(stmt, setup, number=count)
+            results.append(('{}/{}'.format(num, denom), stmt, count / elapsed))
+        stmt = 'video_pts_and_duration_table(0, {}, framerate)'.format(count)
+        elapsed = timeit.timeit(stmt, setup, number=1)
+        results.append(('{}/{}'.format(num, denom), stmt, count / elapsed))
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=100000,
+        help='Number of calls per benchmark',
+    )
+    args = parser.parse_args()
+    for (framerate, stmt, rate) in run_benchmarks(args.count):
+        print('{:>11}  {:>12,.0f}/s  {}'.format(framerate, rate, stmt))
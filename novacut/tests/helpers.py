@@ -21,18 +21,90 @@
 
 """
 Common helper functions and classes shared among unit tests.
+
+This also includes a generator for synthetic media fixtures.  Clips are
+rendered from `videotestsrc` (and optionally `audiotestsrc`) with each frame
+stamped with its timestamp, so their length, GOP structure, resolution, and
+framerate are known exactly.  Clips are cached, so only the first run pays
+the encoding cost.  To pre-generate the standard set of clips::
+
+    python3 -m novacut.tests.helpers
+
 """
 
+import os
+from os import path
+import tempfile
+import logging
+from collections import namedtuple
 from fractions import Fraction
 from random import SystemRandom
 
 from dbase32 import random_id
+from gi.repository import Gst
 
+from ..timefuncs import frame_to_nanosecond
+from ..gsthelpers import (
+    init_gst,
+    Pipeline,
+    make_element,
+    make_element_from_desc,
+    make_caps,
+    make_queue,
+    add_and_link_elements,
+)
 from ..render import Slice
+from ..validate import run_pipeline
 from ..misc import random_start_stop
 
 
+log = logging.getLogger(__name__)
+
+# Some tests use Gst directly, before any element or Pipeline is created:
+init_gst()
+
 random = SystemRandom()
+ClipSpec = namedtuple('ClipSpec',
+    'codec framerate frames width height gop audio'
+)
+
+# Standard framerates and codecs for the fixture clips:
+CLIP_FRAMERATES = (
+    Fraction(24, 1),
+    Fraction(30000, 1001),
+    Fraction(60000, 1001),
+)
+CLIP_CODECS = {
+    'h264': {
+        'encoder': {'name': 'x264enc', 'props': {'b-adapt': False}},
+        'gop': 'key-int-max',
+        'muxer': 'matroskamux',
+        'ext': 'mkv',
+    },
+    'mjpeg': {
+        'encoder': {'name': 'jpegenc'},
+        'gop': None,  # Every frame is a keyframe
+        'muxer': 'matroskamux',
+        'ext': 'mkv',
+    },
+    'theora': {
+        'encoder': {'name': 'theoraenc', 'props': {'keyframe-auto': False}},
+        'gop': 'keyframe-freq',
+        'muxer': 'oggmux',
+        'ext': 'ogv',
+    },
+    'vp8': {
+        'encoder': {'name': 'vp8enc', 'props': {'deadline': 1}},
+        'gop': 'keyframe-max-dist',
+        'muxer': 'webmmux',
+        'ext': 'webm',
+    },
+}
+
+VIDEOTESTSRC_BALL = 18  # Moving ball, so inter frames aren't empty
+AUDIO_RATE = 48000
+AUDIO_SAMPLES_PER_BUFFER = 480
+CLIP_CACHE_ENV = 'NOVACUT_TEST_CLIPS'
 
 
 def random_framerate():
@@ -50,3 +122,155 @@ def random_slice():
     filename = random_filename()
     return Slice(start, stop, filename)
 
+
+def get_clip_cache_dir():
+    """
+    Return directory in which fixture clips are cached.
+
+    Set the ``NOVACUT_TEST_CLIPS`` environment variable to override the
+    default location.
+    """
+    cachedir = os.environ.get(CLIP_CACHE_ENV)
+    if not cachedir:
+        cachedir = path.join(tempfile.gettempdir(), 'novacut-test-clips')
+    os.makedirs(cachedir, exist_ok=True)
+    return cachedir
+
+
+def clip_filename(spec):
+    """
+    Return the cache filename for the clip described by *spec*.
+
+    For example:
+
+    >>> spec = ClipSpec('vp8', Fraction(30000, 1001), 90, 320, 180, 15, False)
+    >>> clip_filename(spec)
+    'vp8-30000x1001-90-320x180-gop15.webm'
+
+    """
+    parts = [
+        spec.codec,
+        '{}x{}'.format(spec.framerate.numerator, spec.framerate.denominator),
+        str(spec.frames),
+        '{}x{}'.format(spec.width, spec.height),
+        'gop{}'.format(spec.gop),
+    ]
+    if spec.audio:
+        parts.append('audio')
+    return '-'.join(parts) + '.' + CLIP_CODECS[spec.codec]['ext']
+
+
+class ClipGenerator(Pipeline):
+    def __init__(self, callback, spec, filename):
+        super().__init__(callback)
+        self.spec = spec
+        self.filename = filename
+        codec = CLIP_CODECS[spec.codec]
+
+        # Video branch, with a timestamp stamped onto each frame:
+        caps = make_caps('video/x-raw', {
+            'format': 'I420',
+            'width': spec.width,
+            'height': spec.height,
+            'framerate': spec.framerate,
+            'pixel-aspect-ratio': '1/1',
+            'interlace-mode': 'progressive',
+        })
+        self.src = make_element('videotestsrc',
+            {'num-buffers': spec.frames, 'pattern': VIDEOTESTSRC_BALL}
+        )
+        self.capsfilter = make_element('capsfilter', {'caps': caps})
+        self.overlay = make_element('timeoverlay')
+        self.q = make_queue()
+        desc = dict(codec['encoder'])
+        desc['props'] = dict(desc.get('props', {}))
+        if codec['gop'] is not None:
+            desc['props'][codec['gop']] = spec.gop
+        self.enc = make_element_from_desc(desc)
+        self.mux = make_element_from_desc(codec['muxer'])
+        self.sink = make_element('filesink', {'location': filename})
+        add_and_link_elements(self.pipeline,
+            self.src, self.capsfilter, self.overlay, self.q, self.enc,
+            self.mux, self.sink
+        )
+
+        # Optional audio branch, covering at least the video duration:
+        if spec.audio:
+            duration = frame_to_nanosecond(spec.frames, spec.framerate)
+            samples = -(-duration * AUDIO_RATE // Gst.SECOND)
+            caps = make_caps('audio/x-raw',
+                {'rate': AUDIO_RATE, 'channels': 2}
+            )
+            self.audio_src = make_element('audiotestsrc', {
+                'num-buffers': -(-samples // AUDIO_SAMPLES_PER_BUFFER),
+                'samplesperbuffer': AUDIO_SAMPLES_PER_BUFFER,
+            })
+            self.audio_capsfilter = make_element('capsfilter', {'caps': caps})
+            self.audio_convert = make_element('audioconvert')
+            self.audio_enc = make_element('vorbisenc')
+            self.audio_q = make_queue()
+            add_and_link_elements(self.pipeline,
+                self.audio_src, self.audio_capsfilter, self.audio_convert,
+                self.audio_enc, self.audio_q, self.mux
+            )
+
+    def run(self):
+        self.play()
+
+    def on_eos(self, bus, msg):
+        self.complete(True)
+
+
+def generate_clip(spec, filename):
+    log.info('Generating %r', filename)
+    inst = run_pipeline(ClipGenerator, spec, filename)
+    if inst.success is not True:
+        raise Exception('could not generate clip {!r}'.format(filename))
+
+
+def get_test_clip(codec='theora', framerate=CLIP_FRAMERATES[0], frames=48,
+        width=320, height=180, gop=12, audio=False):
+    """
+    Return the filename of a cached synthetic clip, generating it if needed.
+    """
+    if codec not in CLIP_CODECS:
+        raise ValueError('unknown codec: {!r}'.format(codec))
+    spec = ClipSpec(codec, framerate, frames, width, height, gop, audio)
+    filename = path.join(get_clip_cache_dir(), clip_filename(spec))
+    if not path.isfile(filename):
+        tmp = filename + '.partial'
+        generate_clip(spec, tmp)
+        os.rename(tmp, filename)
+    return filename
+
+
+def get_standard_clips(codecs=None, frames=120):
+    """
+    Return filenames of the standard fixture clips, generating them if needed.
+
+    There is one clip per framerate in `CLIP_FRAMERATES` for each codec.
+    """
+    if codecs is None:
+        codecs = sorted(CLIP_CODECS)
+    return [
+        get_test_clip(codec, framerate, frames)
+        for codec in codecs
+        for framerate in CLIP_FRAMERATES
+    ]
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--codec', action='append',
+        choices=sorted(CLIP_CODECS),
+        help='Only generate clips with this codec (can be repeated)',
+    )
+    parser.add_argument('--frames', type=int, default=120,
+        help='Number of frames in each clip',
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    for filename in get_standard_clips(args.codec, args.frames):
+        print(filename)
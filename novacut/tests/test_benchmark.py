@@ -0,0 +1,138 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Unit tests for the `novacut.benchmark` module.
+"""
+
+from unittest import TestCase
+from os import path
+import json
+import tempfile
+import shutil
+
+import novacut
+from .. import benchmark
+
+
+class TestFunctions(TestCase):
+    def test_percentile(self):
+        with self.assertRaises(ValueError) as cm:
+            benchmark.percentile([], 50)
+        self.assertEqual(str(cm.exception), 'need at least one value')
+        for p in (0, -1, 101):
+            with self.assertRaises(ValueError) as cm:
+                benchmark.percentile([1, 2, 3], p)
+            self.assertEqual(str(cm.exception),
+                'need 0 < p <= 100; got {!r}'.format(p)
+            )
+        self.assertEqual(benchmark.percentile([7], 1), 7)
+        self.assertEqual(benchmark.percentile([7], 100), 7)
+        values = list(range(100, 0, -1))
+        for p in range(1, 101):
+            self.assertEqual(benchmark.percentile(values, p), p)
+        self.assertEqual(benchmark.percentile([4, 1, 3, 2], 50), 2)
+        self.assertEqual(benchmark.percentile([4, 1, 3, 2], 51), 3)
+        self.assertEqual(benchmark.percentile([4, 1, 3, 2], 100), 4)
+
+    def test_summarize(self):
+        self.assertEqual(benchmark.summarize([]), {'count': 0})
+        self.assertEqual(benchmark.summarize([2.0]), {
+            'count': 1,
+            'min': 2.0,
+            'max': 2.0,
+            'mean': 2.0,
+            'p50': 2.0,
+            'p95': 2.0,
+            'p99': 2.0,
+        })
+        values = list(range(1, 201))
+        self.assertEqual(benchmark.summarize(values), {
+            'count': 200,
+            'min': 1,
+            'max': 200,
+            'mean': 100.5,
+            'p50': 100,
+            'p95': 190,
+            'p99': 198,
+        })
+
+    def test_get_environment(self):
+        env = benchmark.get_environment()
+        self.assertEqual(env['novacut'], novacut.__version__)
+        self.assertIsInstance(env['time'], float)
+        self.assertIn('gstreamer', env)
+        json.dumps(env)
+
+    def test_save_results(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = path.join(tmpdir, 'results.json')
+            results = [{'filename': '/foo.mov', 'frames': 17}]
+            obj = benchmark.save_results(filename, 'deep-test', results)
+            self.assertEqual(obj['benchmark'], 'deep-test')
+            self.assertIs(obj['results'], results)
+            with open(filename, 'r') as fp:
+                self.assertEqual(json.load(fp), obj)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_get_peak_rss(self):
+        rss = benchmark.get_peak_rss()
+        self.assertIsInstance(rss, int)
+        self.assertGreater(rss, 0)
+        self.assertEqual(rss % 1024, 0)
+
+
+class TestStageTimer(TestCase):
+    def test_init(self):
+        inst = benchmark.StageTimer()
+        self.assertIs(inst.stages, benchmark.RENDER_STAGES)
+        self.assertEqual(inst.totals,
+            dict((name, 0.0) for name in benchmark.RENDER_STAGES)
+        )
+        self.assertEqual(inst.counts,
+            dict((name, 0) for name in benchmark.RENDER_STAGES)
+        )
+
+        stages = ('foo', 'bar')
+        inst = benchmark.StageTimer(stages)
+        self.assertIs(inst.stages, stages)
+        self.assertEqual(inst.totals, {'foo': 0.0, 'bar': 0.0})
+        self.assertEqual(inst.counts, {'foo': 0, 'bar': 0})
+
+    def test_add(self):
+        inst = benchmark.StageTimer(('foo', 'bar'))
+        self.assertIsNone(inst.add('foo', 1.5))
+        self.assertIsNone(inst.add('foo', 0.25))
+        self.assertIsNone(inst.add('bar', 3.0))
+        self.assertEqual(inst.totals, {'foo': 1.75, 'bar': 3.0})
+        self.assertEqual(inst.counts, {'foo': 2, 'bar': 1})
+        with self.assertRaises(KeyError):
+            inst.add('baz', 1.0)
+
+    def test_to_dict(self):
+        inst = benchmark.StageTimer(('foo', 'bar'))
+        inst.add('bar', 0.5)
+        self.assertEqual(inst.to_dict(), {
+            'foo': {'total': 0.0, 'count': 0},
+            'bar': {'total': 0.5, 'count': 1},
+        })
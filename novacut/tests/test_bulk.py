@@ -0,0 +1,138 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Unit tests for the `novacut.bulk` module.
+"""
+
+from unittest import TestCase
+import threading
+
+from dbase32 import random_id
+from microfiber import BulkConflict
+
+from .. import bulk
+
+
+class MockDatabase:
+    def __init__(self):
+        self._docs = {}
+        self._calls = []
+        self._event = threading.Event()
+
+    def save_many(self, docs):
+        self._calls.append([d['_id'] for d in docs])
+        rows = []
+        conflicts = []
+        for doc in docs:
+            if doc['_id'] in self._docs:
+                conflicts.append(doc)
+                rows.append({'id': doc['_id'], 'error': 'conflict'})
+            else:
+                doc['_rev'] = '1-' + random_id()
+                self._docs[doc['_id']] = doc
+                rows.append({'id': doc['_id'], 'rev': doc['_rev']})
+        self._event.set()
+        if conflicts:
+            raise BulkConflict(conflicts, rows)
+        return rows
+
+
+class TestWriteBatcher(TestCase):
+    def test_init(self):
+        db = MockDatabase()
+        inst = bulk.WriteBatcher(db)
+        self.assertIs(inst.db, db)
+        self.assertEqual(inst.max_docs, bulk.MAX_DOCS)
+        self.assertEqual(inst.max_delay, bulk.MAX_DELAY)
+        self.assertEqual(inst.to_dict(), {
+            'docs': 0,
+            'requests': 0,
+            'requests_saved': 0,
+            'ignored': 0,
+        })
+        with self.assertRaises(ValueError) as cm:
+            bulk.WriteBatcher(db, max_docs=0)
+        self.assertEqual(str(cm.exception), 'need max_docs >= 1; got 0')
+
+    def test_save(self):
+        db = MockDatabase()
+        ids = tuple(random_id() for i in range(7))
+        with bulk.WriteBatcher(db, max_docs=3, max_delay=None) as inst:
+            for _id in ids:
+                inst.save({'_id': _id})
+            self.assertEqual(db._calls, [list(ids[0:3]), list(ids[3:6])])
+            with self.assertRaises(ValueError) as cm:
+                inst.save({'_id': random_id()}, 'retry')
+            self.assertEqual(str(cm.exception),
+                "bad conflict policy: 'retry'"
+            )
+        self.assertEqual(db._calls[-1], [ids[6]])
+        self.assertEqual(set(db._docs), set(ids))
+        self.assertEqual(inst.to_dict(), {
+            'docs': 7,
+            'requests': 3,
+            'requests_saved': 4,
+            'ignored': 0,
+        })
+        with self.assertRaises(Exception) as cm:
+            inst.save({'_id': random_id()})
+        self.assertEqual(str(cm.exception), 'WriteBatcher is closed')
+
+    def test_max_delay(self):
+        db = MockDatabase()
+        inst = bulk.WriteBatcher(db, max_delay=0.01)
+        doc = {'_id': random_id()}
+        inst.save(doc)
+        self.assertTrue(db._event.wait(5))
+        self.assertEqual(db._calls, [[doc['_id']]])
+        self.assertIn('_rev', doc)
+        self.assertIsNone(inst.timer)
+        inst.close()
+        self.assertEqual(db._calls, [[doc['_id']]])
+
+    def test_conflicts(self):
+        db = MockDatabase()
+        (A, B, C) = (random_id() for i in range(3))
+        db._docs.update({A: {'_id': A}, B: {'_id': B}})
+        inst = bulk.WriteBatcher(db, max_delay=None)
+        inst.save({'_id': A}, bulk.IGNORE)
+        inst.save({'_id': B}, bulk.RAISE)
+        inst.save({'_id': C})
+        with self.assertRaises(bulk.BatchConflict) as cm:
+            inst.flush()
+        self.assertEqual(cm.exception.docs, [{'_id': B}])
+        self.assertEqual(str(cm.exception), 'conflict on {}'.format(B))
+        self.assertIn(C, db._docs)
+        self.assertEqual(inst.to_dict()['ignored'], 1)
+
+        # Conflicts are only raised once:
+        inst.flush()
+        inst.close()
+
+    def test_cancel(self):
+        db = MockDatabase()
+        with self.assertRaises(ZeroDivisionError):
+            with bulk.WriteBatcher(db, max_delay=None) as inst:
+                inst.save({'_id': random_id()})
+                1 / 0
+        self.assertEqual(db._calls, [])
+        self.assertEqual(inst.pending, [])
@@ -0,0 +1,172 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Unit tests for the `novacut.couchpool` module.
+"""
+
+from unittest import TestCase
+import threading
+import time
+
+from dbase32 import random_id
+from usercouch.misc import CouchTestCase
+from microfiber import Database, NotFound
+
+from .. import couchpool
+
+
+class MockDatabase:
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.calls = []
+
+    def get(self, *parts, **options):
+        self.calls.append(parts)
+        if self.broken:
+            raise ConnectionResetError()
+        return {'parts': parts, 'options': options}
+
+
+class MockPool(couchpool.Pool):
+    def create(self):
+        return MockDatabase()
+
+
+class MockMetric:
+    def __init__(self):
+        self.values = []
+
+    def observe(self, value):
+        self.values.append(value)
+
+
+def random_env():
+    return {'url': 'http://127.0.0.1:{}/'.format(random_id())}
+
+
+class TestPool(TestCase):
+    def test_init(self):
+        env = random_env()
+        name = random_id().lower()
+        inst = couchpool.Pool(env, name)
+        self.assertIs(inst.env, env)
+        self.assertIs(inst.name, name)
+        self.assertIs(inst.url, env['url'])
+        self.assertEqual(inst.size, couchpool.POOL_SIZE)
+        self.assertEqual(inst.check_after, couchpool.CHECK_AFTER)
+        self.assertIsNone(inst.wait_metric)
+        with self.assertRaises(ValueError) as cm:
+            couchpool.Pool(env, name, size=0)
+        self.assertEqual(str(cm.exception), 'need size >= 1; got 0')
+
+    def test_acquire_release(self):
+        metric = MockMetric()
+        inst = MockPool(random_env(), 'foo', size=2, wait_metric=metric)
+        db1 = inst.acquire()
+        db2 = inst.acquire()
+        self.assertIsNot(db1, db2)
+        with self.assertRaises(TimeoutError):
+            inst.acquire(timeout=0.01)
+
+        # Connections are reused:
+        inst.release(db2)
+        self.assertIs(inst.acquire(), db2)
+
+        # A failed connection is replaced:
+        inst.release(db2, ok=False)
+        db3 = inst.acquire()
+        self.assertIsNot(db3, db2)
+        self.assertEqual(inst.to_dict()['created'], 3)
+        self.assertEqual(inst.to_dict()['discarded'], 1)
+
+        # A waiting thread gets the next released connection:
+        result = []
+        thread = threading.Thread(target=lambda: result.append(inst.acquire()))
+        thread.start()
+        time.sleep(0.05)
+        inst.release(db1)
+        thread.join()
+        self.assertEqual(result, [db1])
+        stats = inst.to_dict()
+        self.assertEqual(stats['acquired'], 5)
+        self.assertEqual(stats['waited'], 1)
+        self.assertGreater(stats['max_wait'], 0.04)
+        self.assertEqual(len(metric.values), 5)
+
+    def test_health_check(self):
+        inst = MockPool(random_env(), 'foo', check_after=0)
+        db = inst.acquire()
+        inst.release(db)
+        self.assertIs(inst.acquire(), db)
+        self.assertEqual(db.calls, [()])
+        db.broken = True
+        inst.release(db)
+        db2 = inst.acquire()
+        self.assertIsNot(db2, db)
+        self.assertEqual(inst.to_dict()['discarded'], 1)
+
+    def test_connection(self):
+        inst = MockPool(random_env(), 'foo', size=1)
+        with inst.connection() as db:
+            self.assertEqual(inst.to_dict()['idle'], 0)
+        self.assertEqual(inst.idle[0][0], db)
+
+        # Anything other than an HTTP error discards the connection:
+        with self.assertRaises(ZeroDivisionError):
+            with inst.connection() as db2:
+                1 / 0
+        self.assertIs(db2, db)
+        self.assertEqual(inst.idle, [])
+        self.assertEqual(inst.to_dict()['discarded'], 1)
+
+        self.assertEqual(inst.get('foo', bar=1),
+            {'parts': ('foo',), 'options': {'bar': 1}}
+        )
+        self.assertEqual(inst.to_dict()['open'], 1)
+
+    def test_get_pool(self):
+        env = random_env()
+        pool = couchpool.get_pool(env, 'foo', size=3)
+        self.assertIsInstance(pool, couchpool.Pool)
+        self.assertEqual(pool.size, 3)
+        self.assertIs(couchpool.get_pool(env, 'foo'), pool)
+        self.assertIsNot(couchpool.get_pool(env, 'bar'), pool)
+        self.assertIsNot(couchpool.get_pool(random_env(), 'foo'), pool)
+
+
+class TestLive(CouchTestCase):
+    def test_pool(self):
+        name = 'foo-{}'.format(random_id().lower())
+        self.assertEqual(Database(name, self.env).ensure(), True)
+        inst = couchpool.Pool(self.env, name, size=2)
+        doc = {'_id': random_id()}
+        inst.save(doc)
+        self.assertEqual(inst.get(doc['_id']), doc)
+        self.assertEqual(inst.get_many([doc['_id']]), [doc])
+
+        # NotFound doesn't discard the connection:
+        with self.assertRaises(NotFound):
+            inst.get(random_id())
+        stats = inst.to_dict()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['discarded'], 0)
+        self.assertEqual(stats['idle'], 1)
@@ -0,0 +1,230 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Unit tests for the `novacut.doccache` module.
+"""
+
+from unittest import TestCase
+
+from dbase32 import random_id
+from usercouch.misc import CouchTestCase
+from microfiber import Database, NotFound, Conflict
+
+from .. import doccache
+
+
+class CountingDatabase(Database):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._gets = []
+
+    def get(self, *parts, **options):
+        self._gets.append(parts)
+        return super().get(*parts, **options)
+
+
+class MockDatabase:
+    def __init__(self):
+        self._docs = {}
+        self._changes = []
+        self._hook = None
+
+    def put(self, doc):
+        doc['_rev'] = '{}-x'.format(len(self._changes) + 1)
+        self._docs[doc['_id']] = dict(doc)
+        self._changes.append(
+            {'id': doc['_id'], 'changes': [{'rev': doc['_rev']}]}
+        )
+
+    def get(self, *parts, **options):
+        if parts == ():
+            return {'update_seq': len(self._changes)}
+        if parts == ('_changes',):
+            since = options['since']
+            return {
+                'results': self._changes[since:],
+                'last_seq': len(self._changes),
+            }
+        (_id,) = parts
+        doc = dict(self._docs[_id])
+        if self._hook is not None:
+            self._hook(_id)
+        return doc
+
+
+class TestDocCache(TestCase):
+    def test_init(self):
+        db = random_id()
+        inst = doccache.DocCache(db)
+        self.assertIs(inst.db, db)
+        self.assertEqual(inst.max_docs, doccache.MAX_DOCS)
+        self.assertEqual(inst.max_age, doccache.MAX_AGE)
+        self.assertEqual(inst.to_dict(), {
+            'docs': 0,
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'invalidations': 0,
+            'hit_rate': 0.0,
+        })
+        with self.assertRaises(ValueError) as cm:
+            doccache.DocCache(db, max_docs=0)
+        self.assertEqual(str(cm.exception), 'need max_docs >= 1; got 0')
+
+    def test_get(self):
+        db = MockDatabase()
+        (A, B) = (random_id() for i in range(2))
+        db.put({'_id': A, 'n': 0})
+        db.put({'_id': B, 'n': 0})
+        inst = doccache.DocCache(db, max_age=60)
+
+        # The database is read without holding the lock:
+        def hook(_id):
+            self.assertIs(inst.lock.acquire(False), True)
+            inst.lock.release()
+
+        db._hook = hook
+        self.assertEqual(inst.get(A)['n'], 0)
+        self.assertIn(A, inst.docs)
+
+        # A doc changed (and the feed read) while it was being fetched isn't
+        # cached, as what was fetched may already be stale:
+        def hook(_id):
+            db.put({'_id': _id, 'n': 1})
+            inst.update(force=True)
+
+        db._hook = hook
+        self.assertEqual(inst.get(B)['n'], 0)
+        self.assertNotIn(B, inst.docs)
+
+        # And a forced update doesn't wait for max_age:
+        db._hook = None
+        db.put({'_id': A, 'n': 2})
+        self.assertEqual(inst.get(A)['n'], 0)
+        inst.update(force=True)
+        self.assertEqual(inst.get(A)['n'], 2)
+        self.assertEqual(inst.get(B)['n'], 1)
+
+
+class TestLive(CouchTestCase):
+    def get_db(self):
+        db = CountingDatabase('foo-{}'.format(random_id().lower()), self.env)
+        self.assertEqual(db.ensure(), True)
+        return db
+
+    def test_get(self):
+        db = self.get_db()
+        docs = [{'_id': random_id(), 'n': i} for i in range(3)]
+        db.save_many(docs)
+        inst = doccache.DocCache(db, max_docs=2, max_age=0)
+
+        # Repeated gets only hit the database once, plus _changes checks:
+        for i in range(3):
+            doc = inst.get(docs[0]['_id'])
+            self.assertEqual(doc, docs[0])
+            doc['n'] = 'modified'  # Callers get a copy
+        self.assertEqual(
+            [p for p in db._gets if p[:1] != ('_changes',)],
+            [(), (docs[0]['_id'],)]
+        )
+        self.assertEqual(inst.hits, 2)
+        self.assertEqual(inst.misses, 1)
+
+        # Negative caching:
+        missing = random_id()
+        for i in range(2):
+            with self.assertRaises(NotFound):
+                inst.get(missing)
+        self.assertEqual(db._gets.count((missing,)), 1)
+
+        # Until the doc is created:
+        db.save({'_id': missing})
+        self.assertEqual(inst.get(missing)['_id'], missing)
+        self.assertEqual(db._gets.count((missing,)), 2)
+        self.assertEqual(inst.invalidations, 1)
+
+        # Size bound:
+        self.assertEqual(len(inst.docs), 2)
+        inst.get(docs[1]['_id'])
+        self.assertEqual(len(inst.docs), 2)
+        self.assertEqual(inst.evictions, 1)
+        self.assertEqual(list(inst.docs), [missing, docs[1]['_id']])
+
+        # A change by someone else drops the cached doc:
+        doc = db.get(docs[1]['_id'])
+        doc['n'] = 'changed'
+        db.save(doc)
+        self.assertEqual(inst.get(docs[1]['_id']), doc)
+
+    def test_get_many(self):
+        db = self.get_db()
+        docs = [{'_id': random_id(), 'n': i} for i in range(4)]
+        db.save_many(docs)
+        inst = doccache.DocCache(db)
+        missing = random_id()
+        ids = [d['_id'] for d in docs[:2]] + [missing]
+        self.assertEqual(inst.get_many(ids), docs[:2] + [None])
+        self.assertEqual(inst.misses, 3)
+        ids = [d['_id'] for d in docs] + [missing]
+        self.assertEqual(inst.get_many(ids), docs + [None])
+        self.assertEqual(inst.hits, 3)
+        self.assertEqual(inst.misses, 5)
+        self.assertEqual(inst.to_dict()['hit_rate'], 3 / 8)
+        self.assertEqual(inst.get(docs[3]['_id']), docs[3])
+        self.assertEqual(inst.hits, 4)
+
+        # The None cached for a missing doc isn't a hit for get(), as it
+        # still has to ask the database:
+        for i in range(2):
+            with self.assertRaises(NotFound):
+                inst.get(missing)
+        self.assertEqual(db._gets.count((missing,)), 1)
+        self.assertEqual(inst.hits, 5)
+        self.assertEqual(inst.misses, 6)
+
+    def test_save(self):
+        db = self.get_db()
+        inst = doccache.DocCache(db, max_age=0)
+        doc = {'_id': random_id()}
+        with self.assertRaises(NotFound):
+            inst.get(doc['_id'])
+        inst.save(doc)
+        self.assertEqual(inst.get(doc['_id']), doc)
+        self.assertEqual(db._gets.count((doc['_id'],)), 1)
+        self.assertEqual(inst.invalidations, 0)
+
+        # A conflict drops the cached doc:
+        stale = dict(doc, _rev='1-' + '0' * 32)
+        with self.assertRaises(Conflict):
+            inst.save(stale)
+        self.assertNotIn(doc['_id'], inst.docs)
+        self.assertEqual(inst.get(doc['_id']), doc)
+
+    def test_get_cache(self):
+        db1 = Database('foo', self.env)
+        db2 = Database('foo', self.env)
+        db3 = Database('bar', self.env)
+        cache = doccache.get_cache(db1)
+        self.assertIsInstance(cache, doccache.DocCache)
+        self.assertIs(cache.db, db1)
+        self.assertIs(doccache.get_cache(db2), cache)
+        self.assertIsNot(doccache.get_cache(db3), cache)
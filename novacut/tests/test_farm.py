@@ -0,0 +1,440 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Unit tests for the `novacut.farm` module.
+"""
+
+from unittest import TestCase
+import multiprocessing
+import time
+
+from dbase32 import random_id
+from usercouch.misc import CouchTestCase
+from microfiber import Database, Conflict
+
+from ..misc import random_start_stop
+from ..views import task_design
+from .test_renderservice import MockDmedia
+from .. import farm
+
+
+def _claim_and_complete(env, name, peer_id):
+    # Run in a separate process, like a peer would:
+    db = Database(name, env)
+    while True:
+        docs = farm.get_open_tasks(db)
+        if not docs:
+            return
+        for doc in docs:
+            if farm.claim_task(db, doc, peer_id):
+                farm.complete_task(db, doc, random_id(30))
+
+
+class TestFunctions(TestCase):
+    def test_plan_segments(self):
+        plan_segments = farm.plan_segments
+        with self.assertRaises(ValueError) as cm:
+            plan_segments([], 0)
+        self.assertEqual(str(cm.exception), 'need segment_frames >= 1; got 0')
+        self.assertEqual(plan_segments([]), [])
+
+        raw_slices = []
+        for i in range(50):
+            (start, stop) = random_start_stop(5000)
+            raw_slices.append((random_id(), random_id(30), start, stop))
+        total = sum(r[3] - r[2] for r in raw_slices)
+        for segment_frames in (1, 17, 900, total, total + 1):
+            segments = plan_segments(raw_slices, segment_frames)
+            offset = 0
+            flat = []
+            for (i, (o, slices)) in enumerate(segments):
+                self.assertEqual(o, offset)
+                frames = sum(stop - start for (src, start, stop) in slices)
+                if i < len(segments) - 1:
+                    self.assertEqual(frames, segment_frames)
+                else:
+                    self.assertLessEqual(frames, segment_frames)
+                offset += frames
+                flat.extend(slices)
+            self.assertEqual(offset, total)
+
+            # Rejoining split slices gives back the original slices:
+            joined = []
+            for (src, start, stop) in flat:
+                if joined and joined[-1][0] == src and joined[-1][2] == start:
+                    joined[-1] = (src, joined[-1][1], stop)
+                else:
+                    joined.append((src, start, stop))
+            self.assertEqual(joined,
+                [r[1:] for r in raw_slices if r[2] < r[3]]
+            )
+
+    def test_create_task(self):
+        job_id = random_id()
+        (A, B) = sorted(random_id(30) for i in range(2))
+        slices = ((B, 10, 20), (A, 0, 5), (B, 30, 31))
+        doc = farm.create_task(job_id, 3, 7, 1800, slices)
+        self.assertIsInstance(doc.pop('time'), float)
+        self.assertEqual(doc, {
+            '_id': job_id + '-0003',
+            'type': 'novacut/task',
+            'kind': 'segment',
+            'job_id': job_id,
+            'index': 3,
+            'count': 7,
+            'offset': 1800,
+            'frames': 16,
+            'slices': [[B, 10, 20], [A, 0, 5], [B, 30, 31]],
+            'files': [A, B],
+            'state': 'open',
+            'lease': None,
+            'attempts': 0,
+            'file_id': None,
+        })
+
+    def test_is_local(self):
+        files = tuple(random_id(30) for i in range(3))
+        Dmedia = MockDmedia()
+        self.assertIs(farm.is_local(Dmedia, files), True)
+        self.assertEqual(Dmedia._calls, list(files))
+        Dmedia = MockDmedia({files[1]: 1})
+        self.assertIs(farm.is_local(Dmedia, files), False)
+        self.assertEqual(Dmedia._calls, list(files[:2]))
+
+    def test_get_local_files(self):
+        files = tuple(random_id(30) for i in range(5))
+        Dmedia = MockDmedia({files[1]: 1, files[3]: 2})
+        self.assertEqual(farm.get_local_files(Dmedia, files),
+            {files[0], files[2], files[4]}
+        )
+        self.assertEqual(Dmedia._calls, list(files))
+
+    def test_rank_tasks(self):
+        (A, B, C) = (random_id(30) for i in range(3))
+        sizes = {A: 1000, B: 3000, C: 4000}
+        tasks = [
+            {'job_id': 'J', 'index': i, 'files': files}
+            for (i, files) in enumerate([[A, B], [C], [A], [B, C], [A]])
+        ]
+        ranked = farm.rank_tasks(tasks, {A, C}, sizes)
+        self.assertEqual([(score, doc['index']) for (score, doc) in ranked],
+            [(1.0, 1), (1.0, 2), (1.0, 4), (4 / 7, 3), (0.25, 0)]
+        )
+        self.assertEqual(farm.rank_tasks([], {A}, sizes), [])
+
+    def test_get_join_files(self):
+        ids = tuple(random_id(30) for i in range(3))
+        tasks = [
+            {'kind': 'segment', 'state': 'done', 'file_id': ids[0]},
+            {'kind': 'segment', 'state': 'claimed', 'file_id': None},
+            {'kind': 'join', 'state': 'open', 'file_id': None},
+        ]
+        self.assertIsNone(farm.get_join_files(tasks, 2))
+        self.assertIsNone(farm.get_join_files(tasks[:1], 2))
+        tasks[1].update(state='done', file_id=ids[1])
+        self.assertEqual(farm.get_join_files(tasks, 2), list(ids[:2]))
+
+
+class MockPipeline:
+    def __init__(self):
+        self._calls = []
+
+    def run(self):
+        self._calls.append('run')
+
+    def complete(self, success):
+        self._calls.append(('complete', success))
+
+
+class MockMainLoop:
+    def __init__(self, target=None):
+        self._target = target
+
+    def run(self):
+        if self._target is not None:
+            self._target()
+
+
+class MockFarmWorker(farm.FarmWorker):
+    def __init__(self, db=None, target=None):
+        self.novacut_db = db
+        self.mainloop = MockMainLoop(target)
+        self.peer_id = random_id()
+        self.lease_seconds = 60
+        self.task = None
+        self.running = None
+        self.renew_source = None
+        self.lease_lost = False
+        self.wanted = set()
+        self.blocked = set()
+
+
+class TestFarmWorker(TestCase):
+    def test_run_pipeline(self):
+        doc = {'_id': random_id()}
+        inst = MockPipeline()
+        worker = MockFarmWorker()
+        self.assertIsNone(worker.run_pipeline(doc, inst))
+        self.assertEqual(inst._calls, ['run'])
+        self.assertIsNone(worker.running)
+
+        # If the lease was lost while running, LeaseLost is raised:
+        def target():
+            self.assertIs(worker.running, inst)
+            worker.lease_lost = True
+
+        inst = MockPipeline()
+        worker = MockFarmWorker(target=target)
+        with self.assertRaises(farm.LeaseLost) as cm:
+            worker.run_pipeline(doc, inst)
+        self.assertEqual(str(cm.exception), 'lost lease on ' + doc['_id'])
+        self.assertIsNone(worker.running)
+
+    def test_want(self):
+        (A, B, C) = (random_id(30) for i in range(3))
+        worker = MockFarmWorker()
+        self.assertIsNone(worker.want({B, A}))
+        self.assertIsNone(worker.want({B, C}))
+        self.assertEqual(worker.wanted, {A, B, C})
+        self.assertEqual(worker.to_dict(), {
+            'peer_id': worker.peer_id,
+            'wanted': sorted([A, B, C]),
+            'blocked': [],
+        })
+
+
+class TestCouchFunctions(CouchTestCase):
+    def get_db(self):
+        db = Database('novacut-{}-1'.format(random_id().lower()), self.env)
+        self.assertEqual(db.ensure(), True)
+        db.save(dict(task_design))
+        return db
+
+    def create_job(self, db, frames):
+        slices = []
+        for count in frames:
+            slices.append({
+                '_id': random_id(),
+                'node': {
+                    'type': 'video/slice',
+                    'src': random_id(30),
+                    'start': 0,
+                    'stop': count,
+                },
+            })
+        root = {
+            '_id': random_id(),
+            'node': {
+                'type': 'video/sequence',
+                'src': [d['_id'] for d in slices],
+            },
+        }
+        job = {
+            '_id': random_id(),
+            'type': 'novacut/job',
+            'node': {'root': root['_id'], 'settings': random_id()},
+            'renders': {},
+        }
+        db.save_many(slices + [root, job])
+        return job['_id']
+
+    def test_get_file_sizes(self):
+        db = Database('dmedia-{}-1'.format(random_id().lower()), self.env)
+        self.assertEqual(db.ensure(), True)
+        files = tuple(random_id(30) for i in range(4))
+        db.save_many([
+            {'_id': _id, 'type': 'dmedia/file', 'bytes': 1000 * (i + 1)}
+            for (i, _id) in enumerate(files[:3])
+        ])
+        self.assertEqual(farm.get_file_sizes(db, files), {
+            files[0]: 1000,
+            files[1]: 2000,
+            files[2]: 3000,
+            files[3]: 0,
+        })
+        self.assertEqual(farm.get_file_sizes(db, []), {})
+
+    def test_split_job(self):
+        db = self.get_db()
+        job_id = self.create_job(db, [100, 250, 50])
+        docs = farm.split_job(db, job_id, 120)
+        self.assertEqual([d['_id'] for d in docs],
+            [farm.task_id(job_id, i) for i in range(4)]
+            + [farm.join_task_id(job_id)]
+        )
+        self.assertEqual([d['offset'] for d in docs[:-1]], [0, 120, 240, 360])
+        self.assertEqual([d['frames'] for d in docs[:-1]], [120, 120, 120, 40])
+        self.assertEqual(docs[-1]['count'], 4)
+
+        # Splitting again is harmless:
+        farm.split_job(db, job_id, 120)
+        tasks = farm.get_job_tasks(db, job_id)
+        self.assertEqual([t['_id'] for t in tasks], [d['_id'] for d in docs])
+        self.assertEqual(len(farm.get_open_tasks(db)), 5)
+
+    def test_leases(self):
+        db = self.get_db()
+        job_id = self.create_job(db, [30])
+        farm.split_job(db, job_id, 30)
+        (peer1, peer2) = (random_id(), random_id())
+        doc1 = db.get(farm.task_id(job_id, 0))
+        doc2 = db.get(farm.task_id(job_id, 0))
+
+        # Only one peer can win a claim:
+        self.assertIs(farm.claim_task(db, doc1, peer1, 60, 1000), True)
+        self.assertIs(farm.claim_task(db, doc2, peer2, 60, 1000), False)
+        doc2 = db.get(doc1['_id'])
+        self.assertEqual(doc2['lease'], {'peer': peer1, 'expires': 1060})
+        self.assertEqual(doc2['attempts'], 1)
+        self.assertIs(farm.claim_task(db, doc2, peer2, 60, 1030), False)
+
+        # Renewing extends the lease:
+        farm.renew_lease(db, doc1, peer1, 60, 1050)
+        doc2 = db.get(doc1['_id'])
+        self.assertIs(farm.claim_task(db, doc2, peer2, 60, 1070), False)
+        with self.assertRaises(ValueError):
+            farm.renew_lease(db, doc2, peer2, 60, 1070)
+
+        # An expired lease can be taken over, after which peer1 loses:
+        self.assertIs(farm.claim_task(db, doc2, peer2, 60, 1111), True)
+        self.assertEqual(doc2['attempts'], 2)
+        with self.assertRaises(Conflict):
+            farm.renew_lease(db, doc1, peer1, 60, 1112)
+        with self.assertRaises(Conflict):
+            farm.complete_task(db, doc1, random_id(30))
+
+        file_id = random_id(30)
+        farm.complete_task(db, doc2, file_id)
+        doc = db.get(doc2['_id'])
+        self.assertEqual(doc['state'], 'done')
+        self.assertIsNone(doc['lease'])
+        self.assertEqual(doc['file_id'], file_id)
+        self.assertIs(farm.claim_task(db, doc, peer1, 60, 9999), False)
+        self.assertEqual(
+            [t['_id'] for t in farm.get_open_tasks(db)],
+            [farm.join_task_id(job_id)]
+        )
+
+        # Releasing makes a task claimable right away:
+        join = db.get(farm.join_task_id(job_id))
+        self.assertIs(farm.claim_task(db, join, peer1, 60, 1000), True)
+        farm.release_task(db, join)
+        self.assertIs(farm.claim_task(db, join, peer2, 60, 1001), True)
+
+    def test_on_renew(self):
+        db = self.get_db()
+        job_id = self.create_job(db, [30])
+        farm.split_job(db, job_id, 30)
+        worker = MockFarmWorker(db)
+        doc = db.get(farm.task_id(job_id, 0))
+        self.assertIs(farm.claim_task(db, doc, worker.peer_id), True)
+        worker.task = doc
+        worker.renew_source = 17
+        worker.running = MockPipeline()
+        self.assertIs(worker.on_renew(), True)
+        self.assertEqual(worker.renew_source, 17)
+        self.assertIs(worker.lease_lost, False)
+        self.assertEqual(worker.running._calls, [])
+
+        # Another peer took over, so the running pipeline is aborted:
+        other = db.get(doc['_id'])
+        self.assertIs(
+            farm.claim_task(db, other, random_id(), 60, time.time() + 120),
+            True
+        )
+        self.assertIs(worker.on_renew(), False)
+        self.assertIsNone(worker.renew_source)
+        self.assertIs(worker.lease_lost, True)
+        self.assertEqual(worker.running._calls, [('complete', False)])
+
+    def test_no_peer_has_all_files(self):
+        db = self.get_db()
+        dmedia_db = Database('dmedia-{}-1'.format(random_id().lower()),
+            self.env
+        )
+        self.assertEqual(dmedia_db.ensure(), True)
+        job_id = self.create_job(db, [30, 40])
+        farm.split_job(db, job_id, 100)
+        _id = farm.task_id(job_id, 0)
+        (A, B) = db.get(_id)['files']
+
+        # Each peer has one of the two files, and a third peer has neither:
+        workers = []
+        for status in ({B: 1}, {A: 1}, {A: 1, B: 1}):
+            worker = MockFarmWorker(db)
+            worker.Dmedia = MockDmedia(status)
+            worker.dmedia_db = dmedia_db
+            self.assertEqual(worker.work(), [])
+            workers.append(worker)
+        self.assertEqual([w.to_dict()['wanted'] for w in workers],
+            [[B], [A], [A, B]]
+        )
+        for w in workers:
+            self.assertEqual(w.to_dict()['blocked'], [_id])
+
+        # So the task is left open, but marked as blocked for each peer:
+        doc = db.get(_id)
+        self.assertEqual(doc['state'], 'open')
+        missing = dict(
+            (peer, e['missing']) for (peer, e) in doc['blocked'].items()
+        )
+        self.assertEqual(missing, {
+            workers[0].peer_id: [B],
+            workers[1].peer_id: [A],
+            workers[2].peer_id: [A, B],
+        })
+
+        # Nothing is saved again until the missing files change:
+        rev = doc['_rev']
+        self.assertEqual(workers[0].work(), [])
+        self.assertEqual(db.get(_id)['_rev'], rev)
+        self.assertIs(farm.block_task(db, doc, workers[0].peer_id, [B]), False)
+        self.assertIs(farm.block_task(db, doc, workers[0].peer_id, []), True)
+        self.assertNotEqual(db.get(_id)['_rev'], rev)
+
+        # Claiming the task clears the blocked peers:
+        self.assertIs(farm.claim_task(db, doc, workers[0].peer_id), True)
+        self.assertEqual(db.get(_id)['blocked'], {})
+
+    def test_many_peers(self):
+        db = self.get_db()
+        job_id = self.create_job(db, [400, 300, 500])
+        docs = farm.split_job(db, job_id, 30)
+        ctx = multiprocessing.get_context('spawn')
+        procs = [
+            ctx.Process(target=_claim_and_complete,
+                args=(self.env, db.name, random_id())
+            )
+            for i in range(4)
+        ]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+            self.assertEqual(p.exitcode, 0)
+
+        # Each task was claimed exactly once:
+        tasks = farm.get_job_tasks(db, job_id)
+        self.assertEqual(len(tasks), len(docs))
+        for t in tasks:
+            self.assertEqual(t['state'], 'done')
+            self.assertEqual(t['attempts'], 1)
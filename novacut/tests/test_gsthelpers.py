@@ -32,8 +32,9 @@ from gi.repository import Gst
 from dbase32 import random_id
 
 from .helpers import random_filename
-from ..timefuncs import frame_to_nanosecond
+from ..timefuncs import FrameClock, frame_to_nanosecond
 from .. import gsthelpers
+from .. import tracing
 
 
 random = SystemRandom()
@@ -67,6 +68,13 @@ class TestElementFactoryError(TestCase):
 
 
 class TestFunctions(TestCase):
+    def test_init_gst(self):
+        self.assertIsNone(gsthelpers.init_gst())
+        self.assertIs(gsthelpers._initialized, True)
+        self.assertIs(Gst.is_initialized(), True)
+        self.assertIsNone(gsthelpers.init_gst())
+        self.assertIs(gsthelpers._initialized, True)
+
     def test_make_element(self):
         # Test with bad 'name' type:
         with self.assertRaises(TypeError) as cm:
@@ -268,6 +276,14 @@ class TestFunctions(TestCase):
         )
         self.assertEqual(s._calls, [name])
 
+    def test_get_factory_name(self):
+        element = gsthelpers.make_element('queue')
+        self.assertEqual(gsthelpers.get_factory_name(element), 'queue')
+        self.assertEqual(gsthelpers.get_factory_name(Gst.Pipeline()),
+            'Pipeline'
+        )
+        self.assertEqual(gsthelpers.get_factory_name(Gst.Bin()), 'Bin')
+
 
 class Callback:
     def __init__(self):
@@ -298,11 +314,45 @@ class TestPipeline(TestCase):
         self.assertEqual(len(inst.handlers), 2)
         self.assertIs(inst.handlers[0][0], inst.bus)
         self.assertIs(inst.handlers[1][0], inst.bus)
+        self.assertEqual(inst.probes, [])
         self.assertIsNone(inst.destroy())
         self.assertFalse(hasattr(inst, 'pipeline'))
         self.assertFalse(hasattr(inst, 'bus'))
         self.assertEqual(sys.getrefcount(inst), 2)
 
+    def test_tracing(self):
+        def callback(inst, success):
+            pass
+
+        tracer = tracing.enable('/tmp/unused.json')
+        try:
+            inst = gsthelpers.Pipeline(callback)
+            name = inst.trace_name()
+            self.assertTrue(name.startswith('Pipeline#'))
+            self.assertEqual(len(inst.handlers), 4)
+            self.assertIs(inst.traced_queues, False)
+            self.assertIs(inst.traced_first_buffer, False)
+            self.assertEqual(
+                [(e['cat'], e['name']) for e in tracer.events],
+                [(name, 'init')]
+            )
+            inst.pause()
+            self.assertEqual(tracer.events[-1]['name'], 'pause')
+            self.assertEqual(tracer.events[-1]['ph'], 'X')
+            inst.do_complete(True)
+            self.assertEqual(tracer.events[-1]['name'], 'complete')
+            self.assertEqual(tracer.events[-1]['args'], {'success': True})
+            self.assertEqual(inst.handlers, [])
+            self.assertEqual(sys.getrefcount(inst), 2)
+        finally:
+            tracing._tracer = None
+
+        # Nothing is recorded once tracing is disabled:
+        inst = gsthelpers.Pipeline(callback)
+        self.assertEqual(len(inst.handlers), 2)
+        self.assertFalse(hasattr(inst, 'traced_queues'))
+        inst.destroy()
+
     def test_connect(self):
         class DummyGObject:
             def __init__(self, hid):
@@ -328,6 +378,30 @@ class TestPipeline(TestCase):
         self.assertEqual(inst.handlers, [(obj, hid)])
         self.assertEqual(obj._calls, [(signal, callback)])
 
+    def test_add_probe(self):
+        class DummyPad:
+            def __init__(self, probe_id):
+                self._probe_id = probe_id
+                self._calls = []
+
+            def add_probe(self, mask, callback):
+                self._calls.append((mask, callback))
+                return self._probe_id
+
+        class Subclass(gsthelpers.Pipeline):
+            def __init__(self):
+                self.probes = []
+
+        inst = Subclass()
+        probe_id = random_id()
+        pad = DummyPad(probe_id)
+        mask = Gst.PadProbeType.BUFFER
+        def callback(pad, info):
+            pass
+        self.assertIsNone(inst.add_probe(pad, mask, callback))
+        self.assertEqual(inst.probes, [(pad, probe_id)])
+        self.assertEqual(pad._calls, [(mask, callback)])
+
     def test_destroy(self):
         class DummyPipeline:
             def __init__(self):
@@ -416,6 +490,28 @@ class TestPipeline(TestCase):
         for (obj, hid) in pairs:
             self.assertEqual(obj._calls, [hid])
 
+        # Test Pipeline.probes list:
+        class DummyPad:
+            def __init__(self):
+                self._calls = []
+
+            def remove_probe(self, probe_id):
+                self._calls.append(probe_id)
+
+        pipeline = DummyPipeline()
+        bus = DummyBus()
+        inst = Subclass(pipeline, bus)
+        inst.probes = []
+        pairs = tuple(
+            (DummyPad(), random_id()) for i in range(5)
+        )
+        for item in pairs:
+            inst.probes.append(item)
+        self.assertIsNone(inst.destroy())
+        self.assertEqual(inst.probes, [])
+        for (pad, probe_id) in pairs:
+            self.assertEqual(pad._calls, [probe_id])
+
     def test_do_complete(self):
         class Subclass(gsthelpers.Pipeline):
             def __init__(self, callback):
@@ -718,6 +814,28 @@ class TestDecoder(TestCase):
             (1.0, unit, flags, mode, start_ns, mode, stop_ns)
         ])
 
+    def test_framerate(self):
+        class Subclass(gsthelpers.Decoder):
+            def __init__(self):
+                self.framerate = None
+
+        inst = Subclass()
+        self.assertIsNone(inst.framerate)
+        self.assertIsNone(inst.clock)
+        framerate = Fraction(24000, 1001)
+        inst.framerate = framerate
+        self.assertIs(inst.framerate, framerate)
+        self.assertIsInstance(inst.clock, FrameClock)
+        self.assertIs(inst.clock.framerate, framerate)
+        for i in range(500):
+            frame = random.randrange(1234567)
+            ns = frame_to_nanosecond(frame, framerate)
+            self.assertEqual(inst.frame_to_nanosecond(frame), ns)
+            self.assertEqual(inst.nanosecond_to_frame(ns), frame)
+        inst.framerate = None
+        self.assertIsNone(inst.framerate)
+        self.assertIsNone(inst.clock)
+
     def test_seek_by_frame(self):
         class Subclass(gsthelpers.Decoder):
             def __init__(self, framerate):
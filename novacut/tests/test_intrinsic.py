@@ -0,0 +1,273 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Unit tests for the `novacut.intrinsic` module.
+"""
+
+from unittest import TestCase
+from copy import deepcopy
+
+from dbase32 import random_id
+from microfiber import BulkConflict
+
+from .. import schema
+from .. import intrinsic
+
+
+class MockProject:
+    """
+    Stand-in for a project `microfiber.Database` with a ``_changes`` feed.
+    """
+
+    def __init__(self):
+        self._docs = {}
+        self._changes = []
+        self._gets = []
+
+    def put(self, doc):
+        self._docs[doc['_id']] = doc
+        self._changes.append({'id': doc['_id'], 'doc': deepcopy(doc)})
+
+    def delete(self, _id):
+        del self._docs[_id]
+        self._changes.append({'id': _id, 'deleted': True})
+
+    def copy(self, _id):
+        return deepcopy(self._docs[_id])
+
+    def get(self, *parts, **options):
+        if parts == ():
+            return {'update_seq': len(self._changes)}
+        if parts == ('_changes',):
+            since = options['since']
+            return {
+                'results': self._changes[since:],
+                'last_seq': len(self._changes),
+            }
+        (_id,) = parts
+        self._gets.append(_id)
+        return self.copy(_id)
+
+
+class MockIntrinsic:
+    def __init__(self):
+        self._docs = {}
+
+    def save_many(self, docs):
+        rows = []
+        conflicts = []
+        for doc in docs:
+            assert '_rev' not in doc
+            assert '_attachments' not in doc
+            if doc['_id'] in self._docs:
+                conflicts.append(doc)
+                rows.append({'id': doc['_id'], 'error': 'conflict'})
+            else:
+                self._docs[doc['_id']] = doc
+                rows.append({'id': doc['_id'], 'rev': '1-x'})
+        if conflicts:
+            raise BulkConflict(conflicts, rows)
+        return rows
+
+
+def create_edit(src):
+    files = [random_id(30) for i in range(4)]
+    for _id in files:
+        src.put({'_id': _id, 'type': 'dmedia/file', 'bytes': 1000})
+    slices = []
+    for (i, file_id) in enumerate(files):
+        doc = schema.create_slice(file_id, {'frame': i}, {'frame': i + 10})
+        src.put(doc)
+        slices.append(doc['_id'])
+    seq1 = schema.create_sequence(slices[:2])
+    seq2 = schema.create_sequence(slices[2:])
+    src.put(seq1)
+    src.put(seq2)
+    root = schema.create_sequence([seq1['_id'], seq2['_id']])
+    src.put(root)
+    return (root['_id'], seq1['_id'], seq2['_id'], slices)
+
+
+def full_hash(src, root):
+    return schema.intrinsic_graph(root, src.copy, {})
+
+
+class TestFunctions(TestCase):
+    def test_get_children(self):
+        (A, B, C) = (random_id() for i in range(3))
+        doc = {'type': 'novacut/node', 'node': {'src': A}}
+        self.assertEqual(intrinsic.get_children(doc), {A})
+        doc['node']['src'] = [A, {'id': B}, A]
+        self.assertEqual(intrinsic.get_children(doc), {A, B})
+        doc['node']['src'] = {'left': A, 'right': {'id': C}}
+        self.assertEqual(intrinsic.get_children(doc), {A, C})
+        self.assertEqual(intrinsic.get_children({'type': 'novacut/node'}),
+            set()
+        )
+        self.assertEqual(intrinsic.get_children({'type': 'dmedia/file'}),
+            set()
+        )
+
+
+class TestIntrinsicIndex(TestCase):
+    def test_apply(self):
+        (A, B, C) = (random_id() for i in range(3))
+        inst = intrinsic.IntrinsicIndex(MockProject(), MockIntrinsic())
+        inst.apply(A, {'type': 'novacut/node', 'node': {'src': [B, C]}})
+        inst.apply(B, {'type': 'novacut/node', 'node': {'src': C}})
+        self.assertEqual(inst.children, {A: {B, C}, B: {C}})
+        self.assertEqual(inst.parents, {B: {A}, C: {A, B}})
+
+        # Edges are replaced when a node changes:
+        inst.apply(A, {'type': 'novacut/node', 'node': {'src': [B]}})
+        self.assertEqual(inst.children, {A: {B}, B: {C}})
+        self.assertEqual(inst.parents, {B: {A}, C: {B}})
+
+        # And dropped when it's deleted:
+        inst.apply(B, None)
+        self.assertEqual(inst.children, {A: {B}})
+        self.assertEqual(inst.parents, {B: {A}})
+        self.assertNotIn(B, inst.docs)
+
+    def test_invalidate(self):
+        (A, B, C, D) = (random_id() for i in range(4))
+        file_id = random_id(30)
+        inst = intrinsic.IntrinsicIndex(MockProject(), MockIntrinsic())
+        inst.parents.update({C: {A, B}, B: {A}, file_id: {C}, D: {D}})
+        for key in (A, B, C, D, file_id):
+            dict.__setitem__(inst.results, key, {'_id': key})
+
+        # Only the ancestors are dropped:
+        inst.invalidate(B)
+        self.assertEqual(set(inst.results), {C, D, file_id})
+        inst.invalidate(C)
+        self.assertEqual(set(inst.results), {D, file_id})
+
+        # A changed file doc doesn't change its ID, so parents are kept:
+        dict.__setitem__(inst.results, C, {'_id': C})
+        inst.invalidate(file_id)
+        self.assertEqual(set(inst.results), {C, D})
+
+        # Cycles don't loop forever:
+        inst.invalidate(D)
+        self.assertEqual(set(inst.results), {C})
+
+    def test_save(self):
+        src = MockProject()
+        dst = MockIntrinsic()
+        (root, seq1, seq2, slices) = create_edit(src)
+        inst = intrinsic.IntrinsicIndex(src, dst)
+        iroot = inst.save(root)
+        self.assertEqual(iroot, full_hash(src, root))
+        self.assertEqual(inst.since, len(src._changes))
+        self.assertEqual(len(src._gets), 4 + 4 + 3)
+        self.assertEqual(len(dst._docs), 4 + 4 + 3)
+        self.assertEqual(dst._docs[iroot]['type'], 'novacut/inode')
+
+        # Nothing changed, nothing is fetched, rehashed, or saved:
+        del src._gets[:]
+        saved = dict(dst._docs)
+        self.assertEqual(inst.save(root), iroot)
+        self.assertEqual(dst._docs, saved)
+        self.assertEqual(src._gets, [])
+
+        # Editing a slice only refetches that slice, and only rehashes the
+        # path up to the root:
+        doc = src.copy(slices[3])
+        doc['node']['stop'] = {'frame': 100}
+        src.put(doc)
+        iroot2 = inst.save(root)
+        self.assertNotEqual(iroot2, iroot)
+        self.assertEqual(iroot2, full_hash(src, root))
+        self.assertEqual(len(dst._docs), len(saved) + 3)
+        self.assertEqual(src._gets, [slices[3]])
+
+        # Reordering the root only rehashes the root:
+        doc = src.copy(root)
+        doc['node']['src'].reverse()
+        src.put(doc)
+        iroot3 = inst.save(root)
+        self.assertEqual(iroot3, full_hash(src, root))
+        self.assertEqual(len(dst._docs), len(saved) + 4)
+
+        # A deleted node that's no longer referenced doesn't matter:
+        seq2_doc = src.copy(seq2)
+        doc = src.copy(root)
+        doc['node']['src'] = [seq1]
+        src.put(doc)
+        src.delete(seq2)
+        self.assertEqual(inst.save(root), full_hash(src, root))
+        self.assertNotIn(seq2, inst.docs)
+        self.assertNotIn(seq2, inst.parents.get(slices[2], ()))
+
+        # And undoing the edits gives back the earlier intrinsic ID:
+        doc = src.copy(root)
+        doc['node']['src'] = [seq1, seq2]
+        src.put(doc)
+        src.put(seq2_doc)
+        self.assertEqual(inst.save(root), iroot2)
+
+    def test_update(self):
+        src = MockProject()
+        (root, seq1, seq2, slices) = create_edit(src)
+        inst = intrinsic.IntrinsicIndex(src, MockIntrinsic())
+
+        # The first update skips the changes made before it:
+        self.assertEqual(inst.update(), 0)
+        self.assertEqual(inst.since, len(src._changes))
+        self.assertEqual(inst.get_doc(seq1), src.copy(seq1))
+        self.assertEqual(inst.children, {seq1: set(slices[:2])})
+
+        # Later changes only drop the docs; they aren't fetched again until
+        # they're needed:
+        src.put(src.copy(seq1))
+        src.put(src.copy(seq2))
+        self.assertEqual(inst.update(), 2)
+        self.assertEqual(inst.docs, {})
+        self.assertEqual(inst.children, {})
+        self.assertEqual(src._gets, [seq1])
+
+    def test_trim(self):
+        src = MockProject()
+        dst = MockIntrinsic()
+        (root, seq1, seq2, slices) = create_edit(src)
+        with self.assertRaises(ValueError) as cm:
+            intrinsic.IntrinsicIndex(src, dst, 0)
+        self.assertEqual(str(cm.exception), 'need max_docs >= 1; got 0')
+
+        inst = intrinsic.IntrinsicIndex(src, dst, 5)
+        iroot = inst.save(root)
+        self.assertEqual(iroot, full_hash(src, root))
+        self.assertEqual(len(inst.docs), 5)
+        self.assertLessEqual(set(inst.results), set(inst.docs))
+        self.assertLessEqual(set(inst.children), set(inst.docs))
+
+        # Evicted nodes are refetched and give the same intrinsic ID:
+        self.assertEqual(inst.save(root), iroot)
+        self.assertEqual(len(inst.docs), 5)
+
+        # And edits below an evicted node are still picked up:
+        doc = src.copy(slices[0])
+        doc['node']['stop'] = {'frame': 100}
+        src.put(doc)
+        self.assertEqual(inst.save(root), full_hash(src, root))
+        self.assertNotEqual(inst.save(root), iroot)
@@ -0,0 +1,164 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Unit tests for the `novacut.manifest` module.
+"""
+
+from unittest import TestCase
+import os
+from os import path
+import json
+import tempfile
+import shutil
+
+from .. import manifest
+
+
+class TestFunctions(TestCase):
+    def test_frame_digest(self):
+        data = os.urandom(1234)
+        digest = manifest.frame_digest(data)
+        self.assertIsInstance(digest, str)
+        self.assertEqual(manifest.frame_digest(data), digest)
+        self.assertNotEqual(manifest.frame_digest(data + b'\x00'), digest)
+        if manifest.HASH_NAME == 'blake2b-160':
+            self.assertEqual(len(digest), 40)
+        else:
+            self.assertEqual(manifest.HASH_NAME, 'md5')
+            self.assertEqual(len(digest), 32)
+
+    def test_clock_time(self):
+        self.assertIsNone(manifest._clock_time(manifest.CLOCK_TIME_NONE))
+        self.assertEqual(manifest._clock_time(0), 0)
+        self.assertEqual(manifest._clock_time(33366666), 33366666)
+
+    def test_diff_manifests(self):
+        m1 = manifest.FrameManifest()
+        m2 = manifest.FrameManifest()
+        self.assertEqual(manifest.diff_manifests(m1, m2), ())
+        for i in range(10):
+            data = os.urandom(100)
+            m1.add_frame(data, i * 10, 10)
+            m2.add_frame(data, i * 10, 10)
+        self.assertEqual(manifest.diff_manifests(m1, m2), ())
+
+        m2.frames[3] = m2.frames[3]._replace(duration=11)
+        m2.frames[7] = m2.frames[7]._replace(digest='00')
+        self.assertEqual(manifest.diff_manifests(m1, m2), (3, 7))
+
+        m1.add_frame(b'extra', 100, 10)
+        m1.add_frame(b'extra', 110, 10)
+        self.assertEqual(manifest.diff_manifests(m1, m2), (3, 7, 10, 11))
+        self.assertEqual(manifest.diff_manifests(m2, m1), (3, 7, 10, 11))
+
+        m3 = manifest.FrameManifest('md4')
+        with self.assertRaises(ValueError) as cm:
+            manifest.diff_manifests(m1, m3)
+        self.assertEqual(str(cm.exception),
+            "cannot compare {!r} with 'md4' manifest".format(m1.hash_name)
+        )
+
+    def test_manifest_filename(self):
+        self.assertEqual(manifest.manifest_filename('FOO', '/home/bar'),
+            '/home/bar/.cache/novacut/manifests/FOO.manifest.json'
+        )
+
+    def test_move_manifest(self):
+        tmpdir = tempfile.mkdtemp(prefix='unittest.')
+        try:
+            filename = path.join(tmpdir, 'render.mkv')
+            self.assertIsNone(manifest.move_manifest(filename, 'FOO', tmpdir))
+            inst = manifest.FrameManifest()
+            inst.add_frame(b'foo', 0, 41666666)
+            inst.save(filename + manifest.MANIFEST_EXT)
+            dst = manifest.move_manifest(filename, 'FOO', tmpdir)
+            self.assertEqual(dst, manifest.manifest_filename('FOO', tmpdir))
+            self.assertFalse(path.exists(filename + manifest.MANIFEST_EXT))
+            self.assertEqual(manifest.FrameManifest.load(dst).frames,
+                inst.frames
+            )
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class TestFrameManifest(TestCase):
+    def test_init(self):
+        inst = manifest.FrameManifest()
+        self.assertEqual(inst.hash_name, manifest.HASH_NAME)
+        self.assertEqual(inst.frames, [])
+        self.assertEqual(inst.packets, [])
+        inst = manifest.FrameManifest('md5')
+        self.assertEqual(inst.hash_name, 'md5')
+
+    def test_add_frame(self):
+        inst = manifest.FrameManifest()
+        data = os.urandom(1000)
+        self.assertIsNone(inst.add_frame(data, 0, 41666666))
+        self.assertEqual(inst.frames, [
+            manifest.FrameInfo(manifest.frame_digest(data), 0, 41666666),
+        ])
+
+    def test_add_packet(self):
+        inst = manifest.FrameManifest()
+        self.assertIsNone(inst.add_packet(41666666, 0, 1776))
+        self.assertIsNone(inst.add_packet(
+            manifest.CLOCK_TIME_NONE, manifest.CLOCK_TIME_NONE, 17
+        ))
+        self.assertEqual(inst.packets, [
+            manifest.PacketInfo(41666666, 0, 1776),
+            manifest.PacketInfo(None, None, 17),
+        ])
+
+    def test_dict_roundtrip(self):
+        inst = manifest.FrameManifest()
+        inst.add_frame(b'foo', 0, 41666666)
+        inst.add_frame(b'bar', 41666666, 41666667)
+        inst.add_packet(0, manifest.CLOCK_TIME_NONE, 1776)
+        obj = inst.to_dict()
+        self.assertEqual(obj, {
+            'hash': manifest.HASH_NAME,
+            'frames': [
+                [manifest.frame_digest(b'foo'), 0, 41666666],
+                [manifest.frame_digest(b'bar'), 41666666, 41666667],
+            ],
+            'packets': [[0, None, 1776]],
+        })
+        new = manifest.FrameManifest.from_dict(json.loads(json.dumps(obj)))
+        self.assertEqual(new.hash_name, inst.hash_name)
+        self.assertEqual(new.frames, inst.frames)
+        self.assertEqual(new.packets, inst.packets)
+
+    def test_save_and_load(self):
+        tmpdir = tempfile.mkdtemp(prefix='unittest.')
+        try:
+            filename = path.join(tmpdir, 'render.mkv' + manifest.MANIFEST_EXT)
+            inst = manifest.FrameManifest()
+            for i in range(100):
+                inst.add_frame(os.urandom(50), i, 1)
+                inst.add_packet(i, i, 50)
+            self.assertIsNone(inst.save(filename))
+            new = manifest.FrameManifest.load(filename)
+            self.assertEqual(new.hash_name, inst.hash_name)
+            self.assertEqual(new.frames, inst.frames)
+            self.assertEqual(new.packets, inst.packets)
+        finally:
+            shutil.rmtree(tmpdir)
@@ -0,0 +1,198 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Unit tests for the `novacut.metrics` module.
+"""
+
+from unittest import TestCase
+import threading
+
+from .. import metrics
+
+
+class TestFunctions(TestCase):
+    def test_escape(self):
+        self.assertEqual(metrics._escape('foo'), 'foo')
+        self.assertEqual(metrics._escape('a"b'), 'a\\"b')
+        self.assertEqual(metrics._escape('a\\b'), 'a\\\\b')
+        self.assertEqual(metrics._escape('a\nb'), 'a\\nb')
+
+    def test_format_value(self):
+        self.assertEqual(metrics._format_value(0), '0')
+        self.assertEqual(metrics._format_value(17), '17')
+        self.assertEqual(metrics._format_value(0.25), '0.25')
+        self.assertEqual(metrics._format_value(float('inf')), '+Inf')
+        self.assertEqual(metrics._format_value(float('-inf')), '-Inf')
+
+
+class TestCounter(TestCase):
+    def test_init(self):
+        with self.assertRaises(TypeError) as cm:
+            metrics.Counter('foo', 'Foo', ['type'])
+        self.assertEqual(str(cm.exception),
+            metrics.TYPE_ERROR.format('labelnames', tuple, list, ['type'])
+        )
+        inst = metrics.Counter('foo', 'Foo')
+        self.assertEqual(inst.name, 'foo')
+        self.assertEqual(inst.help, 'Foo')
+        self.assertEqual(inst.labelnames, ())
+        self.assertEqual(inst.children, {})
+
+    def test_inc(self):
+        inst = metrics.Counter('foo_total', 'Foo')
+        self.assertIsNone(inst.inc())
+        self.assertIsNone(inst.inc(2))
+        self.assertEqual(inst.labels().value, 3)
+        with self.assertRaises(ValueError) as cm:
+            inst.inc(-1)
+        self.assertEqual(str(cm.exception),
+            'counters can only increase; got -1'
+        )
+        self.assertEqual(inst.render(),
+            '# HELP foo_total Foo\n# TYPE foo_total counter\nfoo_total 3\n'
+        )
+
+    def test_labels(self):
+        inst = metrics.Counter('jobs_total', 'Jobs', ('type', 'status'))
+        child = inst.labels('render_job', 'success')
+        self.assertIsInstance(child, metrics.CounterChild)
+        self.assertIs(inst.labels('render_job', 'success'), child)
+        with self.assertRaises(ValueError) as cm:
+            inst.labels('render_job')
+        self.assertEqual(str(cm.exception),
+            "jobs_total: need 2 label values; got ('render_job',)"
+        )
+        child.inc()
+        inst.labels('thumbnail', 'error').inc(5)
+        self.assertEqual(inst.render(), '\n'.join([
+            '# HELP jobs_total Jobs',
+            '# TYPE jobs_total counter',
+            'jobs_total{type="render_job",status="success"} 1',
+            'jobs_total{type="thumbnail",status="error"} 5',
+            '',
+        ]))
+
+    def test_threads(self):
+        inst = metrics.Counter('foo_total', 'Foo')
+        child = inst.labels()
+
+        def target():
+            for i in range(1000):
+                child.inc()
+
+        threads = [threading.Thread(target=target) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(child.value, 8000)
+
+    def test_render_while_adding_labels(self):
+        inst = metrics.Counter('foo_total', 'Foo', ('n',))
+        errors = []
+
+        def target():
+            try:
+                for i in range(200):
+                    inst.render()
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=target)
+        thread.start()
+        for i in range(5000):
+            inst.labels(i).inc()
+        thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(inst.children), 5000)
+
+
+class TestGauge(TestCase):
+    def test_methods(self):
+        inst = metrics.Gauge('running', 'Running jobs')
+        inst.set(5)
+        inst.inc()
+        inst.dec(3)
+        self.assertEqual(inst.labels().value, 3)
+        self.assertEqual(inst.render(),
+            '# HELP running Running jobs\n# TYPE running gauge\nrunning 3\n'
+        )
+
+
+class TestHistogram(TestCase):
+    def test_init(self):
+        inst = metrics.Histogram('foo', 'Foo')
+        self.assertEqual(inst.buckets, metrics.DEFAULT_BUCKETS)
+        inst = metrics.Histogram('foo', 'Foo', buckets=(5, 1, 2))
+        self.assertEqual(inst.buckets, (1, 2, 5))
+
+    def test_observe(self):
+        inst = metrics.Histogram('seconds', 'Duration', ('type',),
+            buckets=(1, 5)
+        )
+        child = inst.labels('render_job')
+        for value in (0.5, 1, 3, 7):
+            child.observe(value)
+        self.assertEqual(child.counts, [2, 1, 1])
+        self.assertEqual(child.sum, 11.5)
+        self.assertEqual(child.count, 4)
+        self.assertEqual(inst.render(), '\n'.join([
+            '# HELP seconds Duration',
+            '# TYPE seconds histogram',
+            'seconds_bucket{type="render_job",le="1"} 2',
+            'seconds_bucket{type="render_job",le="5"} 3',
+            'seconds_bucket{type="render_job",le="+Inf"} 4',
+            'seconds_sum{type="render_job"} 11.5',
+            'seconds_count{type="render_job"} 4',
+            '',
+        ]))
+
+
+class TestRegistry(TestCase):
+    def test_add(self):
+        registry = metrics.Registry()
+        with self.assertRaises(TypeError) as cm:
+            registry.add('foo')
+        self.assertEqual(str(cm.exception),
+            metrics.TYPE_ERROR.format('metric', metrics.Metric, str, 'foo')
+        )
+        counter = metrics.Counter('foo', 'Foo')
+        self.assertIs(registry.add(counter), counter)
+        self.assertEqual(registry.metrics, {'foo': counter})
+        with self.assertRaises(ValueError) as cm:
+            registry.add(metrics.Gauge('foo', 'Foo'))
+        self.assertEqual(str(cm.exception), "metric 'foo' already registered")
+
+    def test_render(self):
+        registry = metrics.Registry()
+        self.assertEqual(registry.render(), '')
+        registry.add(metrics.Gauge('b', 'B')).set(2)
+        registry.add(metrics.Counter('a', 'A')).inc()
+        self.assertEqual(registry.render(), '\n'.join([
+            '# HELP a A',
+            '# TYPE a counter',
+            'a 1',
+            '# HELP b B',
+            '# TYPE b gauge',
+            'b 2',
+            '',
+        ]))
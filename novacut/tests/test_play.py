@@ -61,8 +61,79 @@ class TestVideoSink(TestCase):
         inst = play.VideoSink(callback, sample_queue, xid)
         self.assertIs(inst.sample_queue, sample_queue)
         self.assertIs(inst.xid, xid)
+        self.assertEqual(inst.start, 0)
+        self.assertEqual(inst.frame, 0)
+        self.assertIsNone(inst.on_first_frame)
 
         self.assertIsNone(inst.destroy())
         self.assertEqual(inst.handlers, [])
         self.assertEqual(sys.getrefcount(inst), 2)
 
+        # After a seek:
+        inst = play.VideoSink(callback, sample_queue, xid, 1234, callback)
+        self.assertEqual(inst.start, 1234)
+        self.assertEqual(inst.frame, 1234)
+        self.assertIs(inst.on_first_frame, callback)
+        self.assertIs(inst.wait_for_queue_to_fill(), True)
+        self.assertIsNone(inst.destroy())
+        self.assertIs(inst.wait_for_queue_to_fill(), False)
+        self.assertIs(inst.resume(), False)
+        self.assertEqual(sys.getrefcount(inst), 2)
+
+
+class TestPlayer(TestCase):
+    def test_seek(self):
+        def callback(obj, success):
+            pass
+        slices = [random_slice() for i in range(5)]
+        slices[2] = slices[2]._replace(stop=slices[2].start)
+        offsets = [0]
+        for s in slices:
+            offsets.append(offsets[-1] + s.stop - s.start)
+        xid = random_id()
+
+        inst = play.Player(callback, slices, xid, prefetch=False)
+        self.assertEqual(inst.total_frames, offsets[-1])
+        self.assertEqual(inst.start, 0)
+        self.assertEqual(inst.pending, slices[:2] + slices[3:])
+        self.assertIsNone(inst.prefetcher)
+        self.assertEqual(inst.output.start, 0)
+
+        # Seek into the middle of slices[3]:
+        output = inst.output
+        frame = offsets[3] + (slices[3].stop - slices[3].start) // 2
+        self.assertIsNone(inst.seek(frame))
+        self.assertIsNot(inst.output, output)
+        self.assertIsNotNone(output.success)
+        self.assertEqual(inst.start, frame)
+        self.assertEqual(inst.output.start, frame)
+        self.assertEqual(inst.output.frame, frame)
+        self.assertEqual(inst.pending, [
+            slices[3]._replace(start=slices[3].start + frame - offsets[3]),
+            slices[4],
+        ])
+        self.assertIsNone(inst.time_to_first_frame)
+
+        # Seek to the last frame:
+        inst.seek(offsets[-1] - 1)
+        self.assertEqual(inst.pending,
+            [slices[4]._replace(start=slices[4].stop - 1)]
+        )
+        for frame in (-1, offsets[-1]):
+            with self.assertRaises(IndexError) as cm:
+                inst.seek(frame)
+            self.assertEqual(str(cm.exception),
+                'need 0 <= frame < {}; got {}'.format(offsets[-1], frame)
+            )
+
+        # Only the current output reports the first frame:
+        inst.on_first_frame(output)
+        self.assertIsNone(inst.time_to_first_frame)
+        inst.on_first_frame(inst.output)
+        self.assertIsInstance(inst.time_to_first_frame, float)
+        self.assertGreaterEqual(inst.time_to_first_frame, 0)
+
+        inst.destroy()
+        self.assertIs(inst.success, False)
+        self.assertIsNone(inst.output)
+
@@ -0,0 +1,165 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Unit tests for the `novacut.prefetch` module.
+"""
+
+from unittest import TestCase
+from collections import namedtuple
+import tempfile
+import shutil
+import os
+from os import path
+
+from .. import prefetch
+
+
+Slice = namedtuple('Slice', 'start stop filename')
+MiB = 1024 * 1024
+
+
+class TestFunctions(TestCase):
+    def test_merge_ranges(self):
+        merge_ranges = prefetch.merge_ranges
+        self.assertEqual(merge_ranges([]), [])
+        self.assertEqual(merge_ranges([(5, 0), (7, -1)]), [])
+        self.assertEqual(merge_ranges([(0, 10), (10, 10)]), [(0, 20)])
+        self.assertEqual(merge_ranges([(0, 10), (11, 10)]),
+            [(0, 10), (11, 10)]
+        )
+        self.assertEqual(merge_ranges([(5, 100), (0, 10), (20, 5)]),
+            [(0, 105)]
+        )
+
+    def test_get_ranges(self):
+        get_ranges = prefetch.get_ranges
+        self.assertEqual(get_ranges(0, 0, 1), [])
+        self.assertEqual(get_ranges(1000, 0, 1), [(0, 1000)])
+
+        size = 1000 * MiB
+        self.assertEqual(get_ranges(size, 0, 100),
+            [(0, MiB), (size - MiB, MiB)]
+        )
+        self.assertEqual(get_ranges(size, 0, 100, 1000),
+            [(0, 130 * MiB), (size - MiB, MiB)]
+        )
+        self.assertEqual(get_ranges(size, 900, 1000, 1000),
+            [(0, MiB), (870 * MiB, 130 * MiB)]
+        )
+        self.assertEqual(get_ranges(size, 500, 501, 1000),
+            [(0, MiB), (470 * MiB, 61 * MiB), (size - MiB, MiB)]
+        )
+
+
+class TestPrefetcher(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix='novacut.')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, size):
+        filename = path.join(self.tmp, name)
+        with open(filename, 'wb') as fp:
+            fp.write(b'x' * size)
+        return filename
+
+    def test_init(self):
+        slices = [Slice(0, 10, '/foo'), Slice(5, 7, '/bar')]
+        inst = prefetch.Prefetcher(slices)
+        self.assertEqual(inst.slices, tuple(slices))
+        self.assertEqual(inst.budget, prefetch.PREFETCH_BUDGET)
+        self.assertEqual(inst.advised, [0, 0])
+        self.assertEqual(inst.position, 0)
+        self.assertIs(inst.closed, False)
+        self.assertIsNone(inst.thread)
+        self.assertEqual(inst.to_dict(),
+            {'bytes': 0, 'calls': 0, 'elapsed': 0.0}
+        )
+
+    def test_run(self):
+        foo = self.write('foo', 3000)
+        bar = self.write('bar', 5000)
+        slices = [
+            Slice(0, 10, foo),
+            Slice(5, 7, bar),
+            Slice(0, 1, path.join(self.tmp, 'nope')),
+            Slice(5, 7, foo),
+        ]
+        inst = prefetch.Prefetcher(slices)
+        inst.run()
+        self.assertEqual(inst.advised, [3000, 5000, 0, 3000])
+        self.assertEqual(inst.to_dict()['bytes'], 11000)
+        self.assertEqual(inst.to_dict()['calls'], 3)
+
+    def test_budget(self):
+        filenames = [self.write(str(i), 1000) for i in range(5)]
+        slices = [Slice(0, 1, f) for f in filenames]
+        inst = prefetch.Prefetcher(slices, budget=2500)
+        inst.start()
+        self.assertIsNotNone(inst.thread)
+
+        # The first slice, plus 2 more within the budget:
+        def wait_for(count):
+            for i in range(1000):
+                with inst.cond:
+                    if sum(1 for n in inst.advised if n) == count:
+                        return
+                inst.thread.join(0.01)
+            self.fail('prefetcher did not advise {} slices'.format(count))
+        wait_for(3)
+        inst.thread.join(0.1)
+        self.assertEqual(inst.advised, [1000, 1000, 1000, 0, 0])
+
+        inst.advance(1)
+        wait_for(4)
+        inst.advance(4)
+        inst.thread.join(5)
+        self.assertEqual(inst.advised, [1000] * 5)
+        inst.stop()
+        self.assertIsNone(inst.thread)
+
+    def test_stop(self):
+        filenames = [self.write(str(i), 1000) for i in range(3)]
+        slices = [Slice(0, 1, f) for f in filenames]
+        inst = prefetch.Prefetcher(slices, budget=10)
+        inst.start()
+        thread = inst.thread
+        inst.stop()
+        self.assertFalse(thread.is_alive())
+        self.assertIs(inst.closed, True)
+        self.assertEqual(inst.advised[1:], [0, 0])
+
+    def test_set_frames(self):
+        size = 10 * MiB
+        filename = self.write('foo', size)
+        inst = prefetch.Prefetcher([Slice(500, 600, filename)])
+        self.assertEqual(inst.get_ranges(inst.slices[0], size),
+            [(0, MiB), (size - MiB, MiB)]
+        )
+        inst.set_frames(filename, 1000)
+        self.assertEqual(inst.frames, {filename: 1000})
+        (begin, end) = (470 * size // 1000, 630 * size // 1000)
+        self.assertEqual(inst.get_ranges(inst.slices[0], size),
+            [(0, MiB), (begin, end - begin), (size - MiB, MiB)]
+        )
+        os.remove(filename)
@@ -32,9 +32,14 @@ from dbase32 import random_id
 from gi.repository import Gst
 
 from .helpers import random, random_filename, random_slice, random_framerate
+from .helpers import get_test_clip
 from ..gsthelpers import VIDEOSCALE_METHOD
 from .. import timefuncs
 from ..settings import get_default_settings
+from ..manifest import FrameManifest
+from ..benchmark import StageTimer
+from ..prefetch import Prefetcher
+from ..validate import run_pipeline, DemuxValidator, PlayThrough
 from .. import render
 
 
@@ -93,6 +98,17 @@ class TestFunctions(TestCase):
             for minval in (None, val, val - 1):
                 self.assertIs(_int(d, key, minval), val)
 
+    def test_get_demuxer(self):
+        get_demuxer = render.get_demuxer
+        self.assertEqual(get_demuxer('matroskamux'), 'matroskademux')
+        self.assertEqual(get_demuxer({'name': 'webmmux'}), 'matroskademux')
+        self.assertEqual(get_demuxer({'name': 'oggmux', 'props': {}}),
+            'oggdemux'
+        )
+        with self.assertRaises(ValueError) as cm:
+            get_demuxer('avimux')
+        self.assertEqual(str(cm.exception), "no demuxer for muxer 'avimux'")
+
 
 class TestInput(TestCase):
     def test_init(self):
@@ -153,6 +169,53 @@ class TestInput(TestCase):
         self.assertFalse(hasattr(inst, 'pipeline'))
         self.assertFalse(hasattr(inst, 'bus'))
         self.assertEqual(sys.getrefcount(inst), 2)
+        self.assertIsNone(inst.stats)
+        self.assertEqual(inst.probes, [])
+
+        # With a StageTimer:
+        stats = StageTimer()
+        inst = render.Input(callback, buffer_queue, s, input_caps, stats)
+        self.assertIs(inst.stats, stats)
+        self.assertEqual(len(inst.probes), 1)
+        (pad, probe_id) = inst.probes[0]
+        self.assertIs(pad.get_parent(), inst.convert)
+        self.assertEqual(pad.get_name(), 'sink')
+        self.assertIsNone(inst.destroy())
+        self.assertEqual(inst.probes, [])
+
+    def test_record_stats(self):
+        class Subclass(render.Input):
+            def __init__(self, stats):
+                self.stats = stats
+                self.run_start = 10.0
+                self.convert_start = None
+                self.first_sample = None
+                self.last_sample = None
+                self.seek_time = 0.0
+                self.convert_time = 0.0
+                self.wait_time = 0.0
+
+        stats = StageTimer()
+        inst = Subclass(stats)
+        inst.convert_start = 12.5
+        inst.mark_sample()
+        self.assertEqual(inst.seek_time, 2.5)
+        self.assertEqual(inst.first_sample, 12.5)
+        self.assertGreater(inst.convert_time, 0.0)
+        self.assertGreaterEqual(inst.last_sample, inst.first_sample)
+
+        inst.first_sample = 20.0
+        inst.last_sample = 30.0
+        inst.convert_time = 3.0
+        inst.wait_time = 2.0
+        self.assertIsNone(inst.record_stats())
+        totals = stats.totals
+        self.assertEqual(totals['seek'], 2.5)
+        self.assertEqual(totals['convert'], 3.0)
+        self.assertEqual(totals['queue_wait'], 2.0)
+        self.assertEqual(totals['decode'], 5.0)
+        self.assertEqual(totals['encode'], 0.0)
+        self.assertEqual(totals['construct'], 0.0)
 
     def test_check_frame(self):
         class Subclass(render.Input):
@@ -191,6 +254,8 @@ class TestOutput(TestCase):
         self.assertEqual(inst.frame, 0)
         self.assertIs(inst.sent_eos, False)
         self.assertEqual(inst.framerate, Fraction(30000, 1001))
+        self.assertIsInstance(inst.clock, timefuncs.FrameClock)
+        self.assertIs(inst.clock.framerate, inst.framerate)
         self.assertIsInstance(inst.input_caps, Gst.Caps)
         self.assertEqual(inst.input_caps.to_string(),
             'video/x-raw, chroma-site=(string)mpeg2, colorimetry=(string)bt709, format=(string)I420, height=(int)1080, interlace-mode=(string)progressive, pixel-aspect-ratio=(fraction)1/1, width=(int)1920'
@@ -241,6 +306,60 @@ class TestOutput(TestCase):
         self.assertFalse(hasattr(inst, 'pipeline'))
         self.assertFalse(hasattr(inst, 'bus'))
         self.assertEqual(sys.getrefcount(inst), 2)
+        self.assertIsNone(inst.manifest)
+        self.assertIsNone(inst.stats)
+        self.assertIsNone(inst.encode_start)
+        self.assertEqual(inst.probes, [])
+
+        # With a FrameManifest:
+        manifest = FrameManifest()
+        inst = render.Output(callback, buffer_queue, settings, filename,
+            manifest
+        )
+        self.assertIs(inst.manifest, manifest)
+        self.assertEqual(len(inst.probes), 1)
+        (pad, probe_id) = inst.probes[0]
+        self.assertIs(pad.get_parent(), inst.enc)
+        self.assertEqual(pad.get_name(), 'src')
+        self.assertIsNone(inst.destroy())
+        self.assertEqual(inst.probes, [])
+        self.assertEqual(sys.getrefcount(inst), 2)
+
+        # With a StageTimer:
+        stats = StageTimer()
+        inst = render.Output(callback, buffer_queue, settings, filename,
+            None, stats
+        )
+        self.assertIs(inst.stats, stats)
+        self.assertEqual(len(inst.probes), 2)
+        self.assertIs(inst.probes[0][0].get_parent(), inst.enc)
+        self.assertEqual(inst.probes[0][0].get_name(), 'sink')
+        self.assertIs(inst.probes[1][0].get_parent(), inst.enc)
+        self.assertEqual(inst.probes[1][0].get_name(), 'src')
+        self.assertIsNone(inst.destroy())
+        self.assertEqual(inst.probes, [])
+        self.assertEqual(sys.getrefcount(inst), 2)
+
+    def test_on_encoded_probe(self):
+        class Subclass(render.Output):
+            def __init__(self, stats):
+                self.stats = stats
+                self.encode_start = None
+
+        stats = StageTimer()
+        inst = Subclass(stats)
+        OK = Gst.PadProbeReturn.OK
+        self.assertIs(inst.on_encoded_probe(None, None), OK)
+        self.assertEqual(stats.counts['encode'], 0)
+        self.assertIs(inst.on_encode_probe(None, None), OK)
+        self.assertIsInstance(inst.encode_start, float)
+        self.assertIs(inst.on_encoded_probe(None, None), OK)
+        self.assertIsNone(inst.encode_start)
+        self.assertEqual(stats.counts['encode'], 1)
+        self.assertGreaterEqual(stats.totals['encode'], 0.0)
+        # Further packets for the same input frame aren't counted:
+        self.assertIs(inst.on_encoded_probe(None, None), OK)
+        self.assertEqual(stats.counts['encode'], 1)
 
 
 class TestRenderer(TestCase):
@@ -266,6 +385,35 @@ class TestRenderer(TestCase):
         self.assertEqual(inst.input_caps.to_string(),
             'video/x-raw, chroma-site=(string)mpeg2, colorimetry=(string)bt709, format=(string)I420, height=(int)1080, interlace-mode=(string)progressive, pixel-aspect-ratio=(fraction)1/1, width=(int)1920'
         )
+        self.assertIs(inst.filename, filename)
+        self.assertIsNone(inst.manifest)
+        self.assertIsNone(inst.output.manifest)
+        self.assertIsNone(inst.stats)
+        self.assertIsNone(inst.output.stats)
+        self.assertIsNone(inst.prefetcher)
+        self.assertEqual(inst.index, -1)
+        inst.destroy()
+
+        inst = render.Renderer(callback, slices, settings, filename,
+            prefetch=True
+        )
+        self.assertIsInstance(inst.prefetcher, Prefetcher)
+        self.assertEqual(inst.prefetcher.slices, slices)
+        inst.destroy()
+
+        inst = render.Renderer(callback, slices, settings, filename, True)
+        self.assertIsInstance(inst.manifest, FrameManifest)
+        self.assertIs(inst.output.manifest, inst.manifest)
+        inst.destroy()
+
+        stats = StageTimer()
+        inst = render.Renderer(callback, slices, settings, filename,
+            stats=stats
+        )
+        self.assertIs(inst.stats, stats)
+        self.assertIs(inst.output.stats, stats)
+        self.assertEqual(stats.counts['construct'], 1)
+        inst.destroy()
 
     def test_on_output_complete(self):
         class DummyOutput:
@@ -276,6 +424,7 @@ class TestRenderer(TestCase):
             def __init__(self, total_frames, output):
                 self.total_frames = total_frames
                 self.output = output
+                self.manifest = None
                 self._complete_calls = []
 
             def complete(self, success):
@@ -298,3 +447,67 @@ class TestRenderer(TestCase):
             self.assertIsNone(inst.on_output_complete(output, True))
             self.assertEqual(inst._complete_calls, [False])
 
+
+class TestJoiner(TestCase):
+    def test_init(self):
+        def callback(inst, success):
+            pass
+
+        settings = get_default_settings()
+        filenames = [random_filename() for i in range(3)]
+        filename = random_filename()
+        with self.assertRaises(ValueError) as cm:
+            render.Joiner(callback, [], settings, filename)
+        self.assertEqual(str(cm.exception), 'need at least one segment to join')
+
+        inst = render.Joiner(callback, filenames, settings, filename)
+        self.assertIs(inst.filenames, filenames)
+        self.assertEqual(len(inst.sources), 3)
+        self.assertEqual(len(inst.concat_pads), 3)
+        self.assertIs(inst.concat.get_property('adjust-base'), True)
+        self.assertEqual(inst.sink.get_property('location'), filename)
+        inst.destroy()
+
+    def test_live(self):
+        framerate = Fraction(30000, 1001)
+        src = get_test_clip('theora', framerate, frames=48)
+        settings = {
+            'muxer': 'oggmux',
+            'ext': 'ogv',
+            'video': {
+                'encoder': {'name': 'theoraenc'},
+                'caps': {
+                    'format': 'I420',
+                    'width': 320,
+                    'height': 180,
+                    'interlace-mode': 'progressive',
+                    'pixel-aspect-ratio': '1/1',
+                    'framerate': {'num': 30000, 'denom': 1001},
+                },
+            },
+        }
+
+        # Render two segments, each starting at timestamp zero:
+        segments = []
+        for (start, stop) in ((0, 30), (30, 48)):
+            dst = random_filename()
+            slices = (render.Slice(start, stop, src),)
+            inst = run_pipeline(render.Renderer, slices, settings, dst)
+            self.assertIs(inst.success, True)
+            segments.append(dst)
+
+        # Join them, without re-encoding:
+        dst = random_filename()
+        inst = run_pipeline(render.Joiner, segments, settings, dst)
+        self.assertIs(inst.success, True)
+
+        # The joined file has contiguous timestamps and all 48 frames:
+        inst = run_pipeline(DemuxValidator, dst, True, False)
+        self.assertIs(inst.success, True)
+        self.assertEqual(inst.info['frames'], 48)
+        inst = run_pipeline(PlayThrough, dst)
+        self.assertIs(inst.success, True)
+        self.assertEqual(len(inst.video), 48)
+        for (i, info) in enumerate(inst.video):
+            frame = timefuncs.nanosecond_to_frame(info.pts, framerate)
+            self.assertEqual(frame, i)
@@ -32,6 +32,7 @@ from microfiber import Database, NotFound
 
 from ..misc import random_start_stop
 from ..render import Slice
+from ..timeline import Timeline
 from .. import renderservice
 
 
@@ -294,6 +295,21 @@ class TestFunctions(TestCase):
         )
         self.assertEqual(Dmedia._calls, list(files[0:30]))       
 
+    def test_resolve_timeline(self):
+        Dmedia = MockDmedia()
+        (A, B) = sorted(random_id(30) for i in range(2))
+        tl = Timeline([
+            (random_id(), B, 10, 20),
+            (random_id(), A, 0, 5),
+            (random_id(), B, 30, 31),
+        ])
+        self.assertEqual(renderservice.resolve_timeline(Dmedia, tl), (
+            Slice(10, 20, Dmedia._path(B)),
+            Slice(0, 5, Dmedia._path(A)),
+            Slice(30, 31, Dmedia._path(B)),
+        ))
+        self.assertEqual(Dmedia._calls, [A, B])
+
 
 def random_slice(Dmedia, src):
     (start, stop) = random_start_stop(123456)
@@ -433,3 +449,68 @@ class TestCouchFunctions(CouchTestCase):
             self.assertIsInstance(item, Slice)
         self.assertEqual(Dmedia._calls, sorted(files))
 
+    def test_TimelineIndex(self):
+        db = self.get_db(create=True)
+        docs = []
+        for i in range(6):
+            (start, stop) = random_start_stop(1000)
+            docs.append({
+                '_id': random_id(),
+                'node': {
+                    'type': 'video/slice',
+                    'src': random_id(30),
+                    'start': start,
+                    'stop': stop + 1,
+                },
+            })
+        seq = {
+            '_id': random_id(),
+            'node': {
+                'type': 'video/sequence',
+                'src': [d['_id'] for d in docs[3:]],
+            },
+        }
+        root = {
+            '_id': random_id(),
+            'node': {
+                'type': 'video/sequence',
+                'src': [d['_id'] for d in docs[:3]] + [seq['_id']],
+            },
+        }
+        db.save_many(docs + [seq, root])
+        raw_slices = tuple(
+            (d['_id'], d['node']['src'], d['node']['start'], d['node']['stop'])
+            for d in docs
+        )
+
+        index = renderservice.TimelineIndex(db)
+        tl = index.get(root['_id'])
+        self.assertIsInstance(tl, Timeline)
+        self.assertEqual(tl.slices, raw_slices)
+        self.assertIs(index.get(root['_id']), tl)
+        tl2 = index.get(seq['_id'])
+        self.assertEqual(tl2.slices, raw_slices[3:])
+        self.assertEqual(index.deps[root['_id']],
+            set(d['_id'] for d in docs + [seq, root])
+        )
+
+        # Unrelated changes don't drop anything:
+        db.save({'_id': random_id(), 'type': 'novacut/project'})
+        self.assertIs(index.get(root['_id']), tl)
+        self.assertIs(index.get(seq['_id']), tl2)
+
+        # A changed slice drops the timelines that include it:
+        docs[0]['node']['stop'] += 1
+        db.save(docs[0])
+        tl3 = index.get(root['_id'])
+        self.assertIsNot(tl3, tl)
+        self.assertEqual(tl3.frames, tl.frames + 1)
+        self.assertIs(index.get(seq['_id']), tl2)
+
+        docs[5]['node']['start'] = docs[5]['node']['stop']
+        db.save(docs[5])
+        self.assertEqual(index.get(root['_id']).slices,
+            (raw_slices[0][:3] + (raw_slices[0][3] + 1,),) + raw_slices[1:5]
+        )
+        self.assertEqual(index.get(seq['_id']).slices, raw_slices[3:5])
+        self.assertEqual(set(index.timelines), {root['_id'], seq['_id']})
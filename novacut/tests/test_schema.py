@@ -27,6 +27,7 @@ from unittest import TestCase
 import os
 import time
 from copy import deepcopy
+from base64 import b64encode
 import json
 
 from dbase32 import db32enc, random_id
@@ -50,6 +51,34 @@ class TestFunctions(TestCase):
             json.dumps(doc, sort_keys=True, separators=(',',':')).encode()
         )
 
+    def test_iter_normalized(self):
+        nodes = [
+            {},
+            [],
+            {'hello': 'world'},
+            {'src': [random_id() for i in range(5000)], 'type': 'foo'},
+            {'src': dict((random_id(), random_id()) for i in range(500))},
+            {'unicode': '\u2019 \u00e9', 'int': 17, 'float': 1.5, 'n': None},
+        ]
+        for node in nodes:
+            data = schema.normalized_dumps(node)
+            for chunk_size in (1, 7, 4096, schema.CHUNK_SIZE):
+                chunks = list(schema.iter_normalized(node, chunk_size))
+                self.assertEqual(b''.join(chunks), data)
+                for chunk in chunks[:-1]:
+                    self.assertGreaterEqual(len(chunk), chunk_size)
+
+    def test_hash_node_iter(self):
+        node = {'src': [random_id() for i in range(5000)], 'type': 'foo'}
+        data = schema.normalized_dumps(node)
+        self.assertEqual(
+            schema.hash_node_iter(schema.iter_normalized(node)),
+            schema.hash_node(data)
+        )
+        chunks = [data[i:i+10] for i in range(0, len(data), 10)]
+        self.assertEqual(schema.hash_node_iter(chunks), schema.hash_node(data))
+        self.assertEqual(schema.hash_node_iter([]), schema.hash_node(b''))
+
     def test_hash_node(self):
         data = os.urandom(100)
         digest = skein512(data,
@@ -635,6 +664,38 @@ class TestFunctions(TestCase):
         self.assertIs(t.node, node)
         self.assertEqual(schema.normalized_dumps(t.node), data)
 
+        # Large nodes are hashed incrementally, without keeping the data:
+        node = schema.create_video_sequence(
+            [random_id() for i in range(schema.LARGE_NODE_SRC + 1)]
+        )['node']
+        data = schema.normalized_dumps(node)
+        t = schema.intrinsic_node(node)
+        self.assertEqual(t.id, schema.hash_node(data))
+        self.assertIsNone(t.data)
+        self.assertIs(t.node, node)
+
+    def test_create_inode(self):
+        node = {'type': 'video/sequence', 'src': [random_id()]}
+        inode = schema.intrinsic_node(node)
+        doc = schema.create_inode(inode)
+        self.assertIsInstance(doc.pop('time'), float)
+        self.assertEqual(doc, {
+            '_id': inode.id,
+            '_attachments': {
+                'node': {
+                    'data': b64encode(inode.data).decode(),
+                    'content_type': 'application/json',
+                },
+            },
+            'type': 'novacut/inode',
+            'node': node,
+            'renders': {},
+        })
+        inode = schema.Intrinsic(inode.id, None, node)
+        doc = schema.create_inode(inode)
+        self.assertNotIn('_attachments', doc)
+        self.assertEqual(doc['node'], node)
+
     def test_intrinsic_src(self):
         return  # FIXME: need to change this a bit to make it easier to test
         _id = random_id(30)
@@ -691,3 +752,140 @@ class TestFunctions(TestCase):
             set(schema.iter_src(src)),
             set(ids)
         )
+
+
+def iter_mutations(doc):
+    bad_values = (None, -1, 0, 1, 10, 'x', '', [], {}, ['x'], [{}],
+        [{'id': random_id(), 'offset': 'x'}]
+    )
+    for key in list(doc):
+        d = deepcopy(doc)
+        del d[key]
+        yield d
+        for value in bad_values:
+            d = deepcopy(doc)
+            d[key] = value
+            yield d
+    for key in list(doc.get('node', {})):
+        d = deepcopy(doc)
+        del d['node'][key]
+        yield d
+        for value in bad_values:
+            d = deepcopy(doc)
+            d['node'][key] = value
+            yield d
+
+
+class TestCompiledChecks(TestCase):
+    def get_docs(self):
+        return [
+            schema.create_video_slice(random_file_id(), 17, 69),
+            schema.create_video_sequence([random_id() for i in range(5)]),
+            schema.create_audio_slice(random_file_id(), 48000, 96000),
+            schema.create_project('Hobo Spaceship'),
+            schema.create_node({'type': 'foo', 'src': random_id()}),
+        ]
+
+    def check_same(self, check, fast, doc):
+        try:
+            check(deepcopy(doc))
+            expected = None
+        except (TypeError, ValueError) as e:
+            expected = (type(e), str(e))
+        try:
+            fast(deepcopy(doc))
+            got = None
+        except (TypeError, ValueError) as e:
+            got = (type(e), str(e))
+        self.assertEqual(got, expected)
+
+    def test_parity(self):
+        pairs = (
+            (schema.check_novacut, schema.fast_check_novacut),
+            (schema.check_node, schema.fast_check_node),
+            (schema.check_video_sequence, schema.fast_check_video_sequence),
+            (schema.check_video_slice, schema.fast_check_video_slice),
+            (schema.check_audio_slice, schema.fast_check_audio_slice),
+            (schema.check_project, schema.fast_check_project),
+        )
+        for doc in self.get_docs():
+            for (check, fast) in pairs:
+                self.check_same(check, fast, doc)
+                for bad in iter_mutations(doc):
+                    self.check_same(check, fast, bad)
+
+    def test_compile_check(self):
+        def check(doc):
+            if doc['foo'] != 'bar':
+                raise ValueError('not bar')
+
+        rules = [(['foo'], str, (schema._equals, 'bar'))]
+        fast = schema.compile_check(check, rules)
+        self.assertEqual(fast.__name__, 'compiled_check')
+        self.assertIsNone(fast({'foo': 'bar'}))
+        with self.assertRaises(ValueError) as cm:
+            fast({'foo': 'baz'})
+        self.assertEqual(str(cm.exception), 'not bar')
+
+        # The reference check has the final say:
+        fast = schema.compile_check(check, [(['foo'], int)])
+        self.assertIsNone(fast({'foo': 'bar'}))
+
+        # EACH and _Ref:
+        rules = [
+            (['items', schema.EACH, 'n'], int,
+                (schema._at_least, schema._Ref(lambda doc: doc['min'])),
+            ),
+        ]
+        calls = []
+        fast = schema.compile_check(lambda doc: calls.append(doc), rules)
+        doc = {'min': 3, 'items': [{'n': 3}, {'n': 4}]}
+        fast(doc)
+        self.assertEqual(calls, [])
+        doc['items'].append({'n': 2})
+        fast(doc)
+        self.assertEqual(calls, [doc])
+
+    def test_get_fast_check(self):
+        (vslice, seq, aslice, project, node) = self.get_docs()
+        self.assertIs(schema.get_fast_check(vslice),
+            schema.fast_check_video_slice
+        )
+        self.assertIs(schema.get_fast_check(seq),
+            schema.fast_check_video_sequence
+        )
+        self.assertIs(schema.get_fast_check(aslice),
+            schema.fast_check_audio_slice
+        )
+        self.assertIs(schema.get_fast_check(project),
+            schema.fast_check_project
+        )
+        self.assertIs(schema.get_fast_check(node), schema.fast_check_node)
+        for bad in (None, {}, {'type': 'novacut/node'}, []):
+            self.assertIs(schema.get_fast_check(bad),
+                schema.fast_check_novacut
+            )
+
+    def test_check_docs(self):
+        docs = self.get_docs() * 200
+        self.assertEqual(schema.check_docs(docs), [])
+        bad1 = deepcopy(docs[0])
+        bad1['node']['stop'] = 17
+        bad2 = deepcopy(docs[3])
+        bad2['title'] = None
+        docs[10] = bad1
+        docs[500] = bad2
+        docs.append('nope')
+        errors = schema.check_docs(docs)
+        self.assertEqual([(e.index, e.id, e.error) for e in errors], [
+            (10, bad1['_id'], 'ValueError'),
+            (500, bad2['_id'], 'TypeError'),
+            (1000, None, 'TypeError'),
+        ])
+        with self.assertRaises(ValueError) as cm:
+            schema.check_video_slice(bad1)
+        self.assertEqual(errors[0].message, str(cm.exception))
+
+        # With an explicit check:
+        errors = schema.check_docs(docs[:5], schema.fast_check_video_slice)
+        self.assertEqual([e.index for e in errors], [1, 2, 3, 4])
@@ -23,10 +23,11 @@
 Unit tests for the `novacut.timefuncs` module.
 """
 
-from unittest import TestCase
+from unittest import TestCase, skipIf
 from fractions import Fraction
+from array import array
 
-from novacut.misc import random_start_stop
+from novacut.misc import random, random_start_stop
 from novacut import timefuncs
 
 
@@ -170,6 +171,94 @@ class TestFunctions(TestCase):
                 timefuncs.frame_to_nanosecond(frame + 1, framerate)
             )
 
+    def check_frame_edges(self, func):
+        for framerate in (Fraction(24, 1), Fraction(30000, 1001)):
+            edges = func(0, 0, framerate)
+            self.assertEqual(edges.tolist(), [0])
+            edges = func(0, 1000, framerate)
+            self.assertEqual(len(edges), 1001)
+            self.assertEqual(edges.tolist(),
+                [timefuncs.frame_to_nanosecond(f, framerate)
+                for f in range(1001)]
+            )
+        for i in range(100):
+            framerate = Fraction(
+                random.randrange(1, 123456), random.randrange(1, 54321)
+            )
+            (start, stop) = random_start_stop(2 * 60 * 60 * 60)
+            edges = func(start, stop, framerate)
+            self.assertEqual(len(edges), stop - start + 1)
+            for f in (start, start + (stop - start) // 2, stop):
+                self.assertEqual(edges[f - start],
+                    timefuncs.frame_to_nanosecond(f, framerate)
+                )
+
+    def test_get_numpy(self):
+        np = timefuncs.get_numpy()
+        self.assertIs(timefuncs.get_numpy(), np)
+        self.assertIs(timefuncs.numpy, np)
+        self.assertIs(timefuncs._numpy_checked, True)
+
+    def test_frame_edges_array(self):
+        func = timefuncs._frame_edges_array
+        self.check_frame_edges(func)
+        edges = func(3, 7, Fraction(24, 1))
+        self.assertIsInstance(edges, array)
+        self.assertEqual(edges.typecode, 'q')
+        with self.assertRaises(OverflowError):
+            func(10**12, 10**12, Fraction(1, 10**5))
+
+    @skipIf(timefuncs.get_numpy() is None, 'numpy not available')
+    def test_frame_edges_numpy(self):
+        func = timefuncs._frame_edges_numpy
+        self.check_frame_edges(func)
+        edges = func(3, 7, Fraction(24, 1))
+        self.assertIsInstance(edges, timefuncs.numpy.ndarray)
+        self.assertEqual(edges.dtype, timefuncs.numpy.int64)
+        with self.assertRaises(OverflowError) as cm:
+            func(10**12, 10**12, Fraction(1, 10**5))
+        self.assertEqual(str(cm.exception),
+            'frame 1000000000000 at Fraction(1, 100000) overflows int64'
+        )
+
+    def test_video_pts_table(self):
+        framerate = Fraction(30000, 1001)
+        edges = timefuncs.video_pts_table(17, 69, framerate)
+        self.assertEqual(len(edges), 53)
+        self.assertEqual(edges.tolist(),
+            [timefuncs.frame_to_nanosecond(f, framerate)
+            for f in range(17, 70)]
+        )
+        with self.assertRaises(AssertionError):
+            timefuncs.video_pts_table(-1, 5, framerate)
+        with self.assertRaises(AssertionError):
+            timefuncs.video_pts_table(6, 5, framerate)
+
+    def test_video_pts_and_duration_table(self):
+        for framerate in (Fraction(24, 1), Fraction(60000, 1001)):
+            ts = timefuncs.video_pts_and_duration_table(0, 0, framerate)
+            self.assertIsInstance(ts, timefuncs.Timestamp)
+            self.assertEqual(ts.pts.tolist(), [])
+            self.assertEqual(ts.duration.tolist(), [])
+            (start, stop) = random_start_stop(60 * 60 * 60)
+            ts = timefuncs.video_pts_and_duration_table(start, stop, framerate)
+            self.assertIsInstance(ts, timefuncs.Timestamp)
+            self.assertEqual(len(ts.pts), stop - start)
+            self.assertEqual(len(ts.duration), stop - start)
+            for f in (start, stop - 1):
+                self.assertEqual(
+                    (ts.pts[f - start], ts.duration[f - start]),
+                    timefuncs.video_pts_and_duration(f, framerate)
+                )
+            expected = [
+                tuple(timefuncs.video_pts_and_duration(f, framerate))
+                for f in range(1000)
+            ]
+            ts = timefuncs.video_pts_and_duration_table(0, 1000, framerate)
+            self.assertEqual(
+                list(zip(ts.pts.tolist(), ts.duration.tolist())), expected
+            )
+
     def test_audio_pts_and_duration(self):
         samplerate = 48000
 
@@ -234,3 +323,72 @@ class TestFunctions(TestCase):
             accum += g_dur
             offset += samples
 
+
+
+class TestFrameClock(TestCase):
+    def test_init(self):
+        framerate = Fraction(30000, 1001)
+        clock = timefuncs.FrameClock(framerate)
+        self.assertIs(clock.framerate, framerate)
+        self.assertEqual(clock.num, 30000)
+        self.assertEqual(clock.denom, 1001)
+        self.assertEqual(clock._durations, (33366666, 33366667, 33366667))
+        self.assertEqual(repr(clock), 'FrameClock(Fraction(30000, 1001))')
+
+        clock = timefuncs.FrameClock(Fraction(25, 1))
+        self.assertEqual(clock._durations, (40000000,))
+
+        clock = timefuncs.FrameClock(Fraction(7919, 1))
+        self.assertIsNone(clock._durations)
+
+        with self.assertRaises(TypeError) as cm:
+            timefuncs.FrameClock(30)
+        self.assertEqual(str(cm.exception),
+            "framerate: need a <class 'fractions.Fraction'>; got a <class 'int'>: 30"
+        )
+
+    def test_common_framerates(self):
+        framerates = (
+            Fraction(24000, 1001),
+            Fraction(30000, 1001),
+            Fraction(60000, 1001),
+            Fraction(24, 1),
+            Fraction(25, 1),
+            Fraction(30, 1),
+            Fraction(50, 1),
+            Fraction(60, 1),
+        )
+        for framerate in framerates:
+            clock = timefuncs.FrameClock(framerate)
+            self.assertIsNotNone(clock._durations)
+            for frame in range(10000):
+                ns = timefuncs.frame_to_nanosecond(frame, framerate)
+                self.assertEqual(clock.frame_to_nanosecond(frame), ns)
+                self.assertEqual(clock.nanosecond_to_frame(ns), frame)
+                self.assertEqual(
+                    clock.video_pts_and_duration(frame),
+                    timefuncs.video_pts_and_duration(frame, framerate)
+                )
+
+    def test_random_framerates(self):
+        for i in range(500):
+            framerate = Fraction(
+                random.randrange(1, 123456), random.randrange(1, 54321)
+            )
+            clock = timefuncs.FrameClock(framerate)
+            for j in range(20):
+                frame = random.randrange(0, 2 * 60 * 60 * 60)
+                ns = timefuncs.frame_to_nanosecond(frame, framerate)
+                self.assertEqual(clock.frame_to_nanosecond(frame), ns)
+                self.assertEqual(clock.nanosecond_to_frame(ns),
+                    timefuncs.nanosecond_to_frame(ns, framerate)
+                )
+                ns = random.randrange(0, 2 * 60 * 60 * timefuncs.SECOND)
+                self.assertEqual(clock.nanosecond_to_frame(ns),
+                    timefuncs.nanosecond_to_frame(ns, framerate)
+                )
+                ts = clock.video_pts_and_duration(frame)
+                self.assertIsInstance(ts, timefuncs.Timestamp)
+                self.assertEqual(ts,
+                    timefuncs.video_pts_and_duration(frame, framerate)
+                )
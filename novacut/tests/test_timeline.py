@@ -0,0 +1,191 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Unit tests for the `novacut.timeline` module.
+"""
+
+from unittest import TestCase
+import random
+
+from dbase32 import random_id
+
+from ..misc import StartStop, random_start_stop
+from .. import timeline
+
+
+def random_raw_slices(count, files=5):
+    srcs = tuple(random_id(30) for i in range(files))
+    raw_slices = []
+    for i in range(count):
+        (start, stop) = random_start_stop(500)
+        raw_slices.append((random_id(), random.choice(srcs), start, stop))
+    return raw_slices
+
+
+class TestTimeline(TestCase):
+    def test_init(self):
+        tl = timeline.Timeline([])
+        self.assertEqual(tl.slices, tuple())
+        self.assertEqual(tl.offsets, [0])
+        self.assertEqual(tl.files, frozenset())
+        self.assertEqual(tl.frames, 0)
+        self.assertEqual(len(tl), 0)
+
+        raw_slices = random_raw_slices(50)
+        tl = timeline.Timeline(raw_slices)
+        self.assertEqual(tl.slices, tuple(raw_slices))
+        self.assertEqual(len(tl), 50)
+        self.assertEqual(len(tl.offsets), 51)
+        self.assertEqual(tl.files, frozenset(r[1] for r in raw_slices))
+        self.assertEqual(tl.frames, sum(r[3] - r[2] for r in raw_slices))
+
+        with self.assertRaises(ValueError) as cm:
+            timeline.Timeline([('A', 'foo', 11, 10)])
+        self.assertEqual(str(cm.exception), 'need start <= stop; got 11 > 10')
+
+    def test_find(self):
+        tl = timeline.Timeline([])
+        with self.assertRaises(IndexError) as cm:
+            tl.find(0)
+        self.assertEqual(str(cm.exception), 'need 0 <= frame < 0; got 0')
+
+        # Empty slices are never found:
+        tl = timeline.Timeline([
+            ('A', 'foo', 0, 0),
+            ('B', 'foo', 5, 7),
+            ('C', 'bar', 3, 3),
+            ('D', 'bar', 3, 4),
+        ])
+        self.assertEqual([tl.find(f) for f in range(3)], [1, 1, 3])
+        for frame in (-1, 3):
+            with self.assertRaises(IndexError) as cm:
+                tl.find(frame)
+            self.assertEqual(str(cm.exception),
+                'need 0 <= frame < 3; got {}'.format(frame)
+            )
+
+    def test_locate(self):
+        raw_slices = random_raw_slices(100)
+        tl = timeline.Timeline(raw_slices)
+        expected = []
+        for (i, (_id, src, start, stop)) in enumerate(raw_slices):
+            expected.extend((i, src, f) for f in range(start, stop))
+        self.assertEqual(len(expected), tl.frames)
+        for frame in range(tl.frames):
+            self.assertEqual(tl.locate(frame), expected[frame])
+
+
+class TestSliceIndex(TestCase):
+    def check(self, index, slices):
+        self.assertEqual(index.slices, slices)
+        expected = []
+        for (i, s) in enumerate(slices):
+            self.assertEqual(index.offset(i), len(expected))
+            expected.extend((i, f) for f in range(s.start, s.stop))
+        self.assertEqual(index.offset(len(slices)), len(expected))
+        self.assertEqual(index.frames, len(expected))
+        for frame in range(index.frames):
+            self.assertEqual(index.locate(frame), expected[frame])
+            self.assertEqual(index.find(frame), expected[frame][0])
+
+    def test_init(self):
+        index = timeline.SliceIndex([])
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.frames, 0)
+        self.assertEqual(index.offset(0), 0)
+        with self.assertRaises(IndexError) as cm:
+            index.locate(0)
+        self.assertEqual(str(cm.exception), 'need 0 <= frame < 0; got 0')
+        self.assertEqual(index.overlapping(0, 10), [])
+
+        with self.assertRaises(ValueError) as cm:
+            timeline.SliceIndex([StartStop(0, 5), StartStop(6, 5)])
+        self.assertEqual(str(cm.exception),
+            'need 0 <= start <= stop; got StartStop(start=6, stop=5)'
+        )
+
+        for count in (1, 2, 3, 7, 8, 9, 64, 100):
+            slices = [StartStop(*random_start_stop(50)) for i in range(count)]
+            index = timeline.SliceIndex(slices)
+            self.assertEqual(len(index), count)
+            self.check(index, slices)
+
+    def test_locate(self):
+        # Empty slices are never located:
+        index = timeline.SliceIndex([
+            StartStop(0, 0),
+            StartStop(5, 7),
+            StartStop(3, 3),
+            StartStop(3, 3),
+            StartStop(3, 4),
+            StartStop(9, 9),
+        ])
+        self.assertEqual([index.locate(f) for f in range(3)],
+            [(1, 5), (1, 6), (4, 3)]
+        )
+        for frame in (-1, 3):
+            with self.assertRaises(IndexError) as cm:
+                index.locate(frame)
+            self.assertEqual(str(cm.exception),
+                'need 0 <= frame < 3; got {}'.format(frame)
+            )
+        with self.assertRaises(IndexError) as cm:
+            index.offset(7)
+        self.assertEqual(str(cm.exception), 'need 0 <= index <= 6; got 7')
+
+    def test_overlapping(self):
+        slices = [StartStop(*random_start_stop(30)) for i in range(40)]
+        slices[5] = StartStop(8, 8)
+        index = timeline.SliceIndex(slices)
+        frames = []
+        for (i, s) in enumerate(slices):
+            frames.extend((i, f) for f in range(s.start, s.stop))
+        for i in range(200):
+            (start, stop) = random_start_stop(index.frames + 10)
+            start -= 5
+            got = []
+            for (i, s) in index.overlapping(start, stop):
+                self.assertLess(s.start, s.stop)
+                got.extend((i, f) for f in range(s.start, s.stop))
+            self.assertEqual(got, frames[max(0, start):stop])
+        self.assertEqual(index.overlapping(10, 10), [])
+        self.assertEqual(index.overlapping(index.frames, index.frames + 5),
+            []
+        )
+
+    def test_trim(self):
+        slices = [StartStop(*random_start_stop(30)) for i in range(37)]
+        index = timeline.SliceIndex(slices)
+        for i in range(100):
+            j = random.randrange(len(slices))
+            (start, stop) = random_start_stop(30)
+            if i % 10 == 0:
+                stop = start  # Sometimes trim to nothing
+            slices[j] = StartStop(start, stop)
+            self.assertIsNone(index.trim(j, start, stop))
+            self.check(index, slices)
+        with self.assertRaises(ValueError) as cm:
+            index.trim(0, 5, 4)
+        self.assertEqual(str(cm.exception),
+            'need 0 <= start <= stop; got start=5, stop=4'
+        )
+        self.assertEqual(index.slices, slices)
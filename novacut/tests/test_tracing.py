@@ -0,0 +1,166 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Unit tests for the `novacut.tracing` module.
+"""
+
+from unittest import TestCase
+import os
+from os import path
+import json
+import time
+import tempfile
+import shutil
+import threading
+
+from .. import tracing
+
+
+class TestTracer(TestCase):
+    def test_init(self):
+        inst = tracing.Tracer('/tmp/foo.json')
+        self.assertEqual(inst.filename, '/tmp/foo.json')
+        self.assertEqual(inst.pid, os.getpid())
+        self.assertIsInstance(inst.start, float)
+        self.assertEqual(inst.events, [])
+
+    def test_events(self):
+        inst = tracing.Tracer('/tmp/foo.json')
+        start = time.perf_counter()
+        inst.instant('Input#1', 'seek', {'start': 17})
+        inst.complete('Input#1', 'pause', start)
+        inst.counter('Input#1 queue0', {'buffers': 2})
+        (e1, e2, e3) = inst.events
+        for e in inst.events:
+            self.assertEqual(e['pid'], os.getpid())
+            self.assertEqual(e['tid'], threading.get_ident())
+            self.assertGreaterEqual(e['ts'], 0)
+        self.assertEqual(e1['name'], 'seek')
+        self.assertEqual(e1['cat'], 'Input#1')
+        self.assertEqual(e1['ph'], 'i')
+        self.assertEqual(e1['args'], {'start': 17})
+        self.assertEqual(e2['name'], 'pause')
+        self.assertEqual(e2['ph'], 'X')
+        self.assertGreaterEqual(e2['dur'], 0)
+        self.assertEqual(e2['args'], {})
+        self.assertEqual(e3['name'], 'Input#1 queue0')
+        self.assertEqual(e3['ph'], 'C')
+        self.assertEqual(e3['args'], {'buffers': 2})
+
+    def test_save(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = path.join(tmpdir, 'trace-{pid}.json')
+            inst = tracing.Tracer(filename)
+            inst.instant('Output#2', 'eos')
+            self.assertIsNone(inst.save())
+            saved = path.join(tmpdir, 'trace-{}.json'.format(os.getpid()))
+            with open(saved, 'r') as fp:
+                obj = json.load(fp)
+            self.assertEqual(obj, inst.to_dict())
+            self.assertEqual(obj['displayTimeUnit'], 'ms')
+            self.assertEqual(len(obj['traceEvents']), 1)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class TestFunctions(TestCase):
+    def test_enable_disable(self):
+        self.assertIsNone(tracing.get_tracer())
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = path.join(tmpdir, 'trace.json')
+            tracer = tracing.enable(filename)
+            self.assertIsInstance(tracer, tracing.Tracer)
+            self.assertIs(tracing.get_tracer(), tracer)
+            self.assertIs(tracing.enable('/tmp/other.json'), tracer)
+            self.assertIsNone(tracing.disable())
+            self.assertIsNone(tracing.get_tracer())
+            self.assertTrue(path.isfile(filename))
+            self.assertIsNone(tracing.disable())
+        finally:
+            tracing.disable()
+            shutil.rmtree(tmpdir)
+
+    def test_configure_gst_tracers(self):
+        keys = (tracing.TRACE_ENV, 'GST_TRACERS', 'GST_DEBUG')
+        saved = dict((key, os.environ.get(key)) for key in keys)
+        try:
+            for key in keys:
+                os.environ.pop(key, None)
+            self.assertIs(tracing.configure_gst_tracers(), False)
+            self.assertNotIn('GST_TRACERS', os.environ)
+
+            os.environ[tracing.TRACE_ENV] = '/tmp/trace.json'
+            self.assertIs(tracing.configure_gst_tracers(), True)
+            self.assertEqual(os.environ['GST_TRACERS'], 'latency;rusage')
+            self.assertEqual(os.environ['GST_DEBUG'], 'GST_TRACER:7')
+
+            os.environ['GST_TRACERS'] = 'stats'
+            os.environ['GST_DEBUG'] = 'queue:5'
+            self.assertIs(tracing.configure_gst_tracers(), True)
+            self.assertEqual(os.environ['GST_TRACERS'], 'stats')
+            self.assertEqual(os.environ['GST_DEBUG'], 'queue:5,GST_TRACER:7')
+        finally:
+            for (key, value) in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+    def test_on_gst_log(self):
+        class DummyCategory:
+            def __init__(self, name):
+                self._name = name
+
+            def get_name(self):
+                return self._name
+
+        class DummyMessage:
+            def __init__(self, text):
+                self._text = text
+
+            def get(self):
+                return self._text
+
+        text = 'latency, src=(string)queue0_src, time=(guint64)1234;'
+        msg = DummyMessage(text)
+        args = (None, None, None, 0, None, msg, None)
+
+        # Nothing happens when tracing isn't enabled:
+        self.assertIsNone(tracing.get_tracer())
+        self.assertIsNone(
+            tracing.on_gst_log(DummyCategory('GST_TRACER'), *args)
+        )
+
+        tracer = tracing.enable('/tmp/unused.json')
+        try:
+            tracing.on_gst_log(DummyCategory('GST_PADS'), *args)
+            self.assertEqual(tracer.events, [])
+            tracing.on_gst_log(DummyCategory('GST_TRACER'), *args)
+            self.assertEqual(len(tracer.events), 1)
+            event = tracer.events[0]
+            self.assertEqual(event['cat'], 'gst-tracer')
+            self.assertEqual(event['name'], 'latency')
+            self.assertEqual(event['args'], {'record': text})
+        finally:
+            tracing._tracer = None
@@ -33,9 +33,14 @@ from hashlib import sha1
 from gi.repository import Gst
 from dbase32 import random_id
 
-from .helpers import random_filename
+from .helpers import random_filename, get_test_clip, CLIP_FRAMERATES
 from .. import gsthelpers
-from ..timefuncs import Timestamp, frame_to_nanosecond, video_pts_and_duration
+from ..timefuncs import (
+    Timestamp,
+    FrameClock,
+    frame_to_nanosecond,
+    video_pts_and_duration,
+)
 from .. import validate
 
 
@@ -87,6 +92,69 @@ class TestFunctions(TestCase):
             ('extract_dup', 0, size),
         ])
 
+    def test_check_duration(self):
+        framerate = Fraction(30000, 1001)
+        clock = FrameClock(framerate)
+        frames = random.randrange(1, 123456)
+        duration = frame_to_nanosecond(frames, framerate)
+        for strict in (True, False):
+            info = {'frames': frames, 'duration': duration}
+            self.assertIsNone(validate.check_duration(info, clock, strict))
+            self.assertEqual(info, {'frames': frames, 'duration': duration})
+
+        info = {'frames': frames, 'duration': duration + 1}
+        self.assertIsNone(validate.check_duration(info, clock, False))
+        self.assertEqual(info, {'frames': frames, 'duration': duration + 1})
+        self.assertIsNone(validate.check_duration(info, clock, True))
+        self.assertEqual(info,
+            {'frames': frames, 'duration': duration + 1, 'valid': False}
+        )
+
+        info = {'frames': frames + 1, 'duration': duration}
+        self.assertIsNone(validate.check_duration(info, clock, False))
+        self.assertEqual(info,
+            {'frames': frames + 1, 'duration': duration, 'valid': False}
+        )
+
+    def test_plan_chunks(self):
+        MIN = validate.MIN_CHUNK_FRAMES
+        self.assertEqual(validate.plan_chunks(1, 8), [(0, 1)])
+        self.assertEqual(validate.plan_chunks(MIN * 2 - 1, 8), [(0, MIN * 2 - 1)])
+        self.assertEqual(validate.plan_chunks(MIN * 2, 8),
+            [(0, MIN), (MIN, MIN * 2)]
+        )
+        for i in range(100):
+            frames = random.randrange(1, 1234567)
+            count = random.randrange(1, 33)
+            chunks = validate.plan_chunks(frames, count)
+            self.assertLessEqual(len(chunks), count)
+            self.assertEqual(chunks[0].start, 0)
+            self.assertEqual(chunks[-1].stop, frames)
+            for (a, b) in zip(chunks, chunks[1:]):
+                self.assertEqual(a.stop, b.start)
+            for s in chunks:
+                self.assertIsInstance(s, validate.StartStop)
+                if len(chunks) > 1:
+                    self.assertGreaterEqual(s.stop - s.start, MIN)
+
+    def test_merge_chunk_info(self):
+        info = {'valid': True, 'duration': 17}
+        results = [
+            {'valid': True, 'frames': 300},
+            {'valid': True, 'frames': 301},
+        ]
+        self.assertIs(validate.merge_chunk_info(info, results), info)
+        self.assertEqual(info, {'valid': True, 'duration': 17, 'frames': 601})
+
+        info = {'valid': True, 'duration': 17}
+        results = [
+            {'valid': True, 'frames': 300},
+            {'valid': False},
+            {'valid': False, 'frames': 12},
+        ]
+        self.assertIs(validate.merge_chunk_info(info, results), info)
+        self.assertEqual(info, {'valid': False, 'duration': 17, 'frames': 312})
+
     def test_shuffle_indexes(self):
         for count in (75, 3469):
             indexes = validate.shuffle_indexes(count)
@@ -296,6 +364,144 @@ class TestValidator(TestCase):
                 )
 
 
+class TestChunkValidator(TestCase):
+    def test_init(self):
+        def callback(inst, success):
+            pass
+
+        filename = random_filename()
+        inst = validate.ChunkValidator(callback, filename, False, True, 17, 69)
+        self.assertIsInstance(inst, validate.Validator)
+        self.assertIs(inst.full, False)
+        self.assertIs(inst.strict, True)
+        self.assertEqual(inst.start, 17)
+        self.assertEqual(inst.stop, 69)
+        self.assertEqual(inst.frame, 17)
+        self.assertEqual(inst.info, {'valid': True})
+        self.assertIsNone(inst.destroy())
+
+        inst = validate.ChunkValidator(callback, filename, False, True, 17,
+            None
+        )
+        self.assertIsNone(inst.stop)
+        self.assertEqual(inst.frame, 17)
+        self.assertIsNone(inst.destroy())
+
+    def test_on_eos(self):
+        class Subclass(validate.ChunkValidator):
+            def __init__(self, start, stop, frame):
+                self.start = start
+                self.stop = stop
+                self.frame = frame
+                self.info = {'valid': True}
+                self._calls = []
+
+            def complete(self, success):
+                self._calls.append(success)
+
+        inst = Subclass(17, 69, 69)
+        self.assertIsNone(inst.on_eos(None, None))
+        self.assertEqual(inst.info, {'valid': True, 'frames': 52})
+        self.assertEqual(inst._calls, [True])
+
+        inst = Subclass(17, 69, 68)
+        self.assertIsNone(inst.on_eos(None, None))
+        self.assertEqual(inst.info, {'valid': False, 'frames': 51})
+        self.assertEqual(inst._calls, [False])
+
+        # With no stop, whatever was decoded until EOS is counted:
+        inst = Subclass(17, None, 73)
+        self.assertIsNone(inst.on_eos(None, None))
+        self.assertEqual(inst.info, {'valid': True, 'frames': 56})
+        self.assertEqual(inst._calls, [True])
+
+
+class TestDemuxValidator(TestCase):
+    def test_init(self):
+        def callback(inst, success):
+            pass
+
+        filename = random_filename()
+        inst = validate.DemuxValidator(callback, filename, True, False)
+        self.assertIsInstance(inst, validate.Validator)
+        self.assertEqual(inst.timestamps, [])
+        self.assertEqual(inst.info, {'valid': True})
+        self.assertEqual(len(inst.handlers), 5)
+        self.assertIs(inst.handlers[4][0], inst.dec)
+        self.assertIsNone(inst.destroy())
+        self.assertEqual(inst.handlers, [])
+        self.assertEqual(sys.getrefcount(inst), 2)
+
+    def test_on_autoplug_select(self):
+        class MockFactory:
+            def __init__(self, isdecoder):
+                self._isdecoder = isdecoder
+                self._calls = []
+
+            def list_is_type(self, t):
+                self._calls.append(t)
+                return self._isdecoder
+
+        class Subclass(validate.DemuxValidator):
+            def __init__(self):
+                pass
+
+        inst = Subclass()
+        factory = MockFactory(True)
+        self.assertEqual(inst.on_autoplug_select(None, None, None, factory),
+            validate.AUTOPLUG_SELECT_EXPOSE
+        )
+        self.assertEqual(factory._calls,
+            [Gst.ELEMENT_FACTORY_TYPE_DECODER]
+        )
+        factory = MockFactory(False)
+        self.assertEqual(inst.on_autoplug_select(None, None, None, factory),
+            validate.AUTOPLUG_SELECT_TRY
+        )
+
+    def test_check_timestamps(self):
+        class Subclass(validate.DemuxValidator):
+            def __init__(self, framerate, full, timestamps):
+                self.framerate = framerate
+                self.full = full
+                self.strict = True
+                self.frame = 0
+                self.info = {'valid': True}
+                self.timestamps = timestamps
+                self._calls = []
+
+            def complete(self, success):
+                self._calls.append(success)
+
+        framerate = Fraction(24, 1)
+        good = [video_pts_and_duration(i, framerate) for i in range(100)]
+
+        # Decode order shouldn't matter:
+        timestamps = list(good)
+        random.shuffle(timestamps)
+        inst = Subclass(framerate, False, timestamps)
+        self.assertIs(inst.check_timestamps(), True)
+        self.assertEqual(inst.timestamps, good)
+        self.assertEqual(inst.frame, 100)
+        self.assertEqual(inst.info, {'valid': True})
+        self.assertEqual(inst._calls, [])
+
+        # Missing frame, full=False:
+        timestamps = good[:50] + good[51:]
+        inst = Subclass(framerate, False, timestamps)
+        self.assertIs(inst.check_timestamps(), False)
+        self.assertEqual(inst.frame, 51)
+        self.assertEqual(inst.info, {'valid': False})
+        self.assertEqual(inst._calls, [False])
+
+        # Missing frame, full=True:
+        inst = Subclass(framerate, True, timestamps)
+        self.assertIs(inst.check_timestamps(), True)
+        self.assertEqual(inst.frame, 99)
+        self.assertEqual(inst.info, {'valid': False})
+        self.assertEqual(inst._calls, [])
+
+
 class TestPlayThrough(TestCase):
     def test_init(self):
         def callback(inst, success):
@@ -306,6 +512,10 @@ class TestPlayThrough(TestCase):
         self.assertIsInstance(inst, gsthelpers.Decoder)
         self.assertIsNone(inst.duration)
         self.assertEqual(inst.video, [])
+        self.assertIsNone(inst.codec)
+        self.assertIsNone(inst.decoder)
+        self.assertIsNone(inst.preroll_time)
+        self.assertIsNone(inst.decode_time)
 
         # src (filesrc):
         self.assertIsInstance(inst.src, Gst.Element)
@@ -336,23 +546,100 @@ class TestPlayThrough(TestCase):
             self.assertIs(child.get_parent(), inst.pipeline)
 
         # Check that Pipeline.connect() was used:
-        self.assertEqual(len(inst.handlers), 4)
+        self.assertEqual(len(inst.handlers), 5)
         self.assertIs(inst.handlers[0][0], inst.bus)
         self.assertIs(inst.handlers[1][0], inst.bus)
         self.assertIs(inst.handlers[2][0], inst.dec)
         self.assertIs(inst.handlers[3][0], inst.sink)
+        self.assertIs(inst.handlers[4][0], inst.dec)
 
         # Make sure gsthelpers.Pipeline.__init__() was called:
         self.assertIs(inst.callback, callback)
         self.assertIsInstance(inst.pipeline, Gst.Pipeline)
         self.assertIsInstance(inst.bus, Gst.Bus)
-        self.assertEqual(sys.getrefcount(inst), 6)
+        self.assertEqual(sys.getrefcount(inst), 7)
         self.assertIsNone(inst.destroy())
         self.assertFalse(hasattr(inst, 'pipeline'))
         self.assertFalse(hasattr(inst, 'bus'))
         self.assertEqual(inst.handlers, [])
         self.assertEqual(sys.getrefcount(inst), 2)
 
+    def test_on_autoplug_select(self):
+        class MockStructure:
+            def __init__(self, name):
+                self._name = name
+
+            def get_name(self):
+                return self._name
+
+        class MockCaps:
+            def __init__(self, name):
+                self._structure = MockStructure(name)
+
+            def get_structure(self, index):
+                assert index == 0
+                return self._structure
+
+        class MockFactory:
+            def __init__(self, name, isdecoder):
+                self._name = name
+                self._isdecoder = isdecoder
+
+            def get_name(self):
+                return self._name
+
+            def list_is_type(self, t):
+                assert t == Gst.ELEMENT_FACTORY_TYPE_DECODER
+                return self._isdecoder
+
+        class Subclass(validate.PlayThrough):
+            def __init__(self):
+                self.codec = None
+                self.decoder = None
+
+        inst = Subclass()
+        TRY = validate.AUTOPLUG_SELECT_TRY
+        select = inst.on_autoplug_select
+        self.assertEqual(
+            select(None, None, MockCaps('video/x-h264'),
+                MockFactory('h264parse', False)
+            ),
+            TRY
+        )
+        self.assertEqual(
+            select(None, None, MockCaps('audio/mpeg'),
+                MockFactory('avdec_mp3', True)
+            ),
+            TRY
+        )
+        self.assertIsNone(inst.codec)
+        self.assertIsNone(inst.decoder)
+        self.assertEqual(
+            select(None, None, MockCaps('video/x-h264'),
+                MockFactory('avdec_h264', True)
+            ),
+            TRY
+        )
+        self.assertEqual(inst.codec, 'video/x-h264')
+        self.assertEqual(inst.decoder, 'avdec_h264')
+        select(None, None, MockCaps('video/x-vp8'),
+            MockFactory('vp8dec', True)
+        )
+        self.assertEqual(inst.codec, 'video/x-h264')
+        self.assertEqual(inst.decoder, 'avdec_h264')
+
+    def test_live(self):
+        for framerate in CLIP_FRAMERATES:
+            filename = get_test_clip('theora', framerate, frames=30)
+            inst = validate.run_pipeline(validate.PlayThrough, filename)
+            self.assertIs(inst.success, True)
+            self.assertEqual(inst.codec, 'video/x-theora')
+            self.assertEqual(len(inst.video), 30)
+            for (i, info) in enumerate(inst.video):
+                ts = video_pts_and_duration(i, framerate)
+                self.assertEqual(info.pts, ts.pts)
+                self.assertEqual(info.duration, ts.duration)
+
 
 class TestPrerollTester(TestCase):
     def test_init(self):
@@ -366,7 +653,10 @@ class TestPrerollTester(TestCase):
         self.assertIs(inst.filename, filename)
         self.assertIsInstance(inst.seek_times, list)
         self.assertEqual(inst.seek_times, list(seek_times))
+        self.assertIs(inst.key_unit, False)
         self.assertEqual(inst.video, [])
+        self.assertEqual(inst.latencies, [])
+        self.assertIsNone(inst.seek_start)
 
         # src (filesrc):
         self.assertIsInstance(inst.src, Gst.Element)
@@ -431,6 +721,8 @@ class TestSeekTester(TestCase):
         self.assertIsInstance(inst.slices, list)
         self.assertEqual(inst.slices, list(slices))
         self.assertEqual(inst.video, [])
+        self.assertEqual(inst.latencies, [])
+        self.assertIsNone(inst.seek_start)
 
         # src (filesrc):
         self.assertIsInstance(inst.src, Gst.Element)
@@ -121,3 +121,57 @@ class TestDesignsLive(CouchTestCase):
 
     def test_novacut_projects(self):
         self.check_designs(views.novacut_projects)
+
+    def test_graph_design(self):
+        db = Database('foo', self.env)
+        db.put(None)
+        util.init_views(db, [views.graph_design])
+        (A, B, C) = sorted(random_id() for i in range(3))
+        file_id = random_id(30)
+        docs = [
+            {
+                '_id': A,
+                'type': 'novacut/node',
+                'node': {'type': 'video/sequence', 'src': [B, C, B]},
+            },
+            {
+                '_id': B,
+                'type': 'novacut/node',
+                'node': {
+                    'type': 'video/slice',
+                    'src': file_id,
+                    'start': 10,
+                    'stop': 25,
+                },
+            },
+            {
+                '_id': C,
+                'type': 'novacut/inode',
+                'node': {
+                    'type': 'video/slice',
+                    'src': file_id,
+                    'start': 0,
+                    'stop': 5,
+                },
+            },
+        ]
+        db.save_many(docs)
+
+        rows = db.view('graph', 'parent', startkey=[B], endkey=[B, {}])['rows']
+        self.assertEqual([r['key'] for r in rows], [[B, A], [B, A]])
+        self.assertEqual(sorted(r['value'] for r in rows), [0, 2])
+        rows = db.view('graph', 'parent', key=[C, A])['rows']
+        self.assertEqual([r['value'] for r in rows], [1])
+
+        rows = db.view('graph', 'slice',
+            startkey=[file_id], endkey=[file_id, {}]
+        )['rows']
+        self.assertEqual([(r['id'], r['key'], r['value']) for r in rows], [
+            (C, [file_id, 0, 5], 'video/slice'),
+            (B, [file_id, 10, 25], 'video/slice'),
+        ])
+
+        rows = db.view('graph', 'length')['rows']
+        self.assertEqual([(r['key'], r['value']) for r in rows],
+            [(A, 3), (B, 15), (C, 5)]
+        )
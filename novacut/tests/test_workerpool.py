@@ -0,0 +1,161 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Unit tests for the `novacut.workerpool` module.
+"""
+
+from unittest import TestCase
+import io
+import os
+from os import path
+import sys
+import json
+import threading
+
+from .. import workerpool
+
+
+TREE = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+
+WORKER = """
+import os
+import sys
+sys.path.insert(0, {!r})
+from novacut.workerpool import serve
+
+def handler(request):
+    action = request['action']
+    if action == 'pid':
+        return os.getpid()
+    if action == 'fail':
+        raise ValueError('nope')
+    if action == 'exit':
+        raise SystemExit('fatal')
+    if action == 'crash':
+        os._exit(3)
+
+serve(handler, sys.stdin, sys.stdout)
+""".format(TREE)
+
+
+def worker_cmd():
+    return [sys.executable, '-c', WORKER]
+
+
+class TestFunctions(TestCase):
+    def test_serve(self):
+        def handler(request):
+            if request['n'] < 0:
+                raise ValueError('negative: {}'.format(request['n']))
+            return request['n'] * 2
+
+        rfile = io.StringIO('{"n": 3}\n{"n": -1}\n{"n": 5}\n')
+        wfile = io.StringIO()
+        self.assertIsNone(workerpool.serve(handler, rfile, wfile))
+        self.assertEqual(
+            [json.loads(line) for line in wfile.getvalue().splitlines()],
+            [{'result': 6}, {'error': 'negative: -1'}, {'result': 10}]
+        )
+
+        def handler(request):
+            raise SystemExit('fatal')
+
+        rfile = io.StringIO('{"n": 3}\n{"n": 4}\n')
+        wfile = io.StringIO()
+        with self.assertRaises(SystemExit):
+            workerpool.serve(handler, rfile, wfile)
+        self.assertEqual(wfile.getvalue(), '{"error": "fatal"}\n')
+
+
+class TestWorkerPool(TestCase):
+    def test_init(self):
+        with self.assertRaises(ValueError) as cm:
+            workerpool.WorkerPool(worker_cmd(), 0)
+        self.assertEqual(str(cm.exception), 'need size >= 1; got 0')
+        with self.assertRaises(ValueError) as cm:
+            workerpool.WorkerPool(worker_cmd(), 1, 0)
+        self.assertEqual(str(cm.exception), 'need max_jobs >= 1; got 0')
+        cmd = worker_cmd()
+        pool = workerpool.WorkerPool(cmd)
+        self.assertIs(pool.cmd, cmd)
+        self.assertEqual(pool.size, 1)
+        self.assertEqual(pool.max_jobs, 10)
+        self.assertEqual(pool.idle, [])
+        self.assertEqual(pool.count, 0)
+        self.assertIs(pool.closed, False)
+
+    def test_run(self):
+        pool = workerpool.WorkerPool(worker_cmd(), max_jobs=3)
+        try:
+            # Worker is reused, then recycled after max_jobs:
+            pids = [pool.run({'action': 'pid'}) for i in range(4)]
+            self.assertEqual(len(set(pids[:3])), 1)
+            self.assertNotEqual(pids[3], pids[0])
+            self.assertNotEqual(pids[0], os.getpid())
+            self.assertEqual(pool.count, 1)
+
+            # Handled error, worker is replaced:
+            with self.assertRaises(workerpool.WorkerError) as cm:
+                pool.run({'action': 'fail'})
+            self.assertEqual(str(cm.exception), 'nope')
+            self.assertEqual(pool.count, 0)
+            pid = pool.run({'action': 'pid'})
+            self.assertNotIn(pid, pids)
+
+            # SystemExit is reported as an error:
+            with self.assertRaises(workerpool.WorkerError) as cm:
+                pool.run({'action': 'exit'})
+            self.assertEqual(str(cm.exception), 'fatal')
+
+            # Worker crashes, but the next job gets a fresh worker:
+            with self.assertRaises(workerpool.WorkerDied) as cm:
+                pool.run({'action': 'crash'})
+            self.assertEqual(cm.exception.returncode, 3)
+            self.assertEqual(pool.count, 0)
+            self.assertIsInstance(pool.run({'action': 'pid'}), int)
+        finally:
+            pool.close()
+        self.assertEqual(pool.count, 0)
+        self.assertEqual(pool.idle, [])
+        with self.assertRaises(Exception) as cm:
+            pool.run({'action': 'pid'})
+        self.assertEqual(str(cm.exception), 'WorkerPool is closed')
+
+    def test_concurrent(self):
+        pool = workerpool.WorkerPool(worker_cmd(), size=2)
+        results = []
+
+        def target():
+            for i in range(5):
+                results.append(pool.run({'action': 'pid'}))
+
+        threads = [threading.Thread(target=target) for i in range(4)]
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(len(results), 20)
+            self.assertLessEqual(len(set(results)), 4)
+            self.assertLessEqual(pool.count, 2)
+        finally:
+            pool.close()
@@ -29,7 +29,6 @@ from collections import namedtuple
 
 from gi.repository import GLib
 
-from .timefuncs import nanosecond_to_frame
 from .gsthelpers import (
     VIDEOSCALE_METHOD,
     Decoder,
@@ -200,7 +199,7 @@ class Thumbnailer(Decoder):
         try:
             self.pause()
             ns = self.get_duration()
-            self.file_stop = nanosecond_to_frame(ns, self.framerate)
+            self.file_stop = self.nanosecond_to_frame(ns)
             log.info('duration: %d frames, %d nanoseconds', self.file_stop, ns)
             self.next()
             self.play()
@@ -236,7 +235,7 @@ class Thumbnailer(Decoder):
                 raise ValueError(
                     'handoff, but [{}:{}] is finished'.format(s.start, s.stop)
                 )
-            frame = nanosecond_to_frame(buf.pts, self.framerate)
+            frame = self.nanosecond_to_frame(buf.pts)
             if frame != self.frame:
                 raise ValueError(
                     'expected frame {!r}, got {!r}'.format(self.frame, frame)
@@ -83,12 +83,27 @@ nanoseconds.
 
 from fractions import Fraction
 from collections import namedtuple
+from array import array
+
+# NumPy is optional, and importing it is slow, so it's only imported the first
+# time a table is built (see `get_numpy()`):
+numpy = None
+_numpy_checked = False
 
 
 # In case we want to use these functions when GStreamer isn't available, we
 # define our own nanosecond constant:
 SECOND = 1000000000
 
+# Largest value that fits in a signed 64-bit integer (numpy.int64, array 'q'):
+INT64_MAX = 2**63 - 1
+
+# FrameClock memoizes per-frame durations when they repeat at least this often
+# (they repeat every 3 frames at 24/1, 24000/1001, 30000/1001, 60000/1001):
+MAX_CYCLE = 1024
+
+TYPE_ERROR = '{}: need a {!r}; got a {!r}: {!r}'
+
 # namedtuple with pts, duration
 Timestamp = namedtuple('Timestamp', 'pts duration')
 
@@ -191,6 +206,149 @@ def video_pts_and_duration(frame, framerate):
     return Timestamp(pts, duration)
 
 
+class FrameClock:
+    """
+    Frame to nanosecond conversion bound to a single framerate.
+
+    For example:
+
+    >>> clock = FrameClock(Fraction(30000, 1001))
+    >>> clock.frame_to_nanosecond(30)
+    1001000000
+    >>> clock.nanosecond_to_frame(1001000000)
+    30
+    >>> clock.video_pts_and_duration(1)
+    Timestamp(pts=33366666, duration=33366667)
+
+    The results are always identical to `frame_to_nanosecond()`,
+    `nanosecond_to_frame()`, and `video_pts_and_duration()`, but a
+    `FrameClock` does the `Fraction` work once up front so that each call is
+    just a few integer operations.  Use one in per-frame code paths.
+    """
+
+    __slots__ = ('framerate', 'num', 'denom', '_q', '_r', '_durations')
+
+    def __init__(self, framerate):
+        if not isinstance(framerate, Fraction):
+            raise TypeError(
+                TYPE_ERROR.format('framerate', Fraction, type(framerate),
+                    framerate
+                )
+            )
+        self.framerate = framerate
+        self.num = framerate.numerator
+        self.denom = framerate.denominator
+        # frame * SECOND * denom // num == frame * q + frame * r // num
+        (self._q, self._r) = divmod(SECOND * self.denom, self.num)
+        # Durations repeat with a period of num / gcd(r, num) frames:
+        period = Fraction(self._r, self.num).denominator
+        if period <= MAX_CYCLE:
+            self._durations = tuple(
+                self.frame_to_nanosecond(f + 1) - self.frame_to_nanosecond(f)
+                for f in range(period)
+            )
+        else:
+            self._durations = None
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.framerate)
+
+    def frame_to_nanosecond(self, frame):
+        return frame * self._q + frame * self._r // self.num
+
+    def nanosecond_to_frame(self, nanosecond):
+        return int(round(nanosecond * self.num / self.denom / SECOND))
+
+    def video_pts_and_duration(self, frame):
+        pts = frame * self._q + frame * self._r // self.num
+        durations = self._durations
+        if durations is not None:
+            return Timestamp(pts, durations[frame % len(durations)])
+        return Timestamp(pts, self.frame_to_nanosecond(frame + 1) - pts)
+
+
+def get_numpy():
+    """
+    Return the ``numpy`` module, or ``None`` if it isn't available.
+    """
+    global numpy, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy_checked = True
+    return numpy
+
+
+def _frame_edges_array(start, stop, framerate):
+    num = framerate.numerator
+    (q, r) = divmod(SECOND * framerate.denominator, num)
+    return array('q', (f * q + f * r // num for f in range(start, stop + 1)))
+
+
+def _frame_edges_numpy(start, stop, framerate):
+    # Splitting the nanoseconds-per-frame into quotient and remainder keeps the
+    # intermediate values small enough for int64 (``frame * SECOND * denom``
+    # would overflow after a few hours at 30000/1001):
+    num = framerate.numerator
+    (q, r) = divmod(SECOND * framerate.denominator, num)
+    if stop * (q + r) > INT64_MAX:
+        raise OverflowError(
+            'frame {} at {!r} overflows int64'.format(stop, framerate)
+        )
+    np = get_numpy()
+    frames = np.arange(start, stop + 1, dtype=np.int64)
+    return frames * q + frames * r // num
+
+
+def video_pts_table(start, stop, framerate):
+    """
+    Get the presentation timestamps for video frames *start* through *stop*.
+
+    The returned array has ``stop - start + 1`` items, the pts of each frame in
+    the ``[start:stop]`` slice followed by the pts of frame *stop* (which is
+    the end time of the slice).  For example:
+
+    >>> video_pts_table(0, 4, Fraction(24, 1)).tolist()
+    [0, 41666666, 83333333, 125000000, 166666666]
+
+    Each item is exactly ``frame_to_nanosecond(frame, framerate)``, but the
+    whole table is computed in one shot.  The result is a ``numpy.ndarray``
+    with dtype ``int64`` when NumPy is available, otherwise an ``array.array``
+    with typecode ``'q'``.
+    """
+    assert 0 <= start <= stop
+    if get_numpy() is None:
+        return _frame_edges_array(start, stop, framerate)
+    return _frame_edges_numpy(start, stop, framerate)
+
+
+def video_pts_and_duration_table(start, stop, framerate):
+    """
+    Get pts and duration tables for the video frames in ``[start:stop]``.
+
+    This is the bulk version of `video_pts_and_duration()`.  For example:
+
+    >>> ts = video_pts_and_duration_table(0, 4, Fraction(24, 1))
+    >>> ts.pts.tolist()
+    [0, 41666666, 83333333, 125000000]
+    >>> ts.duration.tolist()
+    [41666666, 41666667, 41666667, 41666666]
+
+    This function returns a `Timestamp` namedtuple whose *pts* and *duration*
+    attributes are each an array with ``stop - start`` items (see
+    `video_pts_table()` for the array types).
+    """
+    edges = video_pts_table(start, stop, framerate)
+    if get_numpy() is None:
+        duration = array('q',
+            (edges[i + 1] - edges[i] for i in range(len(edges) - 1))
+        )
+        return Timestamp(edges[:-1], duration)
+    return Timestamp(edges[:-1], numpy.diff(edges))
+
+
 def audio_pts_and_duration(start, stop, samplerate):
     """
     Get the presentation timestamp and duration for an audio slice.
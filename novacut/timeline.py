@@ -0,0 +1,245 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Flattened timeline of an edit, searchable by timeline frame.
+
+A `Timeline` is built from the ``(_id, src, start, stop)`` raw slices that
+`renderservice.get_raw_slices()` returns when it walks the nested sequences
+below a root node.
+
+A `SliceIndex` is built from resolved `render.Slice` tuples, as used by
+`play.Player` and `render.Renderer`.  It keeps the slice lengths in a Fenwick
+tree (binary indexed tree), so besides point and range lookups, a slice can be
+trimmed in place in O(log n) time.
+"""
+
+from bisect import bisect_right
+
+
+class Timeline:
+    """
+    The raw slices of an edit, with their cumulative frame offsets.
+
+    For example:
+
+    >>> tl = Timeline([('A', 'foo', 10, 20), ('B', 'bar', 0, 5)])
+    >>> tl.frames
+    15
+    >>> tl.offsets
+    [0, 10, 15]
+    >>> sorted(tl.files)
+    ['bar', 'foo']
+
+    """
+
+    __slots__ = ('slices', 'offsets', 'files')
+
+    def __init__(self, raw_slices):
+        self.slices = tuple(raw_slices)
+        offsets = [0]
+        for (_id, src, start, stop) in self.slices:
+            if start > stop:
+                raise ValueError(
+                    'need start <= stop; got {} > {}'.format(start, stop)
+                )
+            offsets.append(offsets[-1] + stop - start)
+        self.offsets = offsets
+        self.files = frozenset(r[1] for r in self.slices)
+
+    def __len__(self):
+        return len(self.slices)
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.slices)
+
+    @property
+    def frames(self):
+        return self.offsets[-1]
+
+    def find(self, frame):
+        """
+        Return the index of the slice containing timeline *frame*.
+
+        For example:
+
+        >>> tl = Timeline([('A', 'foo', 10, 20), ('B', 'bar', 0, 5)])
+        >>> tl.find(9)
+        0
+        >>> tl.find(10)
+        1
+
+        """
+        if not (0 <= frame < self.offsets[-1]):
+            raise IndexError(
+                'need 0 <= frame < {}; got {}'.format(self.offsets[-1], frame)
+            )
+        # Empty slices share an offset with their successor, so always take
+        # the rightmost match:
+        return bisect_right(self.offsets, frame) - 1
+
+    def locate(self, frame):
+        """
+        Return ``(index, src, source_frame)`` for timeline *frame*.
+
+        For example:
+
+        >>> tl = Timeline([('A', 'foo', 10, 20), ('B', 'bar', 0, 5)])
+        >>> tl.locate(3)
+        (0, 'foo', 13)
+        >>> tl.locate(12)
+        (1, 'bar', 2)
+
+        """
+        i = self.find(frame)
+        (_id, src, start, stop) = self.slices[i]
+        return (i, src, start + frame - self.offsets[i])
+
+
+class SliceIndex:
+    """
+    Interval index over a list of slices (anything with *start* and *stop*).
+
+    For example:
+
+    >>> from novacut.misc import StartStop
+    >>> index = SliceIndex([StartStop(10, 20), StartStop(0, 5)])
+    >>> index.frames
+    15
+    >>> index.locate(12)
+    (1, 2)
+    >>> index.overlapping(8, 12)
+    [(0, StartStop(start=18, stop=20)), (1, StartStop(start=0, stop=2))]
+    >>> index.trim(0, 15, 20)
+    >>> index.locate(7)
+    (1, 2)
+
+    """
+
+    def __init__(self, slices):
+        self.slices = list(slices)
+        count = len(self.slices)
+        tree = [0] * (count + 1)
+        for (i, s) in enumerate(self.slices, 1):
+            if not (0 <= s.start <= s.stop):
+                raise ValueError(
+                    'need 0 <= start <= stop; got {!r}'.format(s)
+                )
+            tree[i] += s.stop - s.start
+            parent = i + (i & -i)
+            if parent <= count:
+                tree[parent] += tree[i]
+        self.tree = tree
+        self.frames = sum(s.stop - s.start for s in self.slices)
+        self._top = (1 << count.bit_length() >> 1)
+
+    def __len__(self):
+        return len(self.slices)
+
+    def _add(self, index, delta):
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += (i & -i)
+
+    def offset(self, index):
+        """
+        Return the timeline frame at which slice *index* starts.
+        """
+        if not (0 <= index <= len(self.slices)):
+            raise IndexError(
+                'need 0 <= index <= {}; got {}'.format(len(self.slices), index)
+            )
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= (index & -index)
+        return total
+
+    def locate(self, frame):
+        """
+        Return ``(index, source_frame)`` for timeline *frame*.
+        """
+        if not (0 <= frame < self.frames):
+            raise IndexError(
+                'need 0 <= frame < {}; got {}'.format(self.frames, frame)
+            )
+        # Find the most slices whose total length is <= frame; empty slices
+        # are skipped because they don't add to the total:
+        index = 0
+        remaining = frame
+        step = self._top
+        while step > 0:
+            i = index + step
+            if i < len(self.tree) and self.tree[i] <= remaining:
+                index = i
+                remaining -= self.tree[i]
+            step >>= 1
+        return (index, self.slices[index].start + remaining)
+
+    def find(self, frame):
+        """
+        Return the index of the slice containing timeline *frame*.
+        """
+        return self.locate(frame)[0]
+
+    def overlapping(self, start, stop):
+        """
+        Return ``(index, slice)`` for each slice overlapping *start* to *stop*.
+
+        Each slice is clipped to just the part within the timeline range.
+        """
+        start = max(0, start)
+        stop = min(self.frames, stop)
+        if start >= stop:
+            return []
+        (index, src_start) = self.locate(start)
+        result = []
+        frame = start
+        while frame < stop:
+            s = self.slices[index]
+            if s.start < s.stop:
+                src_stop = min(s.stop, src_start + stop - frame)
+                result.append(
+                    (index, s._replace(start=src_start, stop=src_stop))
+                )
+                frame += src_stop - src_start
+            index += 1
+            if index < len(self.slices):
+                src_start = self.slices[index].start
+        return result
+
+    def trim(self, index, start, stop):
+        """
+        Change the *start* and *stop* of slice *index* in place.
+        """
+        if not (0 <= start <= stop):
+            raise ValueError(
+                'need 0 <= start <= stop; got start={}, stop={}'.format(
+                    start, stop
+                )
+            )
+        old = self.slices[index]
+        delta = (stop - start) - (old.stop - old.start)
+        self.slices[index] = old._replace(start=start, stop=stop)
+        if delta:
+            self._add(index, delta)
+            self.frames += delta
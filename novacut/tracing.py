@@ -0,0 +1,185 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Opt-in tracing of `novacut.gsthelpers.Pipeline` instances.
+
+When the ``NOVACUT_TRACE`` environment variable is set to a filename, every
+`Pipeline` records state changes, pause duration, seeks, the first buffer,
+queue levels, EOS, and completion.  On exit the trace is saved in the Chrome trace
+event format, which can be loaded in ``chrome://tracing`` or Perfetto.
+
+Any ``{pid}`` in the filename is replaced with the process ID, which is handy
+for jobs that use worker processes::
+
+    NOVACUT_TRACE=/tmp/render-{pid}.json ./render-benchmark.py
+
+The GStreamer "latency" and "rusage" tracers are enabled too (unless
+``GST_TRACERS`` is already set), and their records are included in the trace.
+While tracing, GStreamer's default stderr log handler is removed, so other
+``GST_DEBUG`` output isn't printed.
+
+For example:
+
+>>> tracer = Tracer('/tmp/trace.json')
+>>> tracer.instant('Decoder#1', 'seek', {'start': 0})
+>>> [e['ph'] for e in tracer.events]
+['i']
+
+"""
+
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+
+
+log = logging.getLogger(__name__)
+TRACE_ENV = 'NOVACUT_TRACE'
+GST_TRACERS = 'latency;rusage'
+
+_tracer = None
+
+
+class Tracer:
+    def __init__(self, filename):
+        self.filename = filename
+        self.pid = os.getpid()
+        self.start = time.perf_counter()
+        self.events = []
+        self.lock = threading.Lock()
+
+    def timestamp(self, when=None):
+        # Chrome trace timestamps are in microseconds:
+        if when is None:
+            when = time.perf_counter()
+        return (when - self.start) * 1000000
+
+    def add(self, event):
+        event['pid'] = self.pid
+        event['tid'] = threading.get_ident()
+        with self.lock:
+            self.events.append(event)
+
+    def instant(self, name, event, args=None):
+        self.add({
+            'name': event,
+            'cat': name,
+            'ph': 'i',
+            's': 't',
+            'ts': self.timestamp(),
+            'args': (args or {}),
+        })
+
+    def complete(self, name, event, start, args=None):
+        self.add({
+            'name': event,
+            'cat': name,
+            'ph': 'X',
+            'ts': self.timestamp(start),
+            'dur': self.timestamp() - self.timestamp(start),
+            'args': (args or {}),
+        })
+
+    def counter(self, name, values):
+        self.add({
+            'name': name,
+            'ph': 'C',
+            'ts': self.timestamp(),
+            'args': values,
+        })
+
+    def to_dict(self):
+        with self.lock:
+            events = list(self.events)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save(self):
+        filename = self.filename.replace('{pid}', str(self.pid))
+        log.info('Saving %d trace events to %r', len(self.events), filename)
+        with open(filename, 'w') as fp:
+            json.dump(self.to_dict(), fp)
+
+
+def get_tracer():
+    return _tracer
+
+
+def enable(filename):
+    """
+    Start tracing all pipelines, saving the trace to *filename* on exit.
+    """
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(filename)
+        atexit.register(disable)
+    return _tracer
+
+
+def disable():
+    """
+    Stop tracing and save the trace.
+    """
+    global _tracer
+    tracer = _tracer
+    _tracer = None
+    if tracer is not None:
+        tracer.save()
+
+
+def configure_gst_tracers():
+    """
+    Enable GStreamer tracers if ``NOVACUT_TRACE`` is set.
+
+    This must be called before ``Gst.init()``.  Records from these tracers
+    are passed to `on_gst_log()`, which should be added with
+    ``Gst.debug_add_log_function()``.
+    """
+    if not os.environ.get(TRACE_ENV):
+        return False
+    os.environ.setdefault('GST_TRACERS', GST_TRACERS)
+    debug = os.environ.get('GST_DEBUG')
+    os.environ['GST_DEBUG'] = (
+        'GST_TRACER:7' if not debug else debug + ',GST_TRACER:7'
+    )
+    return True
+
+
+def on_gst_log(category, level, filename, function, line, obj, msg, data):
+    # Called from GStreamer streaming threads, so keep this cheap:
+    tracer = _tracer
+    if tracer is None or category.get_name() != 'GST_TRACER':
+        return
+    text = msg.get()
+    name = text.split(',', 1)[0]
+    tracer.instant('gst-tracer', name, {'record': text})
+
+
+def enable_from_env():
+    """
+    Start tracing if ``NOVACUT_TRACE`` is set.
+    """
+    filename = os.environ.get(TRACE_ENV)
+    if not filename:
+        return None
+    return enable(filename)
@@ -23,24 +23,32 @@
 Check video for timestamp conformance.
 """
 
+import os
+import time
 import logging
+import multiprocessing
 from hashlib import sha1
 from collections import namedtuple
 from random import SystemRandom
 
-from gi.repository import GLib
+from gi.repository import GLib, Gst
 
-from .timefuncs import (
-    Timestamp,
-    video_pts_and_duration,
-)
+from .timefuncs import Timestamp
 from .gsthelpers import Decoder, make_element, get_int
 
 
 log = logging.getLogger(__name__)
 BufferInfo = namedtuple('BufferInfo', 'sha1 duration pts')
+StartStop = namedtuple('StartStop', 'start stop')
 random = SystemRandom()
 
+# Don't split a video into chunks shorter than this many frames:
+MIN_CHUNK_FRAMES = 300
+
+# GstAutoplugSelectResult values (the enum isn't exposed via introspection):
+AUTOPLUG_SELECT_TRY = 0
+AUTOPLUG_SELECT_EXPOSE = 1
+
 
 def _row(label, ts):
     return (label, str(ts.pts), str(ts.duration))
@@ -70,6 +78,25 @@ def _format_ts_mismatch(ts, expected_ts):
     return '\n'.join('  ' + l for l in lines)
 
 
+def check_duration(info, clock, strict):
+    frames = info['frames']
+    duration = info['duration']
+    expected_frames = clock.nanosecond_to_frame(duration)
+    expected_duration = clock.frame_to_nanosecond(frames)
+    if expected_frames != frames:
+        log.error('Expected %s total frames, got %s',
+            expected_frames, frames
+        )
+        info['valid'] = False
+    if strict is False:
+        return
+    if expected_duration != duration:
+        log.warning('Expected duration of %s nanoseconds, got %s',
+            expected_duration, duration
+        )
+        info['valid'] = False
+
+
 class Validator(Decoder):
     def __init__(self, callback, filename, full, strict):
         super().__init__(callback, filename, video=True)
@@ -107,7 +134,7 @@ class Validator(Decoder):
             self.mark_invalid()
         if self.strict is False:
             return
-        expected_ts = video_pts_and_duration(frame, self.framerate)
+        expected_ts = self.clock.video_pts_and_duration(frame)
         if ts != expected_ts:
             log.warning('Timestamp mismatch at frame %d:\n%s',
                 self.frame, _format_ts_mismatch(ts, expected_ts)
@@ -115,22 +142,7 @@ class Validator(Decoder):
             self.mark_invalid()
 
     def check_duration(self):
-        frames = self.info['frames']
-        duration = self.info['duration']
-        expected_frames = self.nanosecond_to_frame(duration)
-        expected_duration = self.frame_to_nanosecond(frames)
-        if expected_frames != frames:
-            log.error('Expected %s total frames, got %s',
-                expected_frames, frames
-            )
-            self.info['valid'] = False
-        if self.strict is False:
-            return
-        if expected_duration != duration:
-            log.warning('Expected duration of %s nanoseconds, got %s',
-                expected_duration, duration
-            )
-            self.info['valid'] = False
+        check_duration(self.info, self.clock, self.strict)
 
     def run(self):
         if self.strict is not True:
@@ -171,6 +183,253 @@ class Validator(Decoder):
         self.complete(valid)
 
 
+class ChunkValidator(Validator):
+    """
+    Validate the timestamps of just the frames in ``[start:stop]``.
+
+    An accurate seek is used, so *start* doesn't need to be on a keyframe.
+    If *stop* is ``None``, every frame from *start* until EOS is checked.
+
+    If *record* is ``True``, the timestamp of each frame is also appended to
+    the `ChunkValidator.timestamps` list.
+    """
+
+    def __init__(self, callback, filename, full, strict, start, stop,
+            record=False):
+        super().__init__(callback, filename, full, strict)
+        assert start >= 0
+        assert stop is None or start < stop
+        self.start = start
+        self.stop = stop
+        self.frame = start
+        self.timestamps = ([] if record is True else None)
+
+    def on_handoff(self, sink, buf, pad):
+        ts = Timestamp(buf.pts, buf.duration)
+        if self.timestamps is not None:
+            self.timestamps.append(ts)
+        self.check_frame(ts)
+        self.frame += 1
+
+    def run(self):
+        try:
+            self.pause()
+            self.seek_by_frame(self.start, self.stop)
+            self.play()
+        except:
+            log.exception('%s.run():', self.__class__.__name__)
+            self.complete(False)
+
+    def on_eos(self, bus, msg):
+        self.info['frames'] = self.frame - self.start
+        if self.stop is not None and self.frame != self.stop:
+            log.error('Expected frames [%d:%d], stopped at %d',
+                self.start, self.stop, self.frame
+            )
+            self.info['valid'] = False
+        self.complete(self.info['valid'])
+
+
+class DemuxValidator(Validator):
+    """
+    Validate container timestamps without decoding the video.
+
+    The decodebin is told to expose the stream just before a decoder would be
+    plugged, so the fakesink receives parsed, still-encoded packets.  Packets
+    can arrive in decode order, so their timestamps are collected and then
+    checked in presentation order once EOS is reached.
+
+    Note that some containers store timestamps at a coarser precision than
+    nanoseconds (for example, milliseconds in Matroska), in which case only
+    the non-strict checks are meaningful.
+    """
+
+    def __init__(self, callback, filename, full, strict):
+        super().__init__(callback, filename, full, strict)
+        self.timestamps = []
+        self.connect(self.dec, 'autoplug-select', self.on_autoplug_select)
+
+    def on_autoplug_select(self, dec, pad, caps, factory):
+        if factory.list_is_type(Gst.ELEMENT_FACTORY_TYPE_DECODER):
+            return AUTOPLUG_SELECT_EXPOSE
+        return AUTOPLUG_SELECT_TRY
+
+    def on_pad_added(self, element, pad):
+        try:
+            caps = pad.get_current_caps()
+            string = caps.to_string()
+            log.debug('%s.on_pad_added(): %s', self.__class__.__name__, string)
+            if string.startswith('video/'):
+                self.extract_video_info(caps.get_structure(0))
+                pad.link(self.video_q.get_static_pad('sink'))
+        except:
+            log.exception('%s.on_pad_added():', self.__class__.__name__)
+            self.complete(False)
+            raise
+
+    def on_handoff(self, sink, buf, pad):
+        self.timestamps.append(Timestamp(buf.pts, buf.duration))
+
+    def check_timestamps(self):
+        self.timestamps.sort()
+        for ts in self.timestamps:
+            self.check_frame(ts)
+            self.frame += 1
+            if self.full is False and self.info['valid'] is False:
+                return False
+        return True
+
+    def on_eos(self, bus, msg):
+        log.debug('Got EOS from message bus')
+        if self.check_timestamps() is True:
+            super().on_eos(bus, msg)
+
+
+def _ignore_complete(inst, success):
+    pass
+
+
+def run_pipeline(cls, *args):
+    """
+    Run a `Pipeline` subclass to completion in a new `GLib.MainLoop`.
+    """
+    mainloop = GLib.MainLoop()
+
+    def on_complete(inst, success):
+        mainloop.quit()
+
+    inst = cls(on_complete, *args)
+    GLib.idle_add(inst.run)
+    mainloop.run()
+    return inst
+
+
+def probe_video(filename):
+    """
+    Return ``(info, clock)`` for the video stream in *filename*.
+
+    *info* contains the same framerate, width, height, and duration keys that
+    `Validator` puts in its info ``dict``.
+    """
+    inst = Validator(_ignore_complete, filename, False, False)
+    try:
+        inst.pause()
+        inst.info['duration'] = inst.get_duration()
+        return (inst.info, inst.clock)
+    finally:
+        inst.destroy()
+
+
+def plan_chunks(frames, count):
+    """
+    Split *frames* into at most *count* contiguous chunks.
+
+    For example:
+
+    >>> plan_chunks(1000, 3)
+    [StartStop(start=0, stop=333), StartStop(start=333, stop=666), StartStop(start=666, stop=1000)]
+
+    Chunks are never shorter than `MIN_CHUNK_FRAMES` (unless the whole video
+    is):
+
+    >>> plan_chunks(400, 4)
+    [StartStop(start=0, stop=400)]
+
+    """
+    assert frames >= 1
+    assert count >= 1
+    count = max(1, min(count, frames // MIN_CHUNK_FRAMES))
+    bounds = [frames * i // count for i in range(count + 1)]
+    return [StartStop(bounds[i], bounds[i + 1]) for i in range(count)]
+
+
+def validate_chunk(args):
+    """
+    Validate a single chunk in a worker process, return its info ``dict``.
+    """
+    inst = run_pipeline(ChunkValidator, *args)
+    if inst.success is not True:
+        inst.info['valid'] = False
+    return inst.info
+
+
+def merge_chunk_info(info, results):
+    """
+    Merge the info from each `ChunkValidator` into the *info* ``dict``.
+
+    The frame total is the sum of the frames each chunk actually decoded, not
+    of the planned chunk lengths.
+    """
+    info['frames'] = sum(r.get('frames', 0) for r in results)
+    if not all(r['valid'] is True for r in results):
+        info['valid'] = False
+    return info
+
+
+def validate_chunked(filename, full, strict, processes=None):
+    """
+    Validate *filename* by checking chunks in parallel in a process pool.
+
+    Returns an info ``dict`` equivalent to what `Validator` would produce.
+    """
+    (info, clock) = probe_video(filename)
+    frames = clock.nanosecond_to_frame(info['duration'])
+    if processes is None:
+        processes = os.cpu_count()
+    chunks = plan_chunks(max(frames, 1), processes)
+    log.info('Checking about %d frames in %d chunks', frames, len(chunks))
+    args = [(filename, full, strict, s.start, s.stop) for s in chunks]
+    # The duration can be wrong, so the last chunk is decoded until EOS, just
+    # as `Validator` would, rather than stopping at the planned frame:
+    args[-1] = (filename, full, strict, chunks[-1].start, None)
+    # Use "spawn" so workers don't inherit GStreamer state via fork():
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(min(processes, len(chunks))) as pool:
+        results = pool.map(validate_chunk, args)
+    merge_chunk_info(info, results)
+    check_duration(info, clock, strict)
+    return info
+
+
+def cross_check(demux, count=MIN_CHUNK_FRAMES):
+    """
+    Compare a finished `DemuxValidator` against decoding a random sample.
+
+    Up to *count* frames starting at a random frame are decoded with a
+    `ChunkValidator`, and the frame index of each decoded timestamp is
+    compared with the corresponding container timestamp.
+
+    Returns ``True`` if they all agree.
+    """
+    demuxed = demux.timestamps
+    if not demuxed:
+        return False
+    start = random.randrange(0, max(1, len(demuxed) - count))
+    stop = min(start + count, len(demuxed))
+    log.info('Cross-checking frames [%d:%d] in decoded mode', start, stop)
+    inst = run_pipeline(ChunkValidator,
+        demux.filename, True, False, start, stop, True
+    )
+    if inst.success is not True:
+        log.error('Decoded mode failed on frames [%d:%d]', start, stop)
+        return False
+    clock = demux.clock
+    got = [clock.nanosecond_to_frame(ts.pts) for ts in inst.timestamps]
+    expected = [
+        clock.nanosecond_to_frame(ts.pts) for ts in demuxed[start:stop]
+    ]
+    if got != expected:
+        log.error('Demuxed and decoded timestamps differ in [%d:%d]',
+            start, stop
+        )
+        return False
+    exact = sum(a == b for (a, b) in zip(inst.timestamps, demuxed[start:stop]))
+    log.info('Cross-check passed, %d of %d timestamps identical',
+        exact, stop - start
+    )
+    return True
+
+
 def get_buffer_info(buf):
     data = buf.extract_dup(0, buf.get_size())
     digest = sha1(data).hexdigest()
@@ -190,6 +449,11 @@ class PlayThrough(Decoder):
         self.filename = filename
         self.duration = None
         self.video = []
+        self.codec = None
+        self.decoder = None
+        self.preroll_time = None
+        self.decode_time = None
+        self.play_start = None
 
         # Create elements:
         self.sink = make_element('fakesink', {'signal-handoffs': True})
@@ -200,19 +464,33 @@ class PlayThrough(Decoder):
 
         # Connect signal handlers with Pipeline.connect():
         self.connect(self.sink, 'handoff', self.on_handoff)
+        self.connect(self.dec, 'autoplug-select', self.on_autoplug_select)
 
     def run(self):
         try:
             log.info('Play-through test: %r', self.filename)
+            start = time.perf_counter()
             self.pause()
+            self.preroll_time = time.perf_counter() - start
             log.info('Framerate: %s', self.framerate)
             self.duration = self.get_duration()
             log.info('Duration: %d nanoseconds', self.duration)
+            self.play_start = time.perf_counter()
             self.play()
         except:
             log.exception('%s.run():', self.__class__.__name__)
             self.complete(False)
 
+    def on_autoplug_select(self, dec, pad, caps, factory):
+        # Only record which codec and decoder are used:
+        if self.decoder is None:
+            name = caps.get_structure(0).get_name()
+            if name.startswith('video/') and \
+                    factory.list_is_type(Gst.ELEMENT_FACTORY_TYPE_DECODER):
+                self.codec = name
+                self.decoder = factory.get_name()
+        return AUTOPLUG_SELECT_TRY
+
     def on_handoff(self, sink, buf, pad):
         try:
             info = get_buffer_info(buf)
@@ -226,6 +504,7 @@ class PlayThrough(Decoder):
 
     def on_eos(self, bus, msg):
         try:
+            self.decode_time = time.perf_counter() - self.play_start
             log.info('Frames: %d', len(self.video))
             self.complete(True)
         except:
@@ -234,12 +513,15 @@ class PlayThrough(Decoder):
 
 
 class PrerollTester(Decoder):
-    def __init__(self, callback, filename, seek_times):
+    def __init__(self, callback, filename, seek_times, key_unit=False):
         super().__init__(callback, filename, video=True)
         assert isinstance(seek_times, list)
         self.filename = filename
         self.seek_times = seek_times
+        self.key_unit = key_unit
         self.video = []
+        self.latencies = []
+        self.seek_start = None
 
         # Create elements:
         self.sink = make_element('fakesink')
@@ -265,7 +547,8 @@ class PrerollTester(Decoder):
         try:
             if self.seek_times:
                 ns = self.seek_times.pop(0)
-                self.seek_simple(ns)
+                self.seek_start = time.perf_counter()
+                self.seek_simple(ns, self.key_unit)
             else:
                 self.complete(True)
         except:
@@ -274,6 +557,9 @@ class PrerollTester(Decoder):
 
     def on_preroll_handoff(self, sink, buf, pad):
         try:
+            if self.seek_start is not None:
+                self.latencies.append(time.perf_counter() - self.seek_start)
+                self.seek_start = None
             info = get_buffer_info(buf)
             log.debug('%s %d %d %d',
                 info.sha1, info.duration, info.pts, len(self.video)
@@ -292,6 +578,8 @@ class SeekTester(Decoder):
         self.filename = filename
         self.slices = slices
         self.video = []
+        self.latencies = []
+        self.seek_start = None
 
         # Create elements:
         self.sink = make_element('fakesink', {'signal-handoffs': True})
@@ -317,6 +605,7 @@ class SeekTester(Decoder):
         try:
             if self.slices:
                 (start, stop) = self.slices.pop(0)
+                self.seek_start = time.perf_counter()
                 self.seek(start, stop)
             else:
                 self.complete(True)
@@ -326,6 +615,9 @@ class SeekTester(Decoder):
 
     def on_handoff(self, sink, buf, pad):
         try:
+            if self.seek_start is not None:
+                self.latencies.append(time.perf_counter() - self.seek_start)
+                self.seek_start = None
             info = get_buffer_info(buf)
             log.debug('%s %d %d %d',
                 info.sha1, info.duration, info.pts, len(self.video)
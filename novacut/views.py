@@ -65,6 +65,75 @@ node_design = {
 }
 
 
+# For walking the edit graph of novacut/node and novacut/inode docs without
+# fetching each doc (see `novacut.intrinsic` and `novacut.renderservice`):
+graph_parent = """
+function(doc) {
+    if (doc.type == 'novacut/node' || doc.type == 'novacut/inode') {
+        var src = doc.node.src;
+        if (typeof src == 'string') {
+            emit([src, doc._id], null);
+        }
+        else if (src.constructor.name == 'Array') {
+            var i, child;
+            for (i = 0; i < src.length; i++) {
+                child = src[i];
+                if (typeof child != 'string') {
+                    child = child.id;
+                }
+                emit([child, doc._id], i);
+            }
+        }
+        else if (typeof src == 'object') {
+            var key, child;
+            for (key in src) {
+                child = src[key];
+                if (typeof child != 'string') {
+                    child = child.id;
+                }
+                emit([child, doc._id], key);
+            }
+        }
+    }
+}
+"""
+
+graph_slice = """
+function(doc) {
+    if (doc.type == 'novacut/node' || doc.type == 'novacut/inode') {
+        var node = doc.node;
+        if (typeof node.src == 'string' && node.start != undefined) {
+            emit([node.src, node.start, node.stop], node.type);
+        }
+    }
+}
+"""
+
+# A sequence emits its number of children, a slice its number of frames:
+graph_length = """
+function(doc) {
+    if (doc.type == 'novacut/node' || doc.type == 'novacut/inode') {
+        var node = doc.node;
+        if (node.type == 'video/sequence') {
+            emit(doc._id, node.src.length);
+        }
+        else if (typeof node.start == 'number') {
+            emit(doc._id, node.stop - node.start);
+        }
+    }
+}
+"""
+
+graph_design = {
+    '_id': '_design/graph',
+    'views': {
+        'parent': {'map': graph_parent},
+        'slice': {'map': graph_slice},
+        'length': {'map': graph_length},
+    },
+}
+
+
 # For novacut/project docs:
 project_atime = """
 function(doc) {
@@ -91,15 +160,44 @@ project_design = {
 }
 
 
+# For novacut/task docs (see `novacut.farm`):
+task_job = """
+function(doc) {
+    if (doc.type == 'novacut/task') {
+        emit(doc.job_id, doc.state);
+    }
+}
+"""
+
+task_open = """
+function(doc) {
+    if (doc.type == 'novacut/task' && doc.state != 'done') {
+        emit(doc.job_id, doc.kind);
+    }
+}
+"""
+
+task_design = {
+    '_id': '_design/task',
+    'views': {
+        'job': {'map': task_job, 'reduce': _count},
+        'open': {'map': task_open},
+    },
+}
+
+
 # Design docs for main novacut-VER database
 novacut_main = (
     doc_design, 
     project_design,
+    task_design,
+    graph_design,
 )
 
 
 novacut_projects = (
     node_design,
+    graph_design,
     doc_design,
     media_design,
     camera_design,
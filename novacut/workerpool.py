@@ -0,0 +1,194 @@
+# novacut: the distributed video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+"""
+Pool of long-lived worker processes, fed over their stdin and stdout.
+
+Starting a worker (importing Gst, connecting to Dmedia and CouchDB) is paid
+once rather than per job, while each job still runs in a separate process so a
+crash can't take down `novacut-service`.
+
+The protocol is one JSON object per line.  The pool sends a request, and the
+worker replies with either ``{"result": ...}`` or ``{"error": "..."}``.
+
+Workers are recycled after a number of jobs to bound heap fragmentation, and a
+worker that fails a job is always replaced.
+"""
+
+import json
+import subprocess
+import threading
+import logging
+
+
+log = logging.getLogger(__name__)
+
+
+class WorkerError(Exception):
+    """
+    Raised when a worker replies with an error.
+    """
+
+
+class WorkerDied(Exception):
+    """
+    Raised when a worker exits before replying.
+    """
+
+    def __init__(self, pid, returncode):
+        self.pid = pid
+        self.returncode = returncode
+        super().__init__(
+            'worker {} died with returncode {!r}'.format(pid, returncode)
+        )
+
+
+def serve(handler, rfile, wfile):
+    """
+    Worker side of the protocol: call *handler* for each request in *rfile*.
+    """
+    for line in rfile:
+        request = json.loads(line)
+        try:
+            response = {'result': handler(request)}
+        except SystemExit as e:
+            # Reply so the pool can report the error, then exit as asked:
+            wfile.write(json.dumps({'error': str(e)}) + '\n')
+            wfile.flush()
+            raise
+        except Exception as e:
+            log.exception('error handling %r', request)
+            response = {'error': str(e)}
+        wfile.write(json.dumps(response) + '\n')
+        wfile.flush()
+
+
+class WorkerProcess:
+    def __init__(self, cmd):
+        self.proc = subprocess.Popen(cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        self.pid = self.proc.pid
+        self.jobs = 0
+        log.info('started worker %d: %r', self.pid, cmd)
+
+    def is_alive(self):
+        return self.proc.poll() is None
+
+    def request(self, obj):
+        try:
+            self.proc.stdin.write(json.dumps(obj) + '\n')
+            self.proc.stdin.flush()
+            line = self.proc.stdout.readline()
+        except BrokenPipeError:
+            line = ''
+        if not line:
+            raise WorkerDied(self.pid, self.proc.wait())
+        self.jobs += 1
+        return json.loads(line)
+
+    def close(self, timeout=5):
+        log.info('stopping worker %d after %d jobs', self.pid, self.jobs)
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        try:
+            self.proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            log.warning('killing worker %d', self.pid)
+            self.proc.kill()
+            self.proc.wait()
+        self.proc.stdout.close()
+
+
+class WorkerPool:
+    def __init__(self, cmd, size=1, max_jobs=10):
+        if size < 1:
+            raise ValueError('need size >= 1; got {!r}'.format(size))
+        if max_jobs < 1:
+            raise ValueError('need max_jobs >= 1; got {!r}'.format(max_jobs))
+        self.cmd = cmd
+        self.size = size
+        self.max_jobs = max_jobs
+        self.idle = []
+        self.count = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while not (self.closed or self.idle or self.count < self.size):
+                self.cond.wait()
+            if self.closed:
+                raise Exception('WorkerPool is closed')
+            if self.idle:
+                return self.idle.pop()
+            self.count += 1
+        try:
+            return WorkerProcess(self.cmd)
+        except:
+            with self.cond:
+                self.count -= 1
+                self.cond.notify()
+            raise
+
+    def release(self, worker, ok):
+        retire = not (ok and worker.jobs < self.max_jobs and worker.is_alive())
+        with self.cond:
+            if self.closed:
+                retire = True
+            if retire:
+                self.count -= 1
+            else:
+                self.idle.append(worker)
+            self.cond.notify()
+        if retire:
+            worker.close()
+
+    def run(self, request):
+        """
+        Run *request* on an idle worker and return its result.
+
+        This blocks until the job is done, so call it from a job thread.
+        """
+        worker = self.acquire()
+        ok = False
+        try:
+            response = worker.request(request)
+            ok = ('error' not in response)
+        finally:
+            self.release(worker, ok)
+        if not ok:
+            raise WorkerError(response['error'])
+        return response['result']
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            idle = self.idle
+            self.idle = []
+            self.count -= len(idle)
+            self.cond.notify_all()
+        for worker in idle:
+            worker.close()
@@ -38,8 +38,9 @@ from microfiber import Database
 
 from novacut.settings import get_default_settings
 from novacut.render import Renderer
-from novacut.validate import Validator
+from novacut.validate import Validator, validate_chunked
 from novacut.renderservice import get_slices
+from novacut.manifest import MANIFEST_EXT, FrameManifest, diff_manifests
 
 
 logging.basicConfig(
@@ -60,7 +61,18 @@ parser.add_argument('--default', action='store_true', default=False,
 parser.add_argument('--low', action='store_true', default=False,
     help='Force resolution to 1280x720'
 )
+parser.add_argument('--jobs', type=int, default=1, metavar='N',
+    help='Validate each render in chunks using N worker processes'
+)
+parser.add_argument('--manifest', action='store_true', default=False,
+    help='Save a per-frame digest manifest of each render'
+)
+parser.add_argument('--compare', metavar='DIR',
+    help='Compare each manifest with the one from an earlier run in DIR'
+)
 args = parser.parse_args()
+if args.compare:
+    args.manifest = True
 
 
 tree = path.dirname(path.abspath(__file__))
@@ -106,6 +118,19 @@ fail = []
 def add_fail(root_id):
     fail.append(root_id)
 
+def compare_manifest(name, dst):
+    old = path.join(args.compare, name + MANIFEST_EXT)
+    if not path.exists(old):
+        log.warning('No manifest to compare with: %s', old)
+        return True
+    frames = diff_manifests(
+        FrameManifest.load(old), FrameManifest.load(dst + MANIFEST_EXT)
+    )
+    if frames:
+        log.error('%d frames differ from %s: %r', len(frames), old, frames)
+        return False
+    return True
+
 def render_one(root_id):
     settings = get_settings()
     name = '.'.join([root_id, settings['ext']])
@@ -120,26 +145,38 @@ def render_one(root_id):
     log.info('[re-rendering edit graph at root node %s]', root_id)
     log.info(tmp_dst)
     slices = get_slices(Dmedia, db, root_id)
-    r = Renderer(on_complete, slices, settings, tmp_dst)
+    r = Renderer(on_complete, slices, settings, tmp_dst,
+        manifest=args.manifest
+    )
     r.run()
     mainloop.run()
     r.destroy()
     if r.success is not True:
         log.error('fatal error in Renderer')
         return add_fail(root_id)
-    v = Validator(on_complete, tmp_dst, False, False)
-    v.run()
-    mainloop.run()
-    v.destroy()
-    if v.success is not True:
+    if args.jobs > 1:
+        info = validate_chunked(tmp_dst, False, False, args.jobs)
+        success = info['valid']
+    else:
+        v = Validator(on_complete, tmp_dst, False, False)
+        v.run()
+        mainloop.run()
+        v.destroy()
+        info = v.info
+        success = v.success
+    if success is not True:
         log.error('fatal error in Validator')
         return add_fail(root_id)
     expected_frames = sum(s.stop - s.start for s in slices)
-    if expected_frames != v.info['frames']:
+    if expected_frames != info['frames']:
         log.error('expected %d frames, got %d',
-            expected_frames, v.info['frames']
+            expected_frames, info['frames']
         )
         return add_fail(root_id)
+    if args.manifest:
+        os.rename(tmp_dst + MANIFEST_EXT, dst + MANIFEST_EXT)
+        if args.compare and not compare_manifest(name, dst):
+            return add_fail(root_id)
     os.rename(tmp_dst, dst)
     log.info('Result:\n%s\n', dst)
 
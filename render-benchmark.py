@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+
+# novacut: the collaborative video editor
+# Copyright (C) 2016 Novacut Inc
+#
+# This file is part of `novacut`.
+#
+# `novacut` is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# `novacut` is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for
+# more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with `novacut`.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Authors:
+#   Jason Gerard DeRose <jderose@novacut.com>
+
+
+"""
+Benchmark `novacut.render.Renderer` on synthetic timelines.
+
+A synthetic source clip is cut into timelines of varying cut density (by
+default 1, 100, and 10,000 slices), and each timeline is rendered in a fresh
+process so that peak RSS is measured per render.  Wall time is broken down into
+pipeline construction, seek/preroll, decode, convert/scale, queue wait, and
+encode (see `novacut.benchmark.RENDER_STAGES`).
+
+Each timeline is rendered twice from a cold page cache, without and with
+read-ahead (see `novacut.prefetch`), and the difference in the seek stage is
+reported as the I/O wait saved.  Use --no-prefetch to skip the second render.
+
+Use --json to save the results for trend tracking.
+"""
+
+import argparse
+from fractions import Fraction
+import logging
+import multiprocessing
+import os
+from os import path
+import random
+import tempfile
+import time
+
+import novacut
+from novacut.benchmark import StageTimer, get_peak_rss, save_results
+from novacut.render import Slice, Renderer
+from novacut.validate import run_pipeline
+from novacut.tests.helpers import CLIP_CODECS, get_test_clip
+
+
+log = logging.getLogger()
+
+
+def configure_logging(debug):
+    logging.basicConfig(
+        level=(logging.DEBUG if debug else logging.WARNING),
+        format='\t'.join([
+            '%(levelname)s',
+            '%(processName)s',
+            '%(threadName)s',
+            '%(message)s',
+        ]),
+    )
+
+
+def get_settings(width, height, framerate):
+    return {
+        'muxer': 'oggmux',
+        'ext': 'ogg',
+        'video': {
+            'encoder': 'theoraenc',
+            'caps': {
+                'format': 'I420',
+                'width': width,
+                'height': height,
+                'interlace-mode': 'progressive',
+                'pixel-aspect-ratio': '1/1',
+                'chroma-site': 'mpeg2',
+                'colorimetry': 'bt709',
+                'framerate': {
+                    'num': framerate.numerator,
+                    'denom': framerate.denominator,
+                },
+            },
+        },
+    }
+
+
+def make_slices(filename, clip_frames, count, frames, seed):
+    """
+    Cut *count* slices totalling at least *frames* frames from a clip.
+    """
+    rng = random.Random(seed)
+    length = min(max(1, frames // count), clip_frames)
+    slices = []
+    for i in range(count):
+        start = rng.randrange(clip_frames - length + 1)
+        slices.append(Slice(start, start + length, filename))
+    return slices
+
+
+def drop_cache(filename):
+    """
+    Evict *filename* from the page cache, so the next render reads it cold.
+    """
+    fd = os.open(filename, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def get_seek_time(result):
+    return result['stages'].get('seek', {}).get('total', 0.0)
+
+
+def render_one(slices, settings, debug, prefetch):
+    configure_logging(debug)
+    stats = StageTimer()
+    (fd, dst) = tempfile.mkstemp(suffix='.' + settings['ext'])
+    os.close(fd)
+    try:
+        start = time.perf_counter()
+        inst = run_pipeline(Renderer, slices, settings, dst, False, stats,
+            prefetch
+        )
+        wall_time = time.perf_counter() - start
+        frames = inst.total_frames
+        return {
+            'slices': len(slices),
+            'frames': frames,
+            'success': inst.success,
+            'wall_time': wall_time,
+            'fps': frames / wall_time,
+            'stages': stats.to_dict(),
+            'prefetch': (
+                inst.prefetcher.to_dict() if prefetch is True else None
+            ),
+            'peak_rss': get_peak_rss(),
+            'size': path.getsize(dst),
+        }
+    finally:
+        os.remove(dst)
+
+
+def print_result(result):
+    print('{:>6} slices, {:>6} frames: {:.2f}s ({:.1f} fps)'.format(
+        result['slices'], result['frames'], result['wall_time'], result['fps']
+    ))
+    print('    peak RSS    {:>9.1f} MiB'.format(result['peak_rss'] / 2**20))
+    for (name, stage) in sorted(result['stages'].items()):
+        print('    {:<11} {:>9.3f}s  ({} samples)'.format(
+            name, stage['total'], stage['count']
+        ))
+    if result['prefetch'] is not None:
+        print('    prefetch    {:>9.1f} MiB in {:.3f}s'.format(
+            result['prefetch']['bytes'] / 2**20, result['prefetch']['elapsed']
+        ))
+    if 'io_wait_saved' in result:
+        print('    I/O saved   {:>9.3f}s'.format(result['io_wait_saved']))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--version', action='version',
+        version=novacut.__version__
+    )
+    parser.add_argument('--slices', type=int, nargs='+',
+        default=[1, 100, 10000], metavar='N',
+        help='Number of slices in each benchmarked timeline'
+    )
+    parser.add_argument('--frames', type=int, default=1000,
+        help='Approximate number of frames in each timeline'
+    )
+    parser.add_argument('--codec', choices=sorted(CLIP_CODECS),
+        default='theora',
+        help='Codec of the synthetic source clip'
+    )
+    parser.add_argument('--framerate', default='30000/1001',
+        help='Framerate of source clip and render, eg 24/1'
+    )
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=360)
+    parser.add_argument('--clip-frames', type=int, default=600,
+        help='Number of frames in the synthetic source clip'
+    )
+    parser.add_argument('--seed', type=int, default=0,
+        help='Random seed used to choose the slices'
+    )
+    parser.add_argument('--debug', action='store_true', default=False,
+        help='Turn on debug-level logging'
+    )
+    parser.add_argument('--no-prefetch', action='store_true', default=False,
+        help='Only render without read-ahead'
+    )
+    parser.add_argument('--json', metavar='FILE',
+        help='Save results to FILE as JSON'
+    )
+    args = parser.parse_args()
+    configure_logging(args.debug)
+
+    framerate = Fraction(args.framerate)
+    filename = get_test_clip(args.codec, framerate, args.clip_frames,
+        args.width, args.height
+    )
+    settings = get_settings(args.width, args.height, framerate)
+
+    # Each render runs in a fresh process so peak RSS is per render:
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for count in args.slices:
+        slices = make_slices(filename, args.clip_frames, count, args.frames,
+            args.seed
+        )
+        runs = {}
+        for prefetch in ((False,) if args.no_prefetch else (False, True)):
+            drop_cache(filename)
+            with ctx.Pool(1) as pool:
+                runs[prefetch] = pool.apply(render_one,
+                    (slices, settings, args.debug, prefetch)
+                )
+        result = runs[not args.no_prefetch]
+        if not args.no_prefetch:
+            result['io_wait_saved'] = (
+                get_seek_time(runs[False]) - get_seek_time(runs[True])
+            )
+        result['source'] = {
+            'codec': args.codec,
+            'framerate': args.framerate,
+            'width': args.width,
+            'height': args.height,
+        }
+        print_result(result)
+        results.append(result)
+
+    if args.json:
+        save_results(args.json, 'render-benchmark', results)
+        print('Saved results to {!r}'.format(args.json))
+
+
+if __name__ == '__main__':
+    main()